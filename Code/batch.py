@@ -0,0 +1,227 @@
+"""
+Пакетный прогон транслятора: лексический анализ (scaner.tokenize),
+синтаксический разбор в дерево (parser_l4.SyntaxAnalyzer) и перевод
+дерева в ОПЗ (opz.program_to_opz) для множества файлов C в пуле процессов.
+С --cache-dir лексемы и ОПЗ неизменившихся файлов берутся из кэша
+(см. cache.py), и лексический анализ с переводом в ОПЗ не выполняются.
+С -O ОПЗ после кэша проходит оптимизатор (opz_optimize.py). С --metrics
+замеры этапов (metrics.py) каждого процесса складываются в один файл.
+
+    python batch.py examples/ "src/**/*.c" -j 8 --report report.json
+    python batch.py examples/ --cache-dir .cache
+    python batch.py examples/ -O -o out/
+    python batch.py examples/ --metrics metrics.prom
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+from cache import DEFAULT_MAX_SIZE, Cache
+from opz import program_to_opz
+from opz_optimize import optimize
+from parser_l4 import SyntaxAnalyzer, Tokenizer
+from scaner import Lexer, group_lines
+
+
+def collect_sources(patterns, extension=".c"):
+    """Разворачивает каталоги (рекурсивно) и шаблоны glob в отсортированный список файлов."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                paths.update(os.path.join(root, name) for name in files if name.endswith(extension))
+        elif glob.has_magic(pattern):
+            paths.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+        elif os.path.isfile(pattern):
+            paths.add(pattern)
+    return sorted(paths)
+
+
+def write_lines(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+# Кэши по каталогам, по одному на процесс пула
+_caches = {}
+
+
+def get_cache(cache_dir, max_size=DEFAULT_MAX_SIZE):
+    cache = _caches.get(cache_dir)
+    if cache is None:
+        cache = _caches[cache_dir] = Cache(cache_dir, max_size)
+    return cache
+
+
+def process_file(path, output_dir=None, cache_dir=None, cache_size=DEFAULT_MAX_SIZE, optimize_opz=False,
+                 instrument=None):
+    """
+    Полный прогон одного файла. Ошибки этапов не прерывают пакет,
+    а попадают в результат: {"path", "stage", "error", ...}.
+    instrument - None, "time" или "memory": замеры этапов этого файла
+    попадают в result["metrics"].
+    """
+    result = {"path": path, "tokens": 0, "opz_lines": 0, "stage": None, "error": None, "diagnostics": [],
+              "cache_hits": 0, "cache_misses": 0, "opz_items": 0, "opz_items_optimized": 0}
+    if instrument:
+        metrics.enable(memory=instrument == "memory")
+        metrics.reset()
+    start = time.perf_counter()
+    cache = get_cache(cache_dir, cache_size) if cache_dir else None
+    if cache:
+        hits, misses = sum(cache.hits.values()), sum(cache.misses.values())
+    try:
+        with open(path, "rb") as f:
+            source = f.read()
+        code = source.decode("utf-8")
+
+        result["stage"] = "scaner"
+        tokenizer = cache.get_tokens(source) if cache else None
+        if tokenizer is None:
+            lexer = Lexer()
+            columns = lexer.lex(code)
+            if cache:
+                cache.put_tokens(source, *columns, lexer.symbols)
+            tokenizer = Tokenizer.from_columns(*columns, lexer.symbols)
+        result["tokens"] = len(tokenizer)
+
+        result["stage"] = "parser"
+        analyzer = SyntaxAnalyzer(tokenizer)
+        errors = analyzer.check()
+        if errors:
+            result["diagnostics"] = [str(e) for e in errors]
+            raise errors[0]
+
+        result["stage"] = "opz"
+        opz_lines = cache.get_opz(source) if cache else None
+        if opz_lines is None:
+            # ОПЗ строится по уже готовому дереву: программа разбирается один раз
+            opz_lines = program_to_opz(analyzer.tree)
+            if cache:
+                cache.put_opz(source, opz_lines)
+        if optimize_opz:
+            # В кэше лежит ОПЗ без оптимизации: оптимизатор дешевле разбора
+            opz_lines, stats = optimize(opz_lines)
+            result["opz_items"] = stats["before"]
+            result["opz_items_optimized"] = stats["after"]
+        result["opz_lines"] = len(opz_lines)
+
+        if output_dir:
+            base = os.path.join(output_dir, os.path.splitext(os.path.basename(path))[0])
+            write_lines(base + ".tokens.txt", group_lines(tokenizer.kinds, tokenizer.indices, tokenizer.lines))
+            write_lines(base + ".opz.txt", opz_lines)
+        result["stage"] = None
+    except Exception as e:
+        # Любая ошибка файла (и RecursionError на огромном выражении)
+        # остаётся в его результате и не обрывает executor.map всего пакета
+        result["error"] = f"{type(e).__name__}: {e}"
+    if cache:
+        result["cache_hits"] = sum(cache.hits.values()) - hits
+        result["cache_misses"] = sum(cache.misses.values()) - misses
+    result["time"] = time.perf_counter() - start
+    if instrument:
+        result["metrics"] = metrics.collect()
+    return result
+
+
+def _process_one(args):
+    return process_file(*args)
+
+
+def run_batch(paths, jobs=None, chunksize=None, output_dir=None, cache_dir=None, cache_size=DEFAULT_MAX_SIZE,
+              optimize_opz=False, instrument=None):
+    """
+    Обрабатывает файлы в ProcessPoolExecutor и возвращает результаты
+    в порядке paths. Файлы раздаются процессам пачками по chunksize,
+    чтобы накладные расходы на передачу задач не съедали выигрыш.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, len(paths) // (jobs * 8))
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    tasks = [(path, output_dir, cache_dir, cache_size, optimize_opz, instrument) for path in paths]
+    if jobs == 1:
+        return [_process_one(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(_process_one, tasks, chunksize=chunksize))
+
+
+def summarize(results, elapsed):
+    """Сводный отчёт: счётчики по этапам и список ошибок."""
+    failed = [r for r in results if r["error"]]
+    by_stage = {}
+    for r in failed:
+        by_stage[r["stage"]] = by_stage.get(r["stage"], 0) + 1
+    return {
+        "files": len(results),
+        "ok": len(results) - len(failed),
+        "failed": len(failed),
+        "failed_by_stage": by_stage,
+        "tokens": sum(r["tokens"] for r in results),
+        "cache_hits": sum(r["cache_hits"] for r in results),
+        "cache_misses": sum(r["cache_misses"] for r in results),
+        "opz_items": sum(r["opz_items"] for r in results),
+        "opz_items_optimized": sum(r["opz_items_optimized"] for r in results),
+        "elapsed": elapsed,
+        "errors": [{"path": r["path"], "stage": r["stage"], "error": r["error"]} for r in failed],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетный прогон транслятора по файлам C")
+    parser.add_argument("sources", nargs="+", help="файлы, каталоги или шаблоны glob")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument("--chunksize", type=int, default=None, help="файлов в одной порции задач")
+    parser.add_argument("-o", "--output-dir", default=None, help="куда сохранять лексемы и ОПЗ")
+    parser.add_argument("--report", default=None, help="сохранить отчёт в JSON")
+    parser.add_argument("--cache-dir", default=None, help="каталог дискового кэша лексем и ОПЗ")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_SIZE >> 20,
+                        help="предельный размер кэша в МБ (по умолчанию %(default)s)")
+    parser.add_argument("-O", "--optimize", action="store_true", help="оптимизировать ОПЗ (opz_optimize.py)")
+    parser.add_argument("--metrics", default=None, help="сохранить замеры этапов в .json или .prom (metrics.py)")
+    parser.add_argument("--metrics-memory", action="store_true", help="мерить и пиковую память (tracemalloc)")
+    args = parser.parse_args(argv)
+
+    paths = collect_sources(args.sources)
+    if not paths:
+        print("Не найдено ни одного файла", file=sys.stderr)
+        return 2
+
+    instrument = ("memory" if args.metrics_memory else "time") if args.metrics else None
+    start = time.perf_counter()
+    results = run_batch(paths, args.jobs, args.chunksize, args.output_dir,
+                        args.cache_dir, args.cache_size << 20, args.optimize, instrument)
+    report = summarize(results, time.perf_counter() - start)
+
+    for r in results:
+        for message in r["diagnostics"] or ([r["error"]] if r["error"] else []):
+            print(f"{r['path']}: [{r['stage']}] {message}")
+    print(f"Файлов: {report['files']}, без ошибок: {report['ok']}, с ошибками: {report['failed']}, "
+          f"лексем: {report['tokens']}, время: {report['elapsed']:.2f} с")
+    if args.cache_dir:
+        print(f"Кэш: попаданий {report['cache_hits']}, промахов {report['cache_misses']}")
+    if args.optimize:
+        print(f"ОПЗ: элементов до оптимизации {report['opz_items']}, после {report['opz_items_optimized']}")
+
+    if args.metrics:
+        total = metrics.Metrics()
+        for r in results:
+            total.merge(r.pop("metrics"))
+        metrics.write(args.metrics, total)
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"summary": report, "files": results}, f, ensure_ascii=False, indent=2)
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
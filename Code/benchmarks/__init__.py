@@ -0,0 +1,4 @@
+# Бенчмарки этапов транслятора. Запуск из каталога Code:
+#     python -m benchmarks.bench_tokenize
+# Все этапы на синтетическом корпусе (benchmarks.corpus) с записью в JSON:
+#     python -m benchmarks.suite --output bench.json
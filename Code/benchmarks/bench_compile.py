@@ -0,0 +1,49 @@
+"""
+Исполнение ОПЗ, скомпилированной в функцию Python (opz_compile), против
+стековой машины opz_vm и исполнения "в лоб" (bench_vm.naive_run) на тех
+же программах, что в bench_vm. Отдельно - время компиляции и повторной
+"компиляции" той же ОПЗ, которая берётся из кэша.
+
+    python -m benchmarks.bench_compile --iterations 1000000
+"""
+import argparse
+import io
+
+from benchmarks.bench_vm import PROGRAMS, measure, naive_run
+from opz import assemble, convert_to_opz_plain
+from opz_compile import CompiledProgram, _cache
+from opz_vm import OpzMachine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000000)
+    parser.add_argument("--naive", type=int, default=100000,
+                        help="число итераций для исполнения в лоб (оно намного медленнее)")
+    args = parser.parse_args()
+
+    for title, template in PROGRAMS.items():
+        opz_lines = convert_to_opz_plain(template.format(n=args.iterations).split("\n"))
+        _cache.clear()
+        compile_time, program = measure(lambda: CompiledProgram(opz_lines))
+        cached_time, _ = measure(lambda: CompiledProgram(opz_lines))
+        run_time, result = measure(lambda: program.run(io.StringIO()))
+
+        machine = OpzMachine(opz_lines)
+        vm_time, vm_result = measure(lambda: machine.run(io.StringIO()))
+        assert result == vm_result, (title, result, vm_result)
+
+        naive_lines = convert_to_opz_plain(template.format(n=args.naive).split("\n"))
+        naive_time, naive_result = measure(lambda: naive_run(assemble(naive_lines), io.StringIO()))
+        assert naive_result == CompiledProgram(naive_lines).run(io.StringIO()), title
+        naive_time *= args.iterations / args.naive
+
+        print(f"{title}: {args.iterations} итераций, компиляция {compile_time * 1e3:.2f} мс, "
+              f"из кэша {cached_time * 1e3:.3f} мс")
+        print(f"  opz_compile {run_time:8.3f} с  {args.iterations / run_time / 1e6:6.2f} млн итераций/с")
+        print(f"  opz_vm      {vm_time:8.3f} с  (x{vm_time / run_time:.1f})")
+        print(f"  в лоб       {naive_time:8.3f} с  (x{naive_time / run_time:.1f})")
+
+
+if __name__ == "__main__":
+    main()
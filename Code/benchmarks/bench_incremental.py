@@ -0,0 +1,130 @@
+"""
+Задержка инкрементального анализа (incremental.IncrementalDocument)
+на правках "по нажатию клавиши" в большом файле.
+
+С --verify вместо замера задержки сверяет диагностики после случайных
+серий правок с полным разбором нового документа.
+
+    python -m benchmarks.bench_incremental --lines 10000 --edits 2000
+    python -m benchmarks.bench_incremental --verify 2000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from incremental import IncrementalDocument
+
+
+def generate_program(line_count, seed=0):
+    """Текст программы из line_count строк, допустимой для SyntaxAnalyzer."""
+    rnd = random.Random(seed)
+    names = [f"v{idx}" for idx in range(100)]
+    lines = ["#include <stdio.h>", "int main() {"]
+    depth = 1
+    while len(lines) < line_count - depth:
+        indent = "    " * depth
+        choice = rnd.random()
+        if choice < 0.08 and depth < 5:
+            lines.append(f"{indent}while ({rnd.choice(names)} < {rnd.randint(1, 99)}) {{")
+            depth += 1
+        elif choice < 0.16 and depth > 1:
+            depth -= 1
+            lines.append("    " * depth + "}")
+        elif choice < 0.5:
+            lines.append(f"{indent}int {rnd.choice(names)} = {rnd.randint(0, 999)};")
+        elif choice < 0.7:
+            lines.append(f"{indent}if ({rnd.choice(names)} + 1 == {rnd.choice(names)}) return 1;")
+        elif choice < 0.85:
+            lines.append(f'{indent}printf("{rnd.choice(names)}");')
+        else:
+            lines.append(f"{indent}/* {rnd.choice(names)} */ return {rnd.choice(names)};")
+    while depth:
+        depth -= 1
+        lines.append("    " * depth + "}")
+    return "\n".join(lines)
+
+
+# Вставки для --verify: скобки, ';', else, строки и целые операторы
+VERIFY_SNIPPETS = ["x", " ", ";", "int", "=", "1", "{", "}", "(", ")", "\n", "else", "for", "if", "+",
+                   "x = 1;", '"s"', ") x = x + 1;", ""]
+
+
+def verify(sequences, steps=8, lines=60, seed=0):
+    """
+    Серии из steps случайных правок небольших программ; после каждой
+    правки диагностики документа должны совпасть с диагностиками
+    IncrementalDocument нового текста. Возвращает число расхождений.
+    """
+    rnd = random.Random(seed)
+    mismatches = 0
+    checks = {}
+    for sequence in range(sequences):
+        doc = IncrementalDocument(generate_program(lines, seed=seed + sequence))
+        for _ in range(steps):
+            start_line = rnd.randrange(len(doc.lines))
+            start_col = rnd.randint(0, len(doc.lines[start_line]))
+            end_line = min(len(doc.lines) - 1, start_line + rnd.choice((0, 0, 0, 1)))
+            if end_line == start_line:
+                end_col = rnd.randint(start_col, min(len(doc.lines[end_line]), start_col + 4))
+            else:
+                end_col = rnd.randint(0, len(doc.lines[end_line]))
+            before = doc.text()
+            edit = (start_line, start_col, end_line, end_col, rnd.choice(VERIFY_SNIPPETS))
+            doc.apply_edit(*edit)
+            checks[doc.last_check] = checks.get(doc.last_check, 0) + 1
+            got = [str(e) for e in doc.diagnostics()]
+            expected = [str(e) for e in IncrementalDocument(doc.text()).diagnostics()]
+            if got != expected:
+                mismatches += 1
+                print(f"Расхождение ({doc.last_check}) после правки {edit} текста:\n{before}")
+                print(f"  инкрементально: {got}\n  заново: {expected}")
+                break
+    print(f"Серий: {sequences}, проверки: {checks}, расхождений: {mismatches}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--edits", type=int, default=2000)
+    parser.add_argument("--verify", type=int, default=None, metavar="N",
+                        help="сверить N случайных серий правок с полным разбором")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.verify is not None:
+        if verify(args.verify, seed=args.seed):
+            raise SystemExit(1)
+        return
+
+    text = generate_program(args.lines)
+    start = time.perf_counter()
+    doc = IncrementalDocument(text)
+    print(f"Строк: {len(doc.lines)}, первичный разбор: {(time.perf_counter() - start) * 1000:.1f} мс")
+
+    rnd = random.Random(1)
+    latencies = []
+    checks = {}
+    for _ in range(args.edits):
+        # Печать символа в случайной позиции и его удаление следующей правкой
+        line = rnd.randrange(2, len(doc.lines) - 1)
+        col = rnd.randint(0, len(doc.lines[line]))
+        for edit in ((line, col, line, col, rnd.choice("abx1 ")), (line, col, line, col + 1, "")):
+            start = time.perf_counter()
+            doc.apply_edit(*edit)
+            doc.diagnostics()
+            latencies.append(time.perf_counter() - start)
+            checks[doc.last_check] = checks.get(doc.last_check, 0) + 1
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"Правок: {len(latencies)}, проверки: {checks}")
+    print(f"медиана {statistics.median(latencies) * 1000:.3f} мс, "
+          f"p99 {p99 * 1000:.3f} мс, максимум {latencies[-1] * 1000:.3f} мс")
+    if doc.text() != text:
+        raise SystemExit("Текст после правок не совпал с исходным")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Пропускная способность табличного LL(1)-анализатора (ll1.LL1Parser)
+против рекурсивного parser_l4.SyntaxAnalyzer на одном и том же потоке лексем.
+
+    python -m benchmarks.bench_ll1 --statements 200000
+"""
+import argparse
+import random
+import time
+
+from ll1 import LL1Parser
+from parser_l4 import SyntaxAnalyzer, Tokenizer
+
+
+def generate_token_lines(statements, max_depth=4, seed=0):
+    """Строки кодов лексем программы, допустимой для SyntaxAnalyzer."""
+    rnd = random.Random(seed)
+    operand = lambda: rnd.choice(["I1", "I2", "I3", "N1", "N2"])
+    simple = [
+        lambda: f"W1 I{rnd.randint(1, 50)} O17 {operand()} R8",
+        lambda: "W28 R1 C1 R2 R8",
+        lambda: f"W5 {operand()} R8",
+        lambda: f"W6 R1 {operand()} O12 {operand()} O1 {operand()} R2 W5 {operand()} R8",
+    ]
+    lines = ["W1 W27 R1 R2 R3"]
+    depth = 0
+    for _ in range(statements):
+        choice = rnd.random()
+        if choice < 0.1 and depth < max_depth:
+            lines.append(f"W9 R1 {operand()} O18 {operand()} R2 R3")
+            depth += 1
+        elif choice < 0.2 and depth:
+            lines.append("R4")
+            depth -= 1
+        else:
+            lines.append(rnd.choice(simple)())
+    lines.extend(["R4"] * (depth + 1))
+    return lines
+
+
+def measure(parser_cls, tokenizer, repeat):
+    best = None
+    for _ in range(repeat):
+        tokenizer.pos = 0
+        start = time.perf_counter()
+        if parser_cls is SyntaxAnalyzer:
+            # Имена в программе не объявляются, а LL1Parser проверяет только синтаксис
+            parser_cls(tokenizer, semantic=False).parse_program()
+        else:
+            parser_cls(tokenizer).parse()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--statements", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    tokenizer = Tokenizer.from_lines(generate_token_lines(args.statements))
+    count = len(tokenizer)
+    print(f"Лексем: {count}")
+    for name, parser_cls in (("SyntaxAnalyzer", SyntaxAnalyzer), ("LL1Parser", LL1Parser)):
+        elapsed = measure(parser_cls, tokenizer, args.repeat)
+        print(f"{name:15} {elapsed:8.3f} с  {count / elapsed / 1e6:6.2f} млн лексем/с")
+
+
+if __name__ == "__main__":
+    main()
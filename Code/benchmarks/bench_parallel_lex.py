@@ -0,0 +1,58 @@
+"""
+Последовательный scaner.Lexer против parallel_lex.ParallelLexer на
+одном большом файле; отдельно - цена поиска границ кусков и склейки,
+которые выполняются в одном процессе. Результаты сверяются.
+
+    python -m benchmarks.bench_parallel_lex --size 64 -j 8
+"""
+import argparse
+import time
+
+import parallel_lex
+from benchmarks.bench_tokenize import generate_source
+from scaner import Lexer
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=float, default=32, help="размер входа в мегабайтах")
+    parser.add_argument("-j", "--jobs", type=int, default=None)
+    parser.add_argument("--chunk-size", type=float, default=parallel_lex.DEFAULT_CHUNK_SIZE / (1 << 20),
+                        help="размер куска в мегабайтах")
+    args = parser.parse_args()
+
+    # Многострочные комментарии, чтобы часть границ приходилось сдвигать
+    code = generate_source(int(args.size * 1024 * 1024), 200).replace("/* ", "/*\n", 1000)
+    chunk_size = max(1, int(args.chunk_size * (1 << 20)))
+    print(f"Вход: {len(code) / 1024 / 1024:.1f} МБ, строк: {code.count(chr(10)) + 1}")
+
+    sequential = Lexer()
+    seq_time, expected = measure(sequential.lex, code)
+    print(f"Lexer.lex:              {seq_time:8.3f} с")
+
+    bounds_time, bounds = measure(lambda: list(parallel_lex.chunk_bounds(code, chunk_size)))
+    print(f"chunk_bounds:           {bounds_time:8.3f} с ({len(bounds)} кусков)")
+
+    lexer = parallel_lex.ParallelLexer(args.jobs, chunk_size)
+    par_time, columns = measure(lexer.lex, code)
+    print(f"ParallelLexer.lex (-j {lexer.jobs}): {par_time:8.3f} с, ускорение x{seq_time / par_time:.2f}")
+
+    parallel_lex._init_worker(code)
+    chunks = [parallel_lex._lex_chunk(item) for item in bounds]
+    merge_time, _ = measure(parallel_lex.ParallelLexer(chunk_size=chunk_size).merge, chunks)
+    print(f"merge:                  {merge_time:8.3f} с")
+
+    if columns != expected or lexer.symbols.names != sequential.symbols.names \
+            or lexer.symbols.numbers != sequential.symbols.numbers \
+            or lexer.symbols.constants != sequential.symbols.constants:
+        raise SystemExit("Результаты лексеров не совпадают")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Восстановление C++ по ОПЗ (cpp_syntax_analizator.parse_opz) на строках
+с очень длинными выражениями, как в машинно сгенерированной ОПЗ. Для
+сравнения - OPZParser со сборкой выражений f-строками, как было раньше:
+каждая операция копирует текст операндов.
+
+С --lines - пиковая память parse_opz и потокового iter_cpp на файле ОПЗ
+из стольких строк: у iter_cpp она не должна зависеть от размера файла.
+
+    python -m benchmarks.bench_reconstruct --tokens 10000
+    python -m benchmarks.bench_reconstruct --lines 1000000
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from cpp_syntax_analizator import OPZParser, iter_cpp, parse_opz
+
+
+def generate(tokens, nested, seed=0):
+    """
+    Строка ОПЗ "x <выражение> =" примерно из tokens элементов: nested -
+    каждая операция над результатом предыдущей ((a + b) * c ...), иначе
+    сбалансированное дерево.
+    """
+    rnd = random.Random(seed)
+    operands = tokens // 2
+    if nested:
+        items = ["a"]
+        for _ in range(operands - 1):
+            items += [rnd.choice(["a", "b", "17"]), rnd.choice(["+", "-", "*", "<", "&&"])]
+    else:
+        items = []
+        count = 0
+        for k in range(1, operands + 1):
+            items.append(rnd.choice(["a", "b", "17"]))
+            # После k-го операнда - столько операций, сколько младших нулевых битов у k
+            while k % 2 == 0 and count < operands - 1:
+                items.append(rnd.choice(["+", "-", "*", "<", "&&"]))
+                count += 1
+                k //= 2
+        items += [rnd.choice(["+", "*"])] * (operands - 1 - count)
+    return ["x " + " ".join(items) + " ="]
+
+
+class CopyingParser(OPZParser):
+    """OPZParser, в котором каждая операция собирает f-строку из текста операндов."""
+
+    @staticmethod
+    def operation(left, op, right):
+        return f'({left} {op} {right})'
+
+
+def measure(func, *args, repeat=5):
+    """Лучшее время из repeat запусков и результат последнего."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def write_program(f, lines):
+    """ОПЗ примерно из lines строк: циклы и ветвления глубины до 3 подряд."""
+    label = 0
+    written = 0
+    while written < lines:
+        head, end, skip = label + 1, label + 2, label + 3
+        label += 3
+        f.write(f"i 0 =\nМ{head}:\ni 10 < М{end} УПЛ\n"
+                f"a i 2 % 0 == М{skip} УПЛ\ns s a i 1 АЭМ + =\nМ{skip}:\n"
+                f"i i 1 + =\nМ{head} БП\nМ{end}:\n\"%d\\n\" s 1 Ф\n")
+        written += 10
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def consume(iterator):
+    for _ in iterator:
+        pass
+
+
+def compare_memory(lines):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.opz")
+        with open(path, "w", encoding="utf-8") as f:
+            write_program(f, lines)
+        size = os.path.getsize(path)
+
+        def whole():
+            with open(path, "r", encoding="utf-8") as f:
+                parse_opz(f.read().split("\n"), io.StringIO())
+
+        def streaming():
+            with open(path, "r", encoding="utf-8") as f:
+                consume(iter_cpp(f))
+
+        print(f"Файл ОПЗ: {lines} строк, {size / 2 ** 20:.1f} МБ")
+        print(f"  parse_opz  пик памяти {peak_memory(whole) / 1024:10.1f} КБ")
+        print(f"  iter_cpp   пик памяти {peak_memory(streaming) / 1024:10.1f} КБ")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=10000)
+    parser.add_argument("--lines", type=int, help="сравнить память на файле ОПЗ из стольких строк")
+    args = parser.parse_args()
+
+    if args.lines:
+        compare_memory(args.lines)
+        return
+
+    for title, nested in (("вложенное", True), ("сбалансированное", False)):
+        opz_lines = generate(args.tokens, nested)
+        tokens = opz_lines[0].split()
+        total_time, _ = measure(parse_opz, opz_lines)
+        stream_time, _ = measure(parse_opz, opz_lines, io.StringIO())
+        # Оба разборщика - на одних и тех же уже разбитых элементах
+        new_time, lines = measure(lambda: OPZParser(tokens).parse())
+        old_time, old_lines = measure(lambda: CopyingParser(tokens).parse())
+        assert lines == old_lines, title
+        print(f"{title}: {args.tokens} элементов, строка C++ {len(lines[3])} символов")
+        print(f"  parse_opz          {total_time * 1e3:9.2f} мс  (с разбиением строки ОПЗ)")
+        print(f"  parse_opz в поток  {stream_time * 1e3:9.2f} мс")
+        print(f"  OPZParser          {new_time * 1e3:9.2f} мс")
+        print(f"  f-строки           {old_time * 1e3:9.2f} мс  (x{old_time / new_time:.1f})")
+
+
+if __name__ == "__main__":
+    main()
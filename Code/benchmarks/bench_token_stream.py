@@ -0,0 +1,57 @@
+"""
+Загрузка лексем в parser_l4.Tokenizer: текстовый tokens_output.txt
+против двоичного формата token_stream.
+
+    python -m benchmarks.bench_token_stream --size 8
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_tokenize import generate_source
+from parser_l4 import Tokenizer
+from scaner import Lexer, group_lines
+from token_stream import write_binary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=float, default=8, help="размер исходника в мегабайтах")
+    args = parser.parse_args()
+
+    lexer = Lexer()
+    columns = lexer.lex(generate_source(int(args.size * 1024 * 1024), 120))
+    with tempfile.TemporaryDirectory() as tmp:
+        text_path = os.path.join(tmp, "tokens.txt")
+        binary_path = os.path.join(tmp, "tokens.tkb")
+        with open(text_path, "w", encoding="utf-8") as f:
+            for line in group_lines(*columns):
+                f.write(line + "\n")
+        write_binary(binary_path, *columns, lexer.symbols)
+        print(f"Лексем: {len(columns[0])}, текст: {os.path.getsize(text_path) / 1e6:.1f} МБ, "
+              f"двоичный: {os.path.getsize(binary_path) / 1e6:.1f} МБ")
+
+        start = time.perf_counter()
+        text_tokens = Tokenizer(text_path)
+        text_time = time.perf_counter() - start
+        start = time.perf_counter()
+        binary_tokens = Tokenizer.from_binary(binary_path)
+        binary_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        lexemes = [binary_tokens.lexeme_at(pos) for pos in range(len(binary_tokens))]
+        lexeme_time = time.perf_counter() - start
+        same = (list(text_tokens.kinds), list(text_tokens.indices), list(text_tokens.lines)) == \
+            (list(binary_tokens.kinds), list(binary_tokens.indices), list(binary_tokens.lines))
+        binary_tokens.close()
+
+    print(f"Tokenizer(text):        {text_time:8.3f} с")
+    print(f"Tokenizer.from_binary:  {binary_time:8.3f} с (без копирования столбцов)")
+    print(f"все лексемы из mmap:    {lexeme_time:8.3f} с ({len(lexemes)})")
+    if not same:
+        raise SystemExit("Лексемы в форматах не совпадают")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Сравнение скорости scaner.tokenize с прежней реализацией, которая
+перебирала TOKEN_PATTERNS на каждой позиции и отрезала префикс строки.
+
+    python -m benchmarks.bench_tokenize --size 4 --line-length 4000
+"""
+import argparse
+import random
+import re
+import time
+
+import scaner
+
+
+def legacy_tokenize(code):
+    # Прежний алгоритм лексера, оставлен только как точка отсчёта
+    identifiers = {}
+    ident_counter = num_counter = const_counter = 1
+    tokenized_lines = []
+    for line in code.split("\n"):
+        tokens = []
+        code = line.strip()
+        while code:
+            code = code.lstrip()
+            match = None
+            for pattern, lexeme_type, *flags in LEGACY_PATTERNS:
+                match = re.match(pattern, code, flags[0] if flags else 0)
+                if match:
+                    value = match.group(0)
+                    if lexeme_type == "I":
+                        if value not in identifiers:
+                            identifiers[value] = f"I{ident_counter}"
+                            ident_counter += 1
+                        lexeme_code = identifiers[value]
+                    elif lexeme_type == "N":
+                        lexeme_code = f"N{num_counter}"
+                        num_counter += 1
+                    elif lexeme_type == "C":
+                        lexeme_code = f"C{const_counter}"
+                        const_counter += 1
+                    else:
+                        lexeme_code = (
+                            scaner.KEYWORDS.get(value, None) or
+                            scaner.OPERATORS.get(value, None) or
+                            scaner.DELIMITERS.get(value, None)
+                        )
+                    if lexeme_code:
+                        tokens.append(lexeme_code)
+                    code = code[len(value):]
+                    break
+            if not match:
+                raise SyntaxError(f"Неизвестный символ: {code[:10]}")
+        if tokens:
+            tokenized_lines.append(" ".join(tokens))
+    return tokenized_lines
+
+
+LEGACY_PATTERNS = [
+    (r'//.*', 'COMMENT'),
+    (r'/\*.*?\*/', 'COMMENT', re.DOTALL),
+    (r'#\s*include\s*<.*?>', 'W'),
+    (r'\b(' + '|'.join(scaner.KEYWORDS.keys()) + r')\b', 'W'),
+    (r'[a-zA-Z_]\w*', 'I'),
+    (r'\d+\.\d+|\d+', 'N'),
+    (r'".*?"', 'C'),
+    (r'(' + '|'.join(map(re.escape, scaner.OPERATORS.keys())) + r')', 'O'),
+    (r'(' + '|'.join(map(re.escape, scaner.DELIMITERS.keys())) + r')', 'R')
+]
+
+
+def generate_source(size_bytes, line_length, seed=0):
+    rnd = random.Random(seed)
+    names = [f"v{idx}" for idx in range(200)]
+    pieces = [
+        lambda: f"int {rnd.choice(names)} = {rnd.randint(0, 999)};",
+        lambda: f"{rnd.choice(names)} += {rnd.choice(names)} * ({rnd.choice(names)} - {rnd.randint(1, 99)}.5);",
+        lambda: f"if ({rnd.choice(names)} <= {rnd.choice(names)}) {{ return {rnd.randint(0, 9)}; }}",
+        lambda: f'printf("{rnd.choice(names)}"); /* {rnd.choice(names)} */',
+    ]
+    lines = []
+    total = 0
+    while total < size_bytes:
+        parts = []
+        length = 0
+        while length < line_length:
+            piece = rnd.choice(pieces)()
+            parts.append(piece)
+            length += len(piece) + 1
+        line = " ".join(parts)
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)
+
+
+def measure(func, code):
+    start = time.perf_counter()
+    result = func(code)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=float, default=4, help="размер входа в мегабайтах")
+    parser.add_argument("--line-length", type=int, default=4000, help="длина строки в символах")
+    parser.add_argument("--no-legacy", action="store_true", help="не запускать старый алгоритм")
+    args = parser.parse_args()
+
+    code = generate_source(int(args.size * 1024 * 1024), args.line_length)
+    print(f"Вход: {len(code) / 1024 / 1024:.1f} МБ, строк: {code.count(chr(10)) + 1}")
+
+    new_time, new_result = measure(scaner.tokenize, code)
+    print(f"tokenize:        {new_time:8.3f} с")
+
+    if not args.no_legacy:
+        legacy_time, legacy_result = measure(legacy_tokenize, code)
+        print(f"legacy_tokenize: {legacy_time:8.3f} с")
+        print(f"Ускорение: x{legacy_time / new_time:.1f}")
+        if legacy_result != new_result:
+            raise SystemExit("Результаты лексеров не совпадают")
+
+
+if __name__ == "__main__":
+    main()
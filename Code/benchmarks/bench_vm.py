@@ -0,0 +1,169 @@
+"""
+Исполнение ОПЗ стековой машиной opz_vm на программах с длинными циклами.
+Для сравнения та же ОПЗ исполняется "в лоб": по массиву opz.assemble,
+с переменными в словаре по именам и стеком на list.append/pop.
+
+    python -m benchmarks.bench_vm --iterations 1000000
+"""
+import argparse
+import io
+import time
+
+from opz import JUMP, JUMP_FALSE, assemble, convert_to_opz_plain
+from opz_vm import BINARY_FUNCTIONS, OpzMachine
+
+PROGRAMS = {
+    "сумма": """
+int main() {{
+    int i, s = 0;
+    for (i = 0; i < {n}; i = i + 1) {{
+        s = s + i * i % 7;
+    }}
+    printf("%d\\n", s);
+    return 0;
+}}""",
+    "решето": """
+int main() {{
+    int sieve[{n}];
+    int i = 2, j, count = 0;
+    while (i < {n}) {{
+        if (sieve[i] == 0) {{
+            count += 1;
+            j = i + i;
+            while (j < {n}) {{
+                sieve[j] = 1;
+                j += i;
+            }}
+        }}
+        i += 1;
+    }}
+    printf("%d\\n", count);
+    return count;
+}}""",
+    "коллатц": """
+int main() {{
+    int n = 1, steps = 0, x;
+    while (steps < {n}) {{
+        x = n;
+        while (x != 1 && steps < {n}) {{
+            if (x % 2 == 0) {{
+                x = x / 2;
+            }} else {{
+                x = 3 * x + 1;
+            }}
+            steps += 1;
+        }}
+        n += 1;
+    }}
+    return n;
+}}""",
+    "матрица": """
+int main() {{
+    int m[100][100];
+    int i = 0, j, k = 0;
+    while (k < {n}) {{
+        i = k / 100 % 100;
+        j = k % 100;
+        m[i][j] = m[j][i] + i - j;
+        k += 1;
+    }}
+    return m[3][7];
+}}""",
+}
+
+
+def naive_run(code, output):
+    """Прямолинейное исполнение массива assemble: имена, словарь, list-стек."""
+    env = {}
+    arrays = {}
+    stack = []
+    pc = 0
+    while pc < len(code):
+        item = code[pc]
+        pc += 1
+        if isinstance(item, int):
+            stack.append(item)
+        elif item in BINARY_FUNCTIONS:
+            right = value(stack.pop(), env, arrays)
+            stack.append(BINARY_FUNCTIONS[item](value(stack.pop(), env, arrays), right))
+        elif item in ("=", "+="):
+            right = value(stack.pop(), env, arrays)
+            target = stack.pop()
+            if item == "+=":
+                right = value(target, env, arrays) + right
+            if isinstance(target, tuple):
+                arrays[target[0]][target[1]] = right
+            else:
+                env[target] = right
+        elif item == "АЭМ":
+            count = int(stack.pop())
+            indices = [value(stack.pop(), env, arrays) for _ in range(count)][::-1]
+            name = stack.pop()
+            flat = 0
+            for index, size in zip(indices, arrays[name + ".dims"]):
+                flat = flat * size + index
+            stack.append((name, flat))
+        elif item == JUMP_FALSE:
+            target = stack.pop()
+            if not value(stack.pop(), env, arrays):
+                pc = target
+        elif item == JUMP:
+            pc = stack.pop()
+        elif item == "ОМ":
+            dims = [int(stack.pop()) for _ in range(int(stack.pop()))][::-1]
+            name = stack.pop()
+            stack.pop()
+            size = 1
+            for dim in dims:
+                size *= dim
+            arrays[name] = [0] * size
+            arrays[name + ".dims"] = dims
+        elif item == "Ф":
+            args = [value(stack.pop(), env, arrays) for _ in range(int(stack.pop()))][::-1]
+            output.write(stack.pop()[1:-1].replace("\\n", "\n") % tuple(args))
+        elif item == "ВОЗВ":
+            return value(stack.pop(), env, arrays)
+        else:
+            stack.append(item)
+    return None
+
+
+def value(item, env, arrays):
+    if isinstance(item, tuple):
+        return arrays[item[0]][item[1]]
+    if isinstance(item, str):
+        return int(item) if item[0].isdigit() else env.get(item, 0)
+    return item
+
+
+def measure(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=1000000)
+    parser.add_argument("--naive", type=int, default=100000,
+                        help="число итераций для исполнения в лоб (оно намного медленнее)")
+    args = parser.parse_args()
+
+    for title, template in PROGRAMS.items():
+        opz_lines = convert_to_opz_plain(template.format(n=args.iterations).split("\n"))
+        load_time, machine = measure(lambda: OpzMachine(opz_lines))
+        run_time, result = measure(lambda: machine.run(io.StringIO()))
+
+        naive_lines = convert_to_opz_plain(template.format(n=args.naive).split("\n"))
+        naive_time, naive_result = measure(lambda: naive_run(assemble(naive_lines), io.StringIO()))
+        check_time, check_result = measure(lambda: OpzMachine(naive_lines).run(io.StringIO()))
+        assert naive_result == check_result, (title, naive_result, check_result)
+
+        print(f"{title}: {args.iterations} итераций, {len(machine.ops)} команд, загрузка {load_time * 1e3:.2f} мс")
+        print(f"  opz_vm    {run_time:8.3f} с  {args.iterations / run_time / 1e6:6.2f} млн итераций/с")
+        print(f"  в лоб     {naive_time / args.naive * args.iterations:8.3f} с  "
+              f"{args.naive / naive_time / 1e6:6.2f} млн итераций/с  (x{naive_time / check_time:.1f})")
+
+
+if __name__ == "__main__":
+    main()
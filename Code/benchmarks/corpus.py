@@ -0,0 +1,143 @@
+"""
+Детерминированный генератор программ на C для бенчмарков: программы
+допустимы для parser_l4.SyntaxAnalyzer и проходят весь конвейер
+(лексемы, дерево, ОПЗ, восстановление C++). Одни и те же параметры и
+seed дают один и тот же текст.
+
+    python -m benchmarks.corpus out/ --files 100 --statements 2000 --depth 4
+"""
+import argparse
+import os
+import random
+
+OPERATORS = ["+", "-", "*", "/", "%", "<", ">", "<=", ">=", "==", "!=", "&&", "||", "+", "-", "*"]
+ARRAY_SIZE = 8
+
+
+class ProgramGenerator:
+    """
+    statements - число операторов (вложенные тоже считаются), depth -
+    наибольшая вложенность блоков, expression_length - число операндов
+    в выражении, identifiers - число переменных (массивов - в десять раз
+    меньше, но хотя бы один).
+    """
+
+    def __init__(self, statements=1000, depth=3, expression_length=6, identifiers=50, seed=0):
+        self.statements = statements
+        self.depth = depth
+        self.expression_length = expression_length
+        self.names = [f"v{idx}" for idx in range(max(1, identifiers))]
+        self.arrays = [f"a{idx}" for idx in range(max(1, identifiers // 10))]
+        self.rnd = random.Random(seed)
+        self.lines = []
+        self.left = 0
+        self.declared = 0
+
+    def operand(self):
+        choice = self.rnd.random()
+        if choice < 0.55:
+            return self.rnd.choice(self.names)
+        if choice < 0.8:
+            return str(self.rnd.randint(0, 999))
+        if choice < 0.9:
+            return f"{self.rnd.choice(self.arrays)}[{self.rnd.choice(self.names)} % {ARRAY_SIZE}]"
+        return f"-{self.rnd.choice(self.names)}"
+
+    def expression(self, length=None):
+        """Выражение из length операндов: случайное дерево, часть поддеревьев в скобках."""
+        if length is None:
+            length = max(1, self.rnd.randint(self.expression_length // 2, self.expression_length))
+        if length == 1:
+            return self.operand()
+        split = self.rnd.randint(1, length - 1)
+        left = self.expression(split)
+        right = self.expression(length - split)
+        if length - split > 1 and self.rnd.random() < 0.3:
+            right = f"({right})"
+        return f"{left} {self.rnd.choice(OPERATORS)} {right}"
+
+    def emit(self, depth, text):
+        self.lines.append("    " * depth + text)
+
+    def block(self, depth):
+        """Тело составного оператора: от одного до четырёх операторов."""
+        for _ in range(self.rnd.randint(1, 4)):
+            if self.left <= 0:
+                break
+            self.statement(depth)
+
+    def statement(self, depth):
+        self.left -= 1
+        rnd = self.rnd
+        choice = rnd.random()
+        nested = depth <= self.depth
+        name = rnd.choice(self.names)
+        if nested and choice < 0.1:
+            self.emit(depth, f"if ({self.expression()}) {{")
+            self.block(depth + 1)
+            if rnd.random() < 0.5:
+                self.emit(depth, "} else {")
+                self.block(depth + 1)
+            self.emit(depth, "}")
+        elif nested and choice < 0.15:
+            self.emit(depth, f"while ({name} < {rnd.randint(1, 100)}) {{")
+            self.block(depth + 1)
+            self.emit(depth + 1, f"{name} += 1;")
+            self.emit(depth, "}")
+        elif nested and choice < 0.2:
+            self.emit(depth, f"for ({name} = 0; {name} < {rnd.randint(1, 100)}; {name} = {name} + 1) {{")
+            self.block(depth + 1)
+            self.emit(depth, "}")
+        elif choice < 0.6:
+            self.emit(depth, f"{name} {rnd.choice(['=', '=', '+=', '-=', '*='])} {self.expression()};")
+        elif choice < 0.75:
+            array = rnd.choice(self.arrays)
+            self.emit(depth, f"{array}[{name} % {ARRAY_SIZE}] = {self.expression()};")
+        elif choice < 0.85:
+            self.emit(depth, f'printf("%d\\n", {self.expression()});')
+        else:
+            # Каждое объявление - новое имя: повторное объявление в блоке - ошибка
+            self.declared += 1
+            self.emit(depth, f"int t{self.declared} = {self.expression()};")
+
+    def generate(self):
+        self.lines = ["#include <stdio.h>", "int main() {"]
+        for start in range(0, len(self.names), 10):
+            chunk = self.names[start:start + 10]
+            self.emit(1, "int " + ", ".join(f"{name} = {idx}" for idx, name in enumerate(chunk, start)) + ";")
+        self.emit(1, "int " + ", ".join(f"{array}[{ARRAY_SIZE}]" for array in self.arrays) + ";")
+        self.left = self.statements
+        while self.left > 0:
+            self.statement(1)
+        self.emit(1, f"return {self.names[0]};")
+        self.lines.append("}")
+        return self.lines
+
+
+def generate_program(statements=1000, depth=3, expression_length=6, identifiers=50, seed=0):
+    """Строки программы на C (см. ProgramGenerator)."""
+    return ProgramGenerator(statements, depth, expression_length, identifiers, seed).generate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("directory")
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--statements", type=int, default=1000)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--expression-length", type=int, default=6)
+    parser.add_argument("--identifiers", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.directory, exist_ok=True)
+    for idx in range(args.files):
+        lines = generate_program(args.statements, args.depth, args.expression_length,
+                                 args.identifiers, args.seed + idx)
+        with open(os.path.join(args.directory, f"program{idx}.c"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+    print(f"Файлов: {args.files} в {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Набор бенчмарков четырёх этапов транслятора на программах из
+benchmarks.corpus: лексический анализ (scaner.tokenize), разбор в дерево
+(parser_l4.SyntaxAnalyzer), перевод дерева в ОПЗ (opz.program_to_opz) и
+восстановление C++ (cpp_syntax_analizator.parse_opz). Время меряет timeit:
+число запусков подбирается autorange, из --repeat серий берётся лучшая.
+
+Результаты сохраняются в JSON; с --compare они сравниваются с прошлым
+файлом, и если какой-то замер медленнее больше чем на --threshold,
+код выхода 1 - так регрессию между коммитами видно автоматически.
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --sizes small --compare bench.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+
+from benchmarks.corpus import generate_program
+from cpp_syntax_analizator import parse_opz
+from opz import program_to_opz
+from parser_l4 import SyntaxAnalyzer, Tokenizer
+from scaner import Lexer, tokenize
+
+FORMAT_VERSION = 2
+
+# Параметры программ корпуса: (statements, depth, expression_length, identifiers)
+SIZES = {
+    "small": (200, 2, 4, 20),
+    "medium": (2000, 3, 6, 100),
+    "large": (20000, 4, 6, 500),
+    "deep": (2000, 8, 4, 50),
+    "long_expressions": (200, 2, 200, 50),
+}
+
+
+def prepare(size, seed=0):
+    """Программа и входы каждого этапа, готовые заранее: меряется только сам этап."""
+    lines = generate_program(*SIZES[size], seed=seed)
+    code = "\n".join(lines)
+    lexer = Lexer()
+    data = {"lines": lines, "code": code, "columns": lexer.lex(code), "symbols": lexer.symbols}
+    data["tree"] = parse_tree(data)
+    data["opz_lines"] = program_to_opz(data["tree"])
+    return data
+
+
+def parse_tree(data):
+    analyzer = SyntaxAnalyzer(Tokenizer.from_columns(*data["columns"], data["symbols"]))
+    if analyzer.check():
+        raise SyntaxError("Программа корпуса не разобралась")
+    return analyzer.tree
+
+
+STAGES = {
+    "scaner": lambda data: tokenize(data["code"]),
+    "parser": parse_tree,
+    "opz": lambda data: program_to_opz(data["tree"]),
+    "cpp": lambda data: parse_opz(data["opz_lines"]),
+}
+
+
+def measure(func, repeat):
+    """Лучшее и медианное время одного вызова по repeat сериям timeit."""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    times = [elapsed / number for elapsed in timer.repeat(repeat, number)]
+    return {"best": min(times), "median": statistics.median(times), "number": number, "repeat": repeat}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, stages, repeat=5, seed=0):
+    """Словарь результатов в формате JSON-файла."""
+    report = {
+        "version": FORMAT_VERSION,
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "corpus": {},
+        "results": {},
+    }
+    for size in sizes:
+        data = prepare(size, seed)
+        statements, depth, expression_length, identifiers = SIZES[size]
+        report["corpus"][size] = {
+            "statements": statements, "depth": depth, "expression_length": expression_length,
+            "identifiers": identifiers, "seed": seed, "lines": len(data["lines"]),
+            "bytes": len(data["code"].encode("utf-8")), "tokens": len(data["columns"][0]),
+            "opz_lines": len(data["opz_lines"]),
+        }
+        for stage in stages:
+            func = STAGES[stage]
+            result = measure(lambda: func(data), repeat)
+            result["lines_per_second"] = len(data["lines"]) / result["best"]
+            report["results"][f"{stage}/{size}"] = result
+            print(f"{stage:7} {size:17} {result['best'] * 1e3:10.2f} мс  "
+                  f"{result['lines_per_second'] / 1e3:8.1f} тыс. строк/с", flush=True)
+    return report
+
+
+def compare(report, baseline, threshold):
+    """Печатает отношение к прошлому замеру; возвращает список регрессий."""
+    regressions = []
+    if baseline.get("version") != FORMAT_VERSION:
+        print("Формат файла сравнения другой, сравнение пропущено")
+        return regressions
+    print(f"\nСравнение с {baseline.get('commit') or 'прошлым замером'}:")
+    for key, result in report["results"].items():
+        old = baseline["results"].get(key)
+        if old is None or baseline["corpus"].get(key.split("/")[1]) != report["corpus"][key.split("/")[1]]:
+            continue
+        ratio = result["best"] / old["best"]
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  регрессия"
+            regressions.append(key)
+        print(f"  {key:25} x{ratio:5.2f}{mark}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="small,medium,large",
+                        help=f"размеры корпуса через запятую из {', '.join(SIZES)}")
+    parser.add_argument("--stages", default=",".join(STAGES), help="этапы через запятую")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="записать результаты в JSON")
+    parser.add_argument("--compare", help="JSON прошлого замера")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="допустимое замедление, доля (по умолчанию %(default)s)")
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(",")
+    stages = args.stages.split(",")
+    for name in sizes:
+        if name not in SIZES:
+            parser.error(f"неизвестный размер: {name} (есть {', '.join(SIZES)})")
+    for name in stages:
+        if name not in STAGES:
+            parser.error(f"неизвестный этап: {name} (есть {', '.join(STAGES)})")
+
+    report = run_suite(sizes, stages, args.repeat, args.seed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Дисковый кэш результатов лексического анализа и перевода в ОПЗ.
+
+Ключ записи - SHA-256 от байтов исходника и версии стадии:
+для лексем это KEYWORDS, OPERATORS, DELIMITERS, TOKEN_PATTERNS и версия
+двоичного формата token_stream, для ОПЗ - текст модулей opz, parser_l4,
+scopes и syntax_tree (ОПЗ строится по дереву разбора). Поменялись
+таблицы или конвертер - старые записи просто перестают находиться.
+
+    <каталог>/ab/abcdef....tks   лексемы в формате token_stream
+    <каталог>/ab/abcdef....opz   строки opz.program_to_opz
+
+Запись идёт во временный файл и переименовывается os.replace, поэтому
+читатели видят либо старый файл, либо новый целиком. Ключ зависит только
+от содержимого, так что два процесса, одновременно пишущие одну запись,
+пишут одно и то же. Прочитанная запись "трогается" (mtime), а при
+превышении max_size удаляются записи с самым старым mtime (LRU).
+"""
+import hashlib
+import os
+import tempfile
+
+import opz
+import parser_l4
+import scaner
+import scopes
+import syntax_tree
+import token_stream
+from parser_l4 import Tokenizer
+
+DEFAULT_MAX_SIZE = 256 << 20
+# Доля max_size, до которой чистится кэш: запас, чтобы не чистить на каждой записи
+EVICT_TO = 0.8
+STAGES = ("tokens", "opz")
+_SUFFIXES = {"tokens": ".tks", "opz": ".opz"}
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else repr(part).encode("utf-8"))
+    return h.digest()
+
+
+def stage_versions():
+    """Версии стадий: меняются вместе с таблицами лексем и кодом конвертера ОПЗ."""
+    lexer_version = _digest(scaner.KEYWORDS, scaner.OPERATORS, scaner.DELIMITERS,
+                            scaner.TOKEN_PATTERNS, token_stream.VERSION)
+    # ОПЗ строится по дереву разбора, имена переменных - по таблице имён:
+    # версия - текст всех этих модулей
+    sources = []
+    for module in (opz, parser_l4, scopes, syntax_tree):
+        with open(module.__file__, "rb") as f:
+            sources.append(f.read())
+    opz_version = _digest(*sources)
+    return {"tokens": lexer_version, "opz": opz_version}
+
+
+class Cache:
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        self.versions = stage_versions()
+        self.hits = dict.fromkeys(STAGES, 0)
+        self.misses = dict.fromkeys(STAGES, 0)
+        # Сколько байт записал этот процесс с последней проверки размера
+        self._written = None
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, stage, source):
+        """Ключ записи по байтам исходника."""
+        return hashlib.sha256(self.versions[stage] + source).hexdigest()
+
+    def path(self, stage, key):
+        return os.path.join(self.directory, key[:2], key + _SUFFIXES[stage])
+
+    def _open(self, stage, source):
+        """Путь существующей записи (с обновлением mtime) или None."""
+        path = self.path(stage, self.key(stage, source))
+        try:
+            os.utime(path)
+        except OSError:
+            # Нет записи или к ней нет доступа - в обоих случаях промах
+            self.misses[stage] += 1
+            return None
+        self.hits[stage] += 1
+        return path
+
+    # Лексемы
+
+    def get_tokens(self, source):
+        """Tokenizer по кэшированным лексемам исходника (bytes) или None."""
+        path = self._open("tokens", source)
+        if path is None:
+            return None
+        try:
+            return Tokenizer.from_binary(path)
+        except (OSError, ValueError):
+            # Запись удалена другим процессом между utime и чтением
+            self.hits["tokens"] -= 1
+            self.misses["tokens"] += 1
+            return None
+
+    def put_tokens(self, source, kinds, indices, lines, symbols):
+        self._write("tokens", source,
+                    lambda f: token_stream.write_binary(f, kinds, indices, lines, symbols))
+
+    # ОПЗ
+
+    def get_opz(self, source):
+        """Строки ОПЗ исходника (bytes) или None."""
+        path = self._open("opz", source)
+        if path is None:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read().splitlines()
+        except OSError:
+            self.hits["opz"] -= 1
+            self.misses["opz"] += 1
+            return None
+
+    def put_opz(self, source, opz_lines):
+        data = "".join(line + "\n" for line in opz_lines).encode("utf-8")
+        self._write("opz", source, lambda f: f.write(data))
+
+    # Запись и вытеснение
+
+    def _write(self, stage, source, write):
+        path = self.path(stage, self.key(stage, source))
+        folder = os.path.dirname(path)
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                size = f.tell()
+            os.replace(tmp, path)
+        except OSError:
+            # Кэш не должен ронять конвейер: запись просто не сохраняется
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        if self._written is None or self._written + size > self.max_size * (1 - EVICT_TO):
+            self.evict()
+        else:
+            self._written += size
+
+    def entries(self):
+        """Список (mtime, размер, путь) всех записей (без недописанных .tmp)."""
+        result = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    # Файл _write другого процесса, ещё не переименованный
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                result.append((st.st_mtime, st.st_size, path))
+        return result
+
+    def evict(self):
+        """Удаляет самые давно использованные записи, пока кэш больше max_size."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_size:
+            limit = self.max_size * EVICT_TO
+            entries.sort()
+            for _, size, path in entries:
+                if total <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._written = 0
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        """Счётчики попаданий и промахов по стадиям этого процесса."""
+        return {"hits": dict(self.hits), "misses": dict(self.misses)}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Состояние дискового кэша транслятора")
+    parser.add_argument("directory")
+    parser.add_argument("--clear", action="store_true", help="удалить все записи")
+    args = parser.parse_args()
+
+    cache = Cache(args.directory)
+    if args.clear:
+        cache.clear()
+    entries = cache.entries()
+    print(f"Записей: {len(entries)}, размер: {sum(size for _, size, _ in entries) / 1024:.1f} КБ")
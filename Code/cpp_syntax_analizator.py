@@ -1,95 +1,435 @@
 import re
+from collections import deque
+
+from opz import ARRAY_DECLARATION, ASSIGNMENTS, JUMP, JUMP_FALSE, PRINTF, RETURN, is_label, split_items
+from syntax_tree import BINARY_PRIORITY, Block, Visitor, format_declaration, format_expression
 
 # Операции и ключевые слова
-binary_ops = {'+': '+', '-': '-', '*': '*', '/': '/', '<': '<', '>': '>', '==': '=='}
-commands = {'АЭМ': 'ARRAY_ACCESS', '=': 'ASSIGN', 'УПЛ': 'IF_COND', 'УЦ': 'CTRL_FLOW'}
+binary_ops = {op: op for op in BINARY_PRIORITY}
+commands = {'АЭМ': 'ARRAY_ACCESS', '=': 'ASSIGN', JUMP_FALSE: 'JUMP_IF_FALSE', JUMP: 'JUMP',
+            ARRAY_DECLARATION: 'DECLARE_ARRAY', PRINTF: 'PRINTF', RETURN: 'RETURN'}
+
+# Отступы по уровню вложенности; строка каждого уровня строится один раз
+_INDENTS = [""]
+
+
+def indent_string(level):
+    while len(_INDENTS) <= level:
+        _INDENTS.append(_INDENTS[-1] + "    ")
+    return _INDENTS[level]
+
+
+# Выражения короче этого склеиваются сразу в строку: копировать короткие
+# строки дешевле, чем собирать их из фрагментов
+ROPE_MIN = 256
+# Операнды, длины которых различаются меньше чем во столько раз, тоже
+# склеиваются в строку: в сбалансированном дереве каждый символ копируется
+# O(log n) раз, а rope нужен цепочкам, где короткий операнд добавляется
+# к длинному на каждом шаге
+ROPE_RATIO = 8
+
+
+def concat(*parts):
+    """
+    Выражение для стека OPZParser из строк и уже длинных выражений.
+    Длинное выражение - deque фрагментов текста (rope): к нему части
+    добавляются с краёв, а текст операндов не копируется. Если длинных
+    частей несколько, меньшие переносятся в самую длинную, так что
+    каждый фрагмент переносится не больше log n раз. Фрагменты не пустые.
+    """
+    base = None
+    for k, part in enumerate(parts):
+        if type(part) is not str and (base is None or len(part) > len(parts[base])):
+            base = k
+    if base is None:
+        text = "".join(parts)
+        return text if len(text) < ROPE_MIN else deque((text,))
+    rope = parts[base]
+    for part in reversed(parts[:base]):
+        if type(part) is not str:
+            rope.extendleft(reversed(part))
+        elif part:
+            rope.appendleft(part)
+    for part in parts[base + 1:]:
+        if type(part) is not str:
+            rope.extend(part)
+        elif part:
+            rope.append(part)
+    return rope
+
+
+def render(rope):
+    return rope if type(rope) is str else "".join(rope)
+
 
 # Простейший стековый интерпретатор OPЗ для восстановления C++ кода
 class OPZParser:
-    def __init__(self, tokens):
+    """
+    Восстановление C++ по ОПЗ с метками (opz.OpzGenerator) за один проход.
+    Метка, определённая раньше любого перехода на неё, - начало цикла:
+    следующее за ней условие с УПЛ открывает while. Остальные метки -
+    концы блоков, на них блок закрывается. Безусловный переход вперёд в
+    конце ветки if открывает else, переход назад на начало цикла замыкает
+    цикл. Больше ничего угадывать не нужно.
+
+    Выражения на стеке - строки или rope (см. concat), строка C++ собирается один
+    раз, когда оператор готов. Строки пишутся в stream, если он задан,
+    иначе собираются в output. parse() разбирает весь список tokens;
+    begin(), feed() по элементу и finish() - то же по частям (iter_cpp).
+    """
+
+    def __init__(self, tokens, stream=None):
         self.tokens = tokens
-        self.pos = 0
-        self.output = []
+        self.stream = stream
+        self.output = [] if stream is None else None
         self.stack = []
         self.indent_level = 0
-        self.loop_context = []
+        # Открытые блоки: [вид, метка конца, метка начала цикла]
+        self.blocks = []
+        # Метка начала цикла, после которой ещё не было условия
+        self.loop_head = None
 
     def indent(self):
-        return '    ' * self.indent_level
+        return indent_string(self.indent_level)
 
-    def parse(self):
+    def write(self, line):
+        if self.stream is None:
+            self.output.append(line)
+        else:
+            self.stream.write(line + "\n")
+
+    def statement(self, rope):
+        self.write(self.indent() + render(rope) + ';')
+        self.loop_head = None
+
+    @staticmethod
+    def condition(rope):
+        """Условие в скобках; операции на стеке уже в скобках."""
+        return rope if OPZParser.parenthesized(rope) else concat('(', rope, ')')
+
+    @staticmethod
+    def operation(left, op, right):
+        """(left op right) - частный случай concat, самый частый."""
+        if type(right) is str:
+            if type(left) is not str:
+                # Цепочка операций над длинным выражением: (((a + b) - c) * d)
+                left.appendleft('(')
+                left.append(f' {op} {right})')
+                return left
+            n, m = len(left), len(right)
+            if n + m < ROPE_MIN or (n * ROPE_RATIO > m and m * ROPE_RATIO > n):
+                return f'({left} {op} {right})'
+        return concat('(', left, f' {op} ', right, ')')
+
+    @staticmethod
+    def parenthesized(rope):
+        return (rope if type(rope) is str else rope[0]).startswith('(')
+
+    def flush(self):
+        """
+        Выражения со стека - отдельные операторы. Присваивание может стоять
+        внутри выражения, поэтому оператор пишется только на метке, переходе
+        или в конце, без внешних скобок.
+        """
+        for expression in self.stack:
+            self.statement(self.bare(expression))
+        self.stack.clear()
+
+    @staticmethod
+    def bare(rope):
+        """Выражение без внешних скобок: операции на стеке всегда в скобках."""
+        if not OPZParser.parenthesized(rope):
+            return rope
+        if type(rope) is str:
+            return rope[1:-1]
+        # Выражение со стека больше нигде не используется: скобки снимаются на месте
+        first = rope.popleft()[1:]
+        if first:
+            rope.appendleft(first)
+        last = rope.pop()[:-1]
+        if last:
+            rope.append(last)
+        return rope
+
+    def pop_many(self):
+        """Снимает со стека число n и n элементов под ним."""
+        count = int(self.stack.pop())
+        items = self.stack[len(self.stack) - count:]
+        del self.stack[len(self.stack) - count:]
+        return items
+
+    def open_block(self, header, kind, end, head=None):
+        self.write(f'{self.indent()}{render(header)} {{')
+        self.indent_level += 1
+        self.blocks.append([kind, end, head])
+
+    def close_block(self):
+        self.blocks.pop()
+        self.indent_level -= 1
+        self.write(f'{self.indent()}}}')
+
+    def place_label(self, label):
+        self.flush()
+        if self.blocks and self.blocks[-1][1] == label:
+            self.close_block()
+        elif any(block[1] == label for block in self.blocks):
+            raise SyntaxError(f"Метка {label} закрывает не самый внутренний блок")
+        elif not (self.blocks and self.blocks[-1][0] == 'else' and self.blocks[-1][2] == label):
+            self.loop_head = label
+
+    def jump_if_false(self):
+        label = self.stack.pop()
+        condition = self.stack.pop()
+        self.flush()
+        if self.loop_head is not None:
+            self.open_block(concat('while ', self.condition(condition)), 'while', label, self.loop_head)
+            self.loop_head = None
+        else:
+            self.open_block(concat('if ', self.condition(condition)), 'if', label)
+
+    def jump(self):
+        label = self.stack.pop()
+        self.flush()
+        if not self.blocks:
+            raise SyntaxError(f"Переход {label} {JUMP} вне блока")
+        block = self.blocks[-1]
+        if block[0] == 'while' and block[2] == label:
+            return  # переход на начало цикла; цикл закроет метка конца
+        if block[0] != 'if':
+            raise SyntaxError(f"Неожиданный переход {label} {JUMP}")
+        # Конец ветки then: дальше ветка else до метки label.
+        # Метку конца then (block[1]) запоминаем, чтобы не счесть её началом цикла
+        self.write(f"{indent_string(self.indent_level - 1)}}} else {{")
+        block[:] = ['else', label, block[1]]
+
+    def begin(self):
         # Добавим стандартные заголовки C++
-        self.output.append("#include <iostream>")
-        self.output.append("using namespace std;")
-        self.output.append("int main() {")
+        self.write("#include <iostream>")
+        self.write("using namespace std;")
+        self.write("int main() {")
         self.indent_level += 1
 
-        while self.pos < len(self.tokens):
-            token = self.tokens[self.pos]
-            if token in binary_ops:
-                b = self.stack.pop()
-                a = self.stack.pop()
-                self.stack.append(f'({a} {binary_ops[token]} {b})')
-            elif token == 'АЭМ':
-                index = self.stack.pop()
-                array = self.stack.pop()
-                self.stack.append(f'{array}[{index}]')
-            elif token == '=':
-                value = self.stack.pop()
-                var = self.stack.pop()
-                self.output.append(f'{self.indent()}{var} = {value};')
-            elif token == 'УПЛ':
-                condition = self.stack.pop()
-                self.output.append(f'{self.indent()}if {condition} {{')
-                self.indent_level += 1
-            elif token == 'УЦ':
-                # Разные случаи: while, for или конец блока
-                if self.loop_context and self.loop_context[-1] == 'for':
-                    self.indent_level -= 1
-                    self.output.append(f'{self.indent()}}}')
-                    self.loop_context.pop()
-                elif self.stack:
-                    condition = self.stack.pop()
-                    self.output.append(f'{self.indent()}while {condition} {{')
-                    self.indent_level += 1
-                else:
-                    self.indent_level -= 1
-                    self.output.append(f'{self.indent()}}}')
+    def feed(self, token):
+        """Один элемент ОПЗ."""
+        if token in binary_ops:
+            b = self.stack.pop()
+            a = self.stack.pop()
+            if type(a) is str and type(b) is str and len(a) + len(b) < ROPE_MIN:
+                # Короткие операнды - самый частый случай, без вызова operation
+                self.stack.append(f'({a} {token} {b})')
             else:
-                self.stack.append(token)
-            self.pos += 1
+                self.stack.append(self.operation(a, binary_ops[token], b))
+        elif token == '@':
+            self.stack.append(concat('(-', self.stack.pop(), ')'))
+        elif token == 'АЭМ':
+            indices = self.pop_many()
+            parts = [self.stack.pop()]
+            for index in indices:
+                parts += ['[', self.bare(index), ']']
+            self.stack.append(concat(*parts))
+        elif token in ASSIGNMENTS:
+            value = self.stack.pop()
+            var = self.stack.pop()
+            self.stack.append(self.operation(var, token, value))
+        elif token == PRINTF:
+            args = self.pop_many()
+            parts = ['printf(', self.stack.pop()]
+            for arg in args:
+                parts += [', ', self.bare(arg)]
+            parts.append(')')
+            self.flush()
+            self.statement(concat(*parts))
+        elif token == RETURN:
+            value = self.stack.pop()
+            self.flush()
+            self.statement(concat('return ', self.bare(value)))
+        elif token == ARRAY_DECLARATION:
+            dims = self.pop_many()
+            name = self.stack.pop()
+            type_name = self.stack.pop()
+            self.flush()
+            self.statement(type_name + ' ' + name + ''.join(f'[{dim}]' for dim in dims))
+        elif token == JUMP_FALSE:
+            self.jump_if_false()
+        elif token == JUMP:
+            self.jump()
+        elif is_label(token):
+            self.place_label(token[:-1])
+        else:
+            self.stack.append(token)
 
-        # Закрываем все открытые блоки
-        while self.indent_level > 0:
-            self.indent_level -= 1
-            self.output.append(f'{self.indent()}}}')
+    def finish(self):
+        self.flush()
+        if self.blocks:
+            raise SyntaxError(f"Метка {self.blocks[-1][1]} не определена")
+        self.indent_level -= 1
+        self.write('}')
 
+    def parse(self):
+        self.begin()
+        for token in self.tokens:
+            self.feed(token)
+        self.finish()
         return self.output
 
 
-def parse_opz(opz_lines):
+def is_header(line):
+    """Строки заголовка C++, которые попадают в файлы ОПЗ; в ОПЗ их нет."""
+    return line.startswith("#include") or line.startswith("using") or line.startswith("int main")
+
+
+def parse_opz(opz_lines, stream=None):
+    """Строки C++ по строкам ОПЗ; с stream они пишутся в поток, а результат - None."""
     # Очистка и разбиение токенов по пробелам, пропуская заголовки
     tokens = []
     for line in opz_lines:
         line = line.strip()
-        if not (line.startswith("#include") or line.startswith("using") or line.startswith("int main")):
-            tokens.extend(line.split())
-    parser = OPZParser(tokens)
+        if not is_header(line):
+            tokens.extend(split_items(line))
+    parser = OPZParser(tokens, stream)
     return parser.parse()
 
 
-# Пример использования
+def iter_cpp(opz_lines):
+    """
+    Строки C++ по мере чтения строк ОПЗ: opz_lines может быть открытым
+    файлом, он читается лениво. В памяти только стек выражений текущей
+    строки и открытые блоки, то есть объём зависит от длины строки и
+    глубины вложенности, а не от размера файла. Строка ОПЗ должна
+    содержать законченные операторы, как у OpzGenerator: в конце строки
+    выражения со стека пишутся как операторы.
+    """
+    parser = OPZParser(())
+    parser.begin()
+    for line in opz_lines:
+        line = line.strip()
+        if is_header(line):
+            continue
+        for token in split_items(line):
+            parser.feed(token)
+        parser.flush()
+        yield from parser.output
+        parser.output.clear()
+    parser.finish()
+    yield from parser.output
+
+
+class CppWriter(Visitor):
+    """
+    Восстановление C++ прямо по дереву программы (syntax_tree): структура
+    блоков известна точно, угадывать её по ОПЗ не нужно. Тела if, else,
+    while и for всегда пишутся в фигурных скобках.
+    """
+
+    def __init__(self):
+        self.output = []
+        self.indent_level = 0
+
+    def indent(self):
+        return indent_string(self.indent_level)
+
+    def line(self, text):
+        self.output.append(f'{self.indent()}{text}')
+
+    def body(self, node):
+        """Тело в фигурных скобках; открывающая скобка уже в строке заголовка."""
+        self.indent_level += 1
+        for statement in (node.statements if type(node) is Block else [node]):
+            self.visit(statement)
+        self.indent_level -= 1
+
+    def visit_Program(self, node):
+        if node.includes:
+            for name in node.includes:
+                self.output.append(f"#include <{name}>")
+        else:
+            self.output.append("#include <iostream>")
+        self.output.append("using namespace std;")
+        self.output.append("int main() {")
+        self.body(node.body)
+        self.output.append("}")
+
+    def visit_Block(self, node):
+        self.line('{')
+        self.body(node)
+        self.line('}')
+
+    def visit_Declaration(self, node):
+        self.line(format_declaration(node))
+
+    def visit_Printf(self, node):
+        args = "".join(f", {format_expression(arg)}" for arg in node.args)
+        self.line(f'printf({node.format}{args});')
+
+    def visit_Return(self, node):
+        self.line(f'return {format_expression(node.value)};')
+
+    def visit_ExprStatement(self, node):
+        self.line(f'{format_expression(node.expr)};')
+
+    def visit_If(self, node):
+        self.line(f'if ({format_expression(node.condition)}) {{')
+        self.body(node.then)
+        if node.otherwise is not None:
+            self.line('} else {')
+            self.body(node.otherwise)
+        self.line('}')
+
+    def visit_While(self, node):
+        self.line(f'while ({format_expression(node.condition)}) {{')
+        self.body(node.body)
+        self.line('}')
+
+    def visit_For(self, node):
+        init, condition, step = (format_expression(part) if part is not None else ""
+                                 for part in (node.init, node.condition, node.step))
+        # Пустые части без лишних пробелов: for (;;)
+        header = f"{init};{' ' if condition else ''}{condition};{' ' if step else ''}{step}"
+        self.line(f'for ({header}) {{')
+        self.body(node.body)
+        self.line('}')
+
+
+def reconstruct_from_ast(tree):
+    """Строки C++ по дереву, которое построил parser_l4.SyntaxAnalyzer."""
+    writer = CppWriter()
+    writer.visit(tree)
+    return writer.output
+
+
+# Пример использования: ОПЗ программы opz.code_example
 opz_input = [
-    "a b - 8 > УПЛ",
-    "a b + 20 < УЦ",
-    "x arr i АЭМ 3 + =",
+    "a b - 8 > М1 УПЛ",
+    "М2:",
+    "a b + 20 < М3 УПЛ",
+    "x arr i 1 АЭМ 3 + =",
+    "a a 1 + =",
+    "М2 БП",
+    "М3:",
     "i 0 =",
-    "i 10 < УЦ",
-    "y b i АЭМ 2 * =",
+    "М4:",
+    "i 10 < М5 УПЛ",
+    "y c i 1 АЭМ 2 * =",
     "i i 1 + =",
-    "УЦ"
+    "М4 БП",
+    "М5:",
+    "М1:",
 ]
 
-cpp_lines = parse_opz(opz_input)
-for line in cpp_lines:
-    print(line)
+if __name__ == "__main__":
+    import sys
+
+    from opz import code_example, parse_program
+
+    if len(sys.argv) > 1:
+        # python cpp_syntax_analizator.py output_opz.txt - C++ по файлу ОПЗ
+        with open(sys.argv[1], "r", encoding="utf-8") as f:
+            for line in iter_cpp(f):
+                print(line)
+        sys.exit()
+
+    parse_opz(opz_input, sys.stdout)
+
+    print()
+    for line in reconstruct_from_ast(parse_program(code_example)):
+        print(line)
@@ -0,0 +1,110 @@
+"""
+Генератор lexemes.py по таблице лексем lexemes_table.txt: служебные
+слова, операции и разделители с их номерами и таблица "первый символ ->
+знаки с этого символа" (длинные первыми) для мастер-выражения scaner.
+
+lexemes.py целиком определяется таблицей: --check строит текст модуля
+заново и сравнивает его с файлом побайтно, так что расхождение таблицы
+и модуля видно сразу (код выхода 1).
+
+    python gen_lexemes.py
+    python gen_lexemes.py --check
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TABLE_FILE = os.path.join(BASE_DIR, os.pardir, "lexemes_table.txt")
+MODULE_FILE = os.path.join(BASE_DIR, "lexemes.py")
+
+CLASS_TYPES = {"W": "Служебное слово", "O": "Операция", "R": "Разделитель"}
+
+
+def read_table(path=TABLE_FILE):
+    """Списки лексем по классам {"W": [...], "O": [...], "R": [...]} в порядке номеров."""
+    classes = {letter: {} for letter in CLASS_TYPES}
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    for lineno, line in enumerate(lines[2:], 3):
+        if not line.strip():
+            continue
+        # В самой лексеме может быть "|" (операция ||): код - первое поле, тип - последнее
+        code, rest = line.split(" | ", 1)
+        lexeme, type_name = rest.rsplit(" | ", 1)
+        letter, number = code[:1], code[1:]
+        if letter not in classes or not number.isdigit() or CLASS_TYPES[letter] != type_name:
+            raise ValueError(f"{path}:{lineno}: неверная строка таблицы: {line!r}")
+        if int(number) in classes[letter]:
+            raise ValueError(f"{path}:{lineno}: повторный код {code}")
+        classes[letter][int(number)] = lexeme
+    result = {}
+    for letter, table in classes.items():
+        if sorted(table) != list(range(1, len(table) + 1)):
+            raise ValueError(f"{path}: номера класса {letter} идут не подряд с 1")
+        result[letter] = [table[idx] for idx in range(1, len(table) + 1)]
+    return result
+
+
+def first_char_table(symbols):
+    """Первый символ -> знаки, начинающиеся с него, от длинных к коротким."""
+    table = {}
+    for symbol in symbols:
+        table.setdefault(symbol[0], []).append(symbol)
+    return {char: sorted(group, key=len, reverse=True) for char, group in table.items()}
+
+
+def render(classes):
+    def tuple_lines(name, items):
+        lines = [f"{name} = ("]
+        for idx in range(0, len(items), 8):
+            lines.append("    " + " ".join(f"{item!r}," for item in items[idx:idx + 8]))
+        lines.append(")")
+        return lines
+
+    out = [
+        "# Сгенерировано gen_lexemes.py из lexemes_table.txt, вручную не править:",
+        "#     python gen_lexemes.py          - пересоздать",
+        "#     python gen_lexemes.py --check  - проверить, что модуль совпадает с таблицей",
+        "",
+        "# Номер лексемы в классе = позиция в кортеже + 1 (W1 - KEYWORDS[0])",
+    ]
+    out += tuple_lines("KEYWORDS", classes["W"])
+    out += tuple_lines("OPERATORS", classes["O"])
+    out += tuple_lines("DELIMITERS", classes["R"])
+    out += ["", "# Первый символ операции или разделителя -> знаки с него, длинные первыми",
+            "SYMBOLS_BY_FIRST_CHAR = {"]
+    for char, group in first_char_table(classes["O"] + classes["R"]).items():
+        symbols = ", ".join(repr(symbol) for symbol in group)
+        out.append(f"    {char!r}: ({symbols}{',' if len(group) == 1 else ''}),")
+    out.append("}")
+    return "\n".join(out) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор lexemes.py по lexemes_table.txt")
+    parser.add_argument("--table", default=TABLE_FILE)
+    parser.add_argument("--output", default=MODULE_FILE)
+    parser.add_argument("--check", action="store_true", help="только проверить, что модуль совпадает с таблицей")
+    args = parser.parse_args()
+
+    text = render(read_table(args.table))
+    if args.check:
+        try:
+            with open(args.output, "r", encoding="utf-8") as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current != text:
+            print(f"{args.output} не совпадает с {args.table}: запустите python gen_lexemes.py", file=sys.stderr)
+            return 1
+        print(f"{args.output} совпадает с таблицей")
+        return 0
+    with open(args.output, "w", encoding="utf-8") as f:
+        f.write(text)
+    print(f"Записан {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,437 @@
+"""
+Инкрементальный лексический и синтаксический анализ для редактора.
+
+IncrementalDocument хранит текст построчно вместе с лексемами каждой
+строки и состоянием "внутри /* комментария" на её начале. Правка
+(диапазон + новый текст) перелексирует только затронутые строки и идёт
+дальше лишь пока меняется состояние комментария.
+
+Полный разбор запоминает по строкам начала операторов блоков (позиция
+и глубина вложенности блоков) и ошибки с позициями, на которых о них
+сообщено. После правки разбор возобновляется с последнего начала
+оператора перед ней и идёт, пока не дойдёт за правкой до начала
+оператора, записанного прежним разбором на той же глубине: дальше
+состояние разбора то же, что и раньше, и заменяются только ошибки
+между этими двумя точками - в том числе если ошибки есть рядом.
+Если блок кончается раньше, перепроверяется объемлющий его оператор.
+Полный разбор нужен, только если правка меняет фигурные скобки
+несбалансированно (вставка одной '{' перестраивает весь остаток
+программы) или касается текста до '{' блока main.
+
+Проверка только синтаксическая (SyntaxAnalyzer с semantic=False):
+о необъявленных и повторно объявленных именах, в отличие от
+SyntaxAnalyzer().check() и translator.translate, здесь не сообщается -
+о каждом необъявленном имени говорится один раз на всю программу,
+и такие ошибки зависят от текста далеко от правки.
+
+Строки и столбцы в правках считаются с 0, как в LSP; в сообщениях
+об ошибках строки нумеруются с 1.
+"""
+from array import array
+from itertools import compress
+
+from parser_l4 import LITERALS, SyntaxAnalyzer, Tokenizer, syntax_error
+from scaner import (CLASS_INDEX, ERROR, FIXED_INDEX, GROUP_KINDS, KIND_I, KIND_O, KIND_R, KIND_W, LOOKUP, MASTER_RE,
+                    UNCLOSED, SymbolTable)
+
+_BRACES = {LITERALS["{"]: 1, LITERALS["}"]: -1}
+
+
+class LineTokens:
+    """Лексемы одной строки: столбцы классов, номеров и позиций."""
+    __slots__ = ("kinds", "indices", "cols", "in_comment", "errors")
+
+    def __init__(self):
+        self.kinds = array("b")
+        self.indices = array("i")
+        self.cols = array("i")
+        self.in_comment = False  # строка заканчивается внутри /* комментария
+        self.errors = []         # столбцы неизвестных символов
+
+    def braces(self):
+        """Фигурные скобки строки: +1 для '{', -1 для '}'."""
+        return [_BRACES[kind, index] for kind, index in zip(self.kinds, self.indices)
+                if kind == KIND_R and (kind, index) in _BRACES]
+
+
+def _balanced(braces):
+    """Каждая '}' закрывает '{' из того же списка, и все '{' закрыты."""
+    depth = 0
+    for brace in braces:
+        depth += brace
+        if depth < 0:
+            return False
+    return not depth
+
+
+class _Synced(Exception):
+    """Разбор дошёл до начала оператора, с которого он совпадает с прежним."""
+
+
+class _Analyzer(SyntaxAnalyzer):
+    """
+    SyntaxAnalyzer без семантики, запоминающий начала операторов блоков
+    (позиция, глубина) и позиции, на которых сообщено об ошибках.
+    resume(pos, depth) -> True останавливает разбор исключением _Synced.
+    """
+
+    def __init__(self, tokenizer, depth=0, resume=None):
+        super().__init__(tokenizer, max_errors=1 << 30, semantic=False)
+        self.depth = depth
+        self.resume = resume
+        self.starts = []
+        self.error_positions = []
+        # Позиция '{' блока main
+        self.main_brace = None
+
+    def report(self, error):
+        self.error_positions.append(self.tok.pos)
+        super().report(error)
+
+    def parse_statements(self):
+        if not self.depth:
+            # Только что прочитана '{' блока main
+            self.main_brace = self.tok.pos - 1
+        self.depth += 1
+        try:
+            return super().parse_statements()
+        finally:
+            self.depth -= 1
+
+    def begin_statement(self):
+        pos = self.tok.pos
+        if self.resume is not None and self.resume(pos, self.depth):
+            raise _Synced()
+        self.starts.append((pos, self.depth))
+
+
+class IncrementalDocument:
+    def __init__(self, text=""):
+        self.symbols = SymbolTable()
+        self._numbers = {}
+        self._constants = {}
+        self._indexers = [
+            CLASS_INDEX[KIND_W].get,
+            self.symbols.intern,
+            CLASS_INDEX[KIND_O].__getitem__,
+            CLASS_INDEX[KIND_R].__getitem__,
+            self._intern_number,
+            self._intern_constant,
+        ]
+        self.lines = text.split("\n")
+        self.lexical_error_count = 0
+        self.tokens = []
+        self.starts_in_comment = []
+        state = False
+        for line in self.lines:
+            self.starts_in_comment.append(state)
+            line_tokens = self.lex_line(line, state)
+            self.lexical_error_count += len(line_tokens.errors)
+            self.tokens.append(line_tokens)
+            state = line_tokens.in_comment
+        # По строкам: начала операторов блоков (номер лексемы в строке,
+        # глубина) и синтаксические ошибки (номер лексемы, на которой о ней
+        # сообщено, сдвиг её строки от строки этой лексемы, текст без номера
+        # строки); ошибки в конце файла - отдельно
+        self.statement_starts = []
+        self.line_errors = []
+        self.eof_errors = []
+        # (строка, номер лексемы) сразу за '{' блока main: с неё разбор
+        # возобновляется, если перед правкой нет начал операторов
+        self.main_body = None
+        # Сведения о последней правке: сколько строк перелексировано
+        # и каким способом перепроверялся синтаксис
+        self.last_relexed = len(self.lines)
+        self.last_check = None
+        self.full_check()
+
+    # Лексический уровень
+
+    def _intern_number(self, value):
+        index = self._numbers.get(value)
+        if index is None:
+            index = self._numbers[value] = self.symbols.add_number(value)
+        return index
+
+    def _intern_constant(self, value):
+        index = self._constants.get(value)
+        if index is None:
+            index = self._constants[value] = self.symbols.add_constant(value)
+        return index
+
+    def lex_line(self, text, in_comment):
+        result = LineTokens()
+        pos = 0
+        if in_comment:
+            end = text.find("*/")
+            if end == -1:
+                result.in_comment = True
+                return result
+            pos = end + 2
+
+        indexers = self._indexers
+        fixed = FIXED_INDEX.get
+        for match in MASTER_RE.finditer(text, pos):
+            kind = GROUP_KINDS[match.lastindex]
+            if kind >= 0 or kind == LOOKUP:
+                value = match.group()
+                start = match.start()
+                if kind == LOOKUP:
+                    found = fixed(value)
+                    kind, index = found if found is not None else (KIND_I, indexers[KIND_I](value))
+                else:
+                    index = indexers[kind](value)
+                if index is not None:
+                    result.kinds.append(kind)
+                    result.indices.append(index)
+                    result.cols.append(start)
+            elif kind == UNCLOSED:
+                # Комментарий не закрыт в этой строке
+                result.in_comment = True
+                break
+            elif kind == ERROR:
+                result.errors.append(match.start())
+        return result
+
+    def text(self):
+        return "\n".join(self.lines)
+
+    def apply_edit(self, start_line, start_col, end_line, end_col, new_text):
+        """
+        Заменяет текст от (start_line, start_col) до (end_line, end_col)
+        на new_text. Диагностики после правки - в diagnostics().
+        """
+        prefix = self.lines[start_line][:start_col]
+        suffix = self.lines[end_line][end_col:]
+        new_lines = (prefix + new_text + suffix).split("\n")
+
+        old_tokens = self.tokens[start_line:end_line + 1]
+        self.lexical_error_count -= sum(len(t.errors) for t in old_tokens)
+        self.lines[start_line:end_line + 1] = new_lines
+        self.tokens[start_line:end_line + 1] = [None] * len(new_lines)
+        self.starts_in_comment[start_line + 1:end_line + 1] = [False] * (len(new_lines) - 1)
+        self.statement_starts[start_line:end_line + 1] = [()] * len(new_lines)
+        self.line_errors[start_line:end_line + 1] = [()] * len(new_lines)
+
+        # Перелексирование: правленые строки и дальше, пока не совпадёт
+        # состояние комментария на начале следующей строки
+        line = start_line
+        stop = start_line + len(new_lines)
+        state = self.starts_in_comment[start_line]
+        while True:
+            if line >= stop:
+                if line >= len(self.lines) or self.starts_in_comment[line] == state:
+                    break
+                old_tokens.append(self.tokens[line])
+                self.lexical_error_count -= len(self.tokens[line].errors)
+                stop = line + 1
+            self.starts_in_comment[line] = state
+            line_tokens = self.lex_line(self.lines[line], state)
+            self.lexical_error_count += len(line_tokens.errors)
+            self.tokens[line] = line_tokens
+            state = line_tokens.in_comment
+            line += 1
+        self.last_relexed = stop - start_line
+
+        # Начала операторов и ошибки строк, перелексированных за правкой,
+        # тоже устарели; перепроверка заменит их вместе с ошибками вокруг
+        self.statement_starts[start_line:stop] = [()] * (stop - start_line)
+        self.line_errors[start_line:stop] = [()] * (stop - start_line)
+
+        old_braces = [b for t in old_tokens for b in t.braces()]
+        new_braces = [b for t in self.tokens[start_line:stop] for b in t.braces()]
+        if old_braces != new_braces and not (_balanced(old_braces) and _balanced(new_braces)):
+            self.full_check()
+        elif not self.local_check(start_line, stop):
+            self.full_check()
+
+    # Синтаксический уровень
+
+    def _columns(self, first_line, first_offset, last_line):
+        """
+        Столбцы лексем от (first_line, first_offset) до конца строки
+        last_line - 1 и для каждой из этих строк позиция её нулевой лексемы
+        в столбцах (у first_line она отрицательна при first_offset > 0).
+        """
+        kinds = array("b")
+        indices = array("i")
+        lines = array("i")
+        bases = []
+        for line in range(first_line, last_line):
+            line_tokens = self.tokens[line]
+            offset = first_offset if line == first_line else 0
+            bases.append(len(kinds) - offset)
+            count = len(line_tokens.kinds) - offset
+            if count > 0:
+                kinds.extend(line_tokens.kinds[offset:])
+                indices.extend(line_tokens.indices[offset:])
+                lines.extend(array("i", [line + 1]) * count)
+        return kinds, indices, lines, bases
+
+    def _by_line(self, analyzer, first_line, bases):
+        """
+        Начала операторов и ошибки разбора analyzer, разложенные по строкам
+        документа: {строка: [...]} в формате statement_starts и line_errors.
+        Ошибки в конце лексем попадают в список под ключом None.
+        """
+        lines = analyzer.tok.lines
+        count = len(analyzer.tok)
+        starts = {}
+        for pos, depth in analyzer.starts:
+            line = lines[pos] - 1
+            starts.setdefault(line, []).append((pos - bases[line - first_line], depth))
+        errors = {}
+        for error, pos in zip(analyzer.errors, analyzer.error_positions):
+            error_line = getattr(error, "line", None)
+            if pos >= count or error_line is None:
+                errors.setdefault(None, []).append(error)
+                continue
+            line = lines[pos] - 1
+            message = str(error)[len(f"[Строка {error_line}] "):]
+            errors.setdefault(line, []).append((pos - bases[line - first_line], error_line - 1 - line, message))
+        return starts, errors
+
+    def full_check(self):
+        count = len(self.lines)
+        kinds, indices, lines, bases = self._columns(0, 0, count)
+        analyzer = _Analyzer(Tokenizer.from_columns(kinds, indices, lines, self.symbols))
+        try:
+            analyzer.parse_program()
+        except SyntaxError as e:
+            analyzer.report(e)
+        except RecursionError:
+            analyzer.report(analyzer.nesting_error())
+        starts, errors = self._by_line(analyzer, 0, bases)
+        self.statement_starts = [()] * count
+        self.line_errors = [()] * count
+        for line, items in starts.items():
+            self.statement_starts[line] = tuple(items)
+        self.eof_errors = errors.pop(None, [])
+        for line, items in errors.items():
+            self.line_errors[line] = tuple(items)
+        self.main_body = None
+        if analyzer.main_brace is not None:
+            line = lines[analyzer.main_brace] - 1
+            self.main_body = (line, analyzer.main_brace + 1 - bases[line])
+        self.last_check = "full"
+
+    def _previous_start(self, line, offset, depth=None):
+        """
+        Последнее начало оператора перед (line, offset) - любое или на
+        глубине depth: (строка, номер лексемы, глубина) или None.
+        """
+        while line >= 0:
+            for start, level in reversed(self.statement_starts[line]):
+                if start >= offset:
+                    continue
+                if depth is None or level == depth:
+                    return line, start, level
+                if level < depth:
+                    # Вышли из блока, не встретив объемлющего оператора
+                    return None
+            line -= 1
+            offset = 1 << 30
+        return None
+
+    def local_check(self, first_line, stop_line):
+        """
+        Перепроверка вокруг перелексированных строк first_line..stop_line-1.
+        Возвращает False, если без полного разбора не обойтись.
+        """
+        start = self._previous_start(first_line, 0)
+        if start is None and self.main_body is not None and self.main_body[0] < first_line:
+            start = self.main_body + (1,)
+        while start is not None:
+            line, offset, depth = start
+            synced = self._reparse(line, offset, depth, stop_line)
+            if synced is None:
+                return False
+            if synced:
+                self.last_check = "local"
+                return True
+            # Блок кончился до совпадения: перепроверяется оператор, его содержащий
+            start = self._previous_start(line, offset, depth - 1)
+        return False
+
+    def _reparse(self, line, offset, depth, stop_line):
+        """
+        Разбор операторов блока глубины depth с (line, offset) до первого
+        начала оператора в строках от stop_line, записанного прежним разбором
+        на той же глубине. True - совпадение найдено и результаты заменены,
+        False - блок кончился раньше, None - документ кончился раньше.
+        Конец блока main заканчивает и весь разбор, это тоже совпадение.
+        """
+        window_end = stop_line + 2
+        main_end = False
+        while True:
+            window_end = min(window_end, len(self.lines))
+            kinds, indices, lines, bases = self._columns(line, offset, window_end)
+            tokenizer = Tokenizer.from_columns(kinds, indices, lines, self.symbols)
+
+            def resume(pos, level):
+                if level != depth:
+                    return False
+                doc_line = lines[pos] - 1
+                return doc_line >= stop_line and \
+                    (pos - bases[doc_line - line], depth) in self.statement_starts[doc_line]
+
+            analyzer = _Analyzer(tokenizer, depth - 1, resume)
+            try:
+                analyzer.parse_statements()
+            except _Synced:
+                break
+            except RecursionError:
+                # Об ошибке сообщит полный разбор
+                return None
+            if tokenizer.pos < len(tokenizer):
+                if depth > 1:
+                    return False
+                # '}' блока main: лексемы дальше не разбираются, и ни начал
+                # операторов, ни ошибок за ней не было и нет; ошибки,
+                # о которых сообщено на самой '}', заменяются
+                main_end = True
+                break
+            if window_end >= len(self.lines):
+                return None
+            # Последний оператор мог не уместиться в окно: берём вдвое больше строк
+            window_end += window_end - line
+
+        sync_line = lines[tokenizer.pos] - 1
+        sync_offset = tokenizer.pos - bases[sync_line - line] + main_end
+        starts, errors = self._by_line(analyzer, line, bases)
+        for target, found in ((self.statement_starts, starts), (self.line_errors, errors)):
+            before = tuple(item for item in target[line] if item[0] < offset)
+            after = tuple(item for item in target[sync_line] if item[0] >= sync_offset)
+            for doc_line in range(line, sync_line + 1):
+                target[doc_line] = tuple(found.get(doc_line, ()))
+            target[line] = before + target[line]
+            target[sync_line] += after
+        return True
+
+    def lexical_errors(self):
+        if not self.lexical_error_count:
+            return []
+        errors = []
+        for line, line_tokens in enumerate(self.tokens):
+            for col in line_tokens.errors:
+                rest = self.lines[line][col:].rstrip()
+                errors.append(syntax_error(line + 1, f"Неизвестный символ: {rest[:10]}"))
+        return errors
+
+    def syntax_errors(self):
+        errors = []
+        line_errors = self.line_errors
+        for line in compress(range(len(line_errors)), line_errors):
+            for _, shift, message in line_errors[line]:
+                errors.append(syntax_error(line + 1 + shift, message))
+        return errors + self.eof_errors
+
+    def diagnostics(self):
+        errors = self.lexical_errors() + self.syntax_errors()
+        errors.sort(key=lambda e: getattr(e, "line", None) or len(self.lines) + 1)
+        return errors
+
+    def tokenizer(self):
+        """Tokenizer по всему документу для остальных стадий конвейера."""
+        kinds, indices, lines, _ = self._columns(0, 0, len(self.lines))
+        return Tokenizer.from_columns(kinds, indices, lines, self.symbols)
@@ -0,0 +1,44 @@
+# Сгенерировано gen_lexemes.py из lexemes_table.txt, вручную не править:
+#     python gen_lexemes.py          - пересоздать
+#     python gen_lexemes.py --check  - проверить, что модуль совпадает с таблицей
+
+# Номер лексемы в классе = позиция в кортеже + 1 (W1 - KEYWORDS[0])
+KEYWORDS = (
+    'int', 'char', 'float', 'double', 'return', 'if', 'else', 'for',
+    'while', 'do', 'switch', 'case', 'break', 'continue', 'default', 'void',
+    'static', 'struct', 'typedef', 'union', 'unsigned', 'signed', 'long', 'short',
+    'goto', 'sizeof', 'main', 'printf', 'scanf', '#include',
+)
+OPERATORS = (
+    '==', '!=', '<=', '>=', '&&', '||', '+=', '-=',
+    '*=', '/=', '%=', '+', '-', '*', '/', '%',
+    '=', '<', '>',
+)
+DELIMITERS = (
+    '(', ')', '{', '}', '[', ']', ',', ';',
+    '.',
+)
+
+# Первый символ операции или разделителя -> знаки с него, длинные первыми
+SYMBOLS_BY_FIRST_CHAR = {
+    '=': ('==', '='),
+    '!': ('!=',),
+    '<': ('<=', '<'),
+    '>': ('>=', '>'),
+    '&': ('&&',),
+    '|': ('||',),
+    '+': ('+=', '+'),
+    '-': ('-=', '-'),
+    '*': ('*=', '*'),
+    '/': ('/=', '/'),
+    '%': ('%=', '%'),
+    '(': ('(',),
+    ')': (')',),
+    '{': ('{',),
+    '}': ('}',),
+    '[': ('[',),
+    ']': (']',),
+    ',': (',',),
+    ';': (';',),
+    '.': ('.',),
+}
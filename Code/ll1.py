@@ -0,0 +1,441 @@
+"""
+Табличный предсказывающий LL(1)-анализатор. Грамматика читается из
+файла (по умолчанию grammar.txt), по ней строятся множества FIRST/FOLLOW
+и таблица разбора; сам разбор идёт по явному стеку целых чисел без
+рекурсии и без сравнения строк.
+
+Основной анализатор конвейера - parser_l4.SyntaxAnalyzer: он строит
+дерево, восстанавливается после ошибок и ведёт таблицу имён. LL1Parser
+только отвечает, принимается ли поток, зато grammar.txt - формальное
+описание языка, проверенное на LL(1), а разбор не упирается в глубину
+стека Python и быстрее там, где дерево не нужно. Грамматика правится
+вручную вместе с SyntaxAnalyzer, поэтому --verify сверяет их: типы,
+операции присваивания и уровни приоритета из grammar.txt - с таблицами
+parser_l4 и syntax_tree, а случайные программы, выведенные из грамматики,
+и их искажения оба анализатора должны принимать или отвергать одинаково.
+
+    python ll1.py tokens_output.txt
+    python ll1.py --table
+    python ll1.py --verify 1000
+"""
+import os
+import re
+
+from parser_l4 import CLASS_TYPES, FIXED_LEXEMES, FIXED_TYPES, LITERALS, TYPE_NAMES, SyntaxAnalyzer, Tokenizer
+from scaner import format_code
+from syntax_tree import ASSIGN_OPERATORS, BINARY_PRIORITY
+
+GRAMMAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammar.txt")
+
+EPSILON = "ε"
+END = "$"
+# Терминал, которому не соответствует ни одна лексема: пустая клетка таблицы
+NO_TERMINAL = "<нет>"
+TYPE_TERMINALS = {"id", "num", "str", "keyword", "symbol"}
+
+_SYMBOL_RE = re.compile(r'"[^"]+"|\S+')
+
+
+def read_grammar(path=GRAMMAR_FILE):
+    """
+    Возвращает список правил (левая часть, [символы правой части]).
+    Литералы остаются в кавычках, ε даёт пустую правую часть.
+    """
+    rules = []
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "->" not in line:
+                raise ValueError(f"{path}:{lineno}: ожидалось правило вида 'A -> ...'")
+            head, body = line.split("->", 1)
+            head = head.strip()
+            # Альтернативы делятся отдельно стоящей "|", а не "|" внутри кавычек ("||")
+            alternatives = [[]]
+            for symbol in _SYMBOL_RE.findall(body):
+                if symbol == "|":
+                    alternatives.append([])
+                else:
+                    alternatives[-1].append(symbol)
+            for symbols in alternatives:
+                rules.append((head, [] if symbols == [EPSILON] else symbols))
+    return rules
+
+
+def _is_terminal(symbol, nonterminals):
+    return symbol not in nonterminals
+
+
+def first_of(symbols, first, nonterminals):
+    """FIRST цепочки символов; EPSILON в результате - цепочка выводит пустую."""
+    result = set()
+    for symbol in symbols:
+        if _is_terminal(symbol, nonterminals):
+            result.add(symbol)
+            return result
+        result |= first[symbol] - {EPSILON}
+        if EPSILON not in first[symbol]:
+            return result
+    result.add(EPSILON)
+    return result
+
+
+def build_sets(rules):
+    nonterminals = {head for head, _ in rules}
+    first = {nt: set() for nt in nonterminals}
+    changed = True
+    while changed:
+        changed = False
+        for head, body in rules:
+            before = len(first[head])
+            first[head] |= first_of(body, first, nonterminals)
+            changed |= len(first[head]) != before
+
+    start = rules[0][0]
+    follow = {nt: set() for nt in nonterminals}
+    follow[start].add(END)
+    changed = True
+    while changed:
+        changed = False
+        for head, body in rules:
+            for pos, symbol in enumerate(body):
+                if _is_terminal(symbol, nonterminals):
+                    continue
+                before = len(follow[symbol])
+                rest = first_of(body[pos + 1:], first, nonterminals)
+                follow[symbol] |= rest - {EPSILON}
+                if EPSILON in rest:
+                    follow[symbol] |= follow[head]
+                changed |= len(follow[symbol]) != before
+    return first, follow
+
+
+class Grammar:
+    """
+    Грамматика, сведённая к целым числам: терминалы 0..n-1
+    (0 - конец потока, 1 - пустая клетка), нетерминалы n.. ;
+    table[нетерминал - n][терминал] - номер правила или -1.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.first, self.follow = build_sets(rules)
+        nonterminals = [head for head, _ in rules]
+        nonterminals = sorted(set(nonterminals), key=nonterminals.index)
+        terminals = [END, NO_TERMINAL]
+        for _, body in rules:
+            for symbol in body:
+                if symbol not in self.first and symbol not in terminals:
+                    terminals.append(symbol)
+        for symbol in terminals[2:]:
+            if not symbol.startswith('"') and symbol not in TYPE_TERMINALS:
+                raise ValueError(f"Неизвестный символ грамматики: {symbol}")
+
+        self.terminals = terminals
+        self.nonterminals = nonterminals
+        self.symbols = terminals + nonterminals
+        number = {symbol: idx for idx, symbol in enumerate(self.symbols)}
+        self.start = number[rules[0][0]]
+        self.terminal_count = len(terminals)
+        # Правые части хранятся перевёрнутыми: так они сразу кладутся в стек
+        self.productions = [tuple(number[s] for s in reversed(body)) for _, body in rules]
+
+        self.table = [[-1] * len(terminals) for _ in nonterminals]
+        for rule_idx, (head, body) in enumerate(rules):
+            row = self.table[number[head] - self.terminal_count]
+            lookahead = first_of(body, self.first, nonterminals)
+            if EPSILON in lookahead:
+                lookahead = (lookahead - {EPSILON}) | self.follow[head]
+            for symbol in lookahead:
+                column = number[symbol]
+                if row[column] not in (-1, rule_idx):
+                    other = rules[row[column]]
+                    raise ValueError(
+                        f"Грамматика не LL(1): для {head} по {symbol} подходят правила "
+                        f"{self.format_rule(other)} и {self.format_rule((head, body))}")
+                row[column] = rule_idx
+
+        # Лексема сводится к "классу": паре (терминал-лексема, терминал-тип).
+        # Для каждого класса заранее решено, какое правило выбрать
+        # и какой терминал он закрывает, - в цикле разбора нет ветвлений.
+        none = number[NO_TERMINAL]
+        pairs = {(0, 0): 0}
+        self.fixed_classes = []
+        self.kind_classes = []
+        for kind, lexemes in enumerate(FIXED_LEXEMES):
+            if lexemes is None:
+                pair = (none, number.get(CLASS_TYPES[kind], none))
+                self.fixed_classes.append(None)
+                self.kind_classes.append(pairs.setdefault(pair, len(pairs)))
+            else:
+                classes = []
+                for lexeme, type_ in zip(lexemes, FIXED_TYPES[kind]):
+                    pair = (number.get(f'"{lexeme}"', none), number.get(type_, none))
+                    classes.append(pairs.setdefault(pair, len(pairs)))
+                self.fixed_classes.append(classes)
+                self.kind_classes.append(None)
+
+        self.class_table = []
+        for row in self.table:
+            self.class_table.append([row[lit] if row[lit] >= 0 else row[type_] for lit, type_ in pairs])
+        self.matches = [[term in pair for pair in pairs] for term in range(len(terminals))]
+
+    def classify(self, kinds, indices):
+        """Столбец классов лексем для цикла разбора; в конце - класс конца потока."""
+        fixed = self.fixed_classes
+        by_kind = self.kind_classes
+        classes = [by_kind[kind] if fixed[kind] is None else fixed[kind][index]
+                   for kind, index in zip(kinds, indices)]
+        classes.append(0)
+        return classes
+
+    @staticmethod
+    def format_rule(rule):
+        head, body = rule
+        return f"{head} -> {' '.join(body) or EPSILON}"
+
+    def dump(self):
+        lines = []
+        for nt in self.nonterminals:
+            lines.append(f"FIRST({nt}) = {{{', '.join(sorted(self.first[nt]))}}}")
+            lines.append(f"FOLLOW({nt}) = {{{', '.join(sorted(self.follow[nt]))}}}")
+        lines.append("")
+        for nt_idx, row in enumerate(self.table):
+            for term_idx, rule_idx in enumerate(row):
+                if rule_idx >= 0:
+                    lines.append(f"M[{self.nonterminals[nt_idx]}, {self.terminals[term_idx]}] = "
+                                 f"{self.format_rule(self.rules[rule_idx])}")
+        return "\n".join(lines)
+
+
+_default_grammar = None
+
+
+def default_grammar():
+    global _default_grammar
+    if _default_grammar is None:
+        _default_grammar = Grammar(read_grammar())
+    return _default_grammar
+
+
+class LL1Parser:
+    """
+    Предсказывающий анализатор по таблице Grammar. Как и SyntaxAnalyzer,
+    проверяет программу до закрывающей скобки main и не требует конца
+    потока сразу после неё.
+    """
+
+    def __init__(self, tokenizer, grammar=None):
+        self.tok = tokenizer
+        self.grammar = grammar or default_grammar()
+
+    def parse(self):
+        grammar = self.grammar
+        table = grammar.class_table
+        matches = grammar.matches
+        productions = grammar.productions
+        term_count = grammar.terminal_count
+        classes = grammar.classify(self.tok.kinds, self.tok.indices)
+
+        pos = self.tok.pos
+        token_class = classes[pos]
+        stack = [grammar.start]
+        pop = stack.pop
+        push = stack.extend
+
+        while stack:
+            top = pop()
+            if top < term_count:
+                if not matches[top][token_class]:
+                    self.tok.pos = pos
+                    raise self._error(pos, grammar.symbols[top])
+                pos += 1
+                token_class = classes[pos]
+            else:
+                rule = table[top - term_count][token_class]
+                if rule < 0:
+                    self.tok.pos = pos
+                    raise self._error(pos, None)
+                push(productions[rule])
+
+        self.tok.pos = pos
+
+    def _error(self, pos, expected):
+        if pos >= len(self.tok.kinds):
+            return SyntaxError("Ожидался токен, но достигнут конец файла")
+        tok = self.tok.token(pos)
+        if expected is None:
+            return SyntaxError(f"[Строка {tok.line}] Неожиданный токен: '{tok.lexeme}'")
+        if expected.startswith('"'):
+            return SyntaxError(f"[Строка {tok.line}] Ожидалось '{expected[1:-1]}', найдено '{tok.lexeme}'")
+        return SyntaxError(f"[Строка {tok.line}] Ожидался тип '{expected}', найдено '{tok.type}'")
+
+
+def compare_with_analyzer(grammar):
+    """
+    Расхождения грамматики с таблицами SyntaxAnalyzer: типы объявлений,
+    операции присваивания и уровни двуместных операций от Expr вниз.
+    """
+    alternatives = {}
+    for head, body in grammar.rules:
+        alternatives.setdefault(head, []).append(body)
+
+    def literals(head):
+        return {body[0][1:-1] for body in alternatives[head]}
+
+    differences = []
+    if literals("Type") != set(TYPE_NAMES):
+        differences.append(f"Type: {sorted(literals('Type'))} против TYPE_NAMES {sorted(TYPE_NAMES)}")
+    if literals("AssignOp") != set(ASSIGN_OPERATORS):
+        differences.append(f"AssignOp: {sorted(literals('AssignOp'))} против ASSIGN_OPERATORS")
+
+    # Уровень - правило "A -> B ATail", операции уровня - первые символы ATail
+    levels = []
+    head = alternatives["Expr"][0][0]
+    while len(alternatives[head]) == 1 and len(alternatives[head][0]) == 2:
+        operand, tail = alternatives[head][0]
+        operators = set()
+        for body in alternatives[tail]:
+            if body:
+                operators |= {body[0][1:-1]} if body[0].startswith('"') else literals(body[0])
+        levels.append(operators)
+        head = operand
+    expected = [{op for op, priority in BINARY_PRIORITY.items() if priority == level}
+                for level in sorted(set(BINARY_PRIORITY.values()))]
+    if levels != expected:
+        differences.append(f"уровни операций {levels} против BINARY_PRIORITY {expected}")
+    return differences
+
+
+def random_sentence(grammar, rnd, max_depth=16):
+    """
+    Коды лексем случайного вывода из аксиомы. Глубже max_depth каждый
+    нетерминал раскрывается по правилу с самым коротким выводом.
+    """
+    nonterminals = set(grammar.nonterminals)
+    # Длина кратчайшего вывода нетерминала и правило, которое её даёт
+    cost = dict.fromkeys(nonterminals, float("inf"))
+    shortest = {}
+    changed = True
+    while changed:
+        changed = False
+        for idx, (head, body) in enumerate(grammar.rules):
+            length = sum(cost[symbol] if symbol in nonterminals else 1 for symbol in body)
+            if length < cost[head]:
+                cost[head] = length
+                shortest[head] = idx
+                changed = True
+    by_head = {}
+    for idx, (head, _) in enumerate(grammar.rules):
+        by_head.setdefault(head, []).append(idx)
+
+    codes = []
+    stack = [(grammar.rules[0][0], 0)]
+    while stack:
+        symbol, depth = stack.pop()
+        if symbol in nonterminals:
+            rule = shortest[symbol] if depth >= max_depth else rnd.choice(by_head[symbol])
+            stack.extend((item, depth + 1) for item in reversed(grammar.rules[rule][1]))
+        elif symbol.startswith('"'):
+            codes.append(format_code(*LITERALS[symbol[1:-1]]))
+        else:
+            codes.append({"id": "I", "num": "N", "str": "C"}[symbol] + str(rnd.randint(1, 3)))
+    return codes
+
+
+# Проверка SyntaxAnalyzer, которой нет в грамматике (см. grammar.txt)
+_LVALUE_ERROR = "должна быть переменная"
+
+
+def _analyzer_result(codes):
+    """
+    Позиция после разбора SyntaxAnalyzer или None, если поток отвергнут.
+    Ошибку "слева должна быть переменная" грамматика не ловит, а после
+    неё анализатор пропускает оператор до ';' и может пропустить и
+    настоящую синтаксическую ошибку: такой поток не сравнивается (...).
+    """
+    tokenizer = Tokenizer.from_lines([" ".join(codes)])
+    errors = SyntaxAnalyzer(tokenizer, semantic=False).check()
+    if any(_LVALUE_ERROR in str(e) for e in errors):
+        return ...
+    return None if errors else tokenizer.pos
+
+
+def _ll1_result(codes, grammar):
+    tokenizer = Tokenizer.from_lines([" ".join(codes)])
+    try:
+        LL1Parser(tokenizer, grammar).parse()
+    except SyntaxError:
+        return None
+    return tokenizer.pos
+
+
+def verify(count, seed=0, grammar=None):
+    """
+    Сверяет грамматику с SyntaxAnalyzer (см. описание модуля). На каждую
+    выведенную программу приходится одно её искажение: удалённая,
+    вставленная или заменённая лексема. Возвращает число расхождений.
+    """
+    import random
+
+    grammar = grammar or default_grammar()
+    differences = compare_with_analyzer(grammar)
+    for difference in differences:
+        print(difference)
+
+    rnd = random.Random(seed)
+    vocabulary = [format_code(*LITERALS[symbol[1:-1]]) for symbol in grammar.terminals if symbol.startswith('"')]
+    vocabulary += ["I1", "N1", "C1"]
+    mismatches = 0
+    compared = 0
+    for _ in range(count):
+        sentence = random_sentence(grammar, rnd)
+        mutated = list(sentence)
+        pos = rnd.randrange(len(mutated))
+        action = rnd.randrange(3)
+        if action == 0:
+            del mutated[pos]
+        elif action == 1:
+            mutated.insert(pos, rnd.choice(vocabulary))
+        else:
+            mutated[pos] = rnd.choice(vocabulary)
+        for codes in (sentence, mutated):
+            expected = _analyzer_result(codes)
+            if expected is ...:
+                continue
+            compared += 1
+            actual = _ll1_result(codes, grammar)
+            if expected != actual:
+                mismatches += 1
+                if mismatches == 1:
+                    print(" ".join(codes[:200]) + (" ..." if len(codes) > 200 else ""))
+                    print("SyntaxAnalyzer:", expected, " LL1Parser:", actual)
+    print(f"Сравнено потоков: {compared}")
+    return mismatches + len(differences)
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Табличный LL(1)-анализатор по grammar.txt")
+    parser.add_argument("input", nargs="?", default="tokens_output.txt")
+    parser.add_argument("--table", action="store_true", help="показать FIRST/FOLLOW и таблицу разбора")
+    parser.add_argument("--verify", type=int, metavar="N", help="сверить грамматику с SyntaxAnalyzer на N программах")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.table:
+        print(default_grammar().dump())
+    elif args.verify:
+        mismatches = verify(args.verify, args.seed)
+        print(f"Программ: {args.verify}, расхождений: {mismatches}")
+        sys.exit(1 if mismatches else 0)
+    else:
+        try:
+            LL1Parser(Tokenizer(args.input)).parse()
+            print("Синтаксический анализ завершён без ошибок")
+        except SyntaxError as e:
+            print("Синтаксическая ошибка:")
+            print(e)
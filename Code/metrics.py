@@ -0,0 +1,345 @@
+"""
+Необязательные замеры этапов транслятора: настенное и процессорное
+время, скорость (элементов в секунду), пиковая память через tracemalloc,
+число совпадений мастер-выражения на лексему в scaner и число вызовов
+Tokenizer.expect в parser_l4.
+
+enable() подменяет методы этапов обёртками, disable() возвращает
+исходные. Пока замеры выключены, код этапов не содержит ни одной
+лишней проверки, так что накладных расходов нет вовсе. Замеры можно
+вести из нескольких потоков сразу (TranslationServer с jobs=0).
+
+    этап        метод                                   элементы
+    scaner      scaner.Lexer.lex, scaner.Lexer.stream   лексемы
+    parser      parser_l4.SyntaxAnalyzer.parse_program  лексемы
+    opz         opz.OpzGenerator.visit_Program          строки ОПЗ
+    cpp         cpp_syntax_analizator.OPZParser.parse   элементы ОПЗ
+    cpp_stream  cpp_syntax_analizator.iter_cpp          строки C++
+
+У потоковых этапов время - сумма времени внутри генератора, без
+пиковой памяти; iter_cpp подменяется в модуле, поэтому вызовы через
+from cpp_syntax_analizator import iter_cpp, сделанные до enable(),
+не замеряются.
+
+    metrics.enable(memory=True)
+    ...
+    metrics.write("metrics.json")   # .prom - текстовый формат Prometheus
+
+    python metrics.py test.c -o metrics.prom --memory
+"""
+import argparse
+import functools
+import itertools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from operator import itemgetter
+
+import cpp_syntax_analizator
+import opz
+import parser_l4
+import scaner
+
+PROMETHEUS_PREFIX = "translator"
+COUNTER_HELP = {
+    "regex_matches": "Совпадений мастер-выражения scaner (с пробелами и комментариями)",
+    "regex_matches_per_token": "Совпадений мастер-выражения на одну лексему",
+    "expect_calls": "Вызовов Tokenizer.expect",
+}
+
+
+class Metrics:
+    """
+    Сумма замеров по этапам и счётчики; merge складывает замеры разных
+    процессов. Изменения идут под блокировкой: этапы могут работать
+    в нескольких потоках.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, wall, cpu, items, peak=None, calls=1):
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = {"calls": 0, "wall": 0.0, "cpu": 0.0, "items": 0, "peak_memory": None}
+            entry["calls"] += calls
+            entry["wall"] += wall
+            entry["cpu"] += cpu
+            entry["items"] += items
+            if peak is not None:
+                entry["peak_memory"] = max(entry["peak_memory"] or 0, peak)
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, data):
+        """Добавляет замеры из to_dict() (например, из другого процесса пула)."""
+        for stage, entry in data["stages"].items():
+            self.add(stage, entry["wall"], entry["cpu"], entry["items"], entry["peak_memory"], entry["calls"])
+        for name, value in data["counters"].items():
+            self.count(name, value)
+
+    def to_dict(self):
+        with self.lock:
+            stages = {stage: dict(entry) for stage, entry in self.stages.items()}
+            counters = dict(self.counters)
+        for entry in stages.values():
+            entry["items_per_second"] = entry["items"] / entry["wall"] if entry["wall"] else None
+        tokens = self.stages.get("scaner", {}).get("items")
+        if tokens and "regex_matches" in counters:
+            counters["regex_matches_per_token"] = counters["regex_matches"] / tokens
+        return {"stages": stages, "counters": counters}
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        data = self.to_dict()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            samples = [(label, value) for label, value in samples if value is not None]
+            if not samples:
+                return
+            lines.append(f"# HELP {prefix}_{name} {description}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for label, value in samples:
+                labels = f'{{stage="{label}"}}' if label else ""
+                lines.append(f"{prefix}_{name}{labels} {value!r}")
+
+        stages = data["stages"]
+        for key, name, kind, description in [
+            ("calls", "stage_calls_total", "counter", "Число вызовов этапа"),
+            ("wall", "stage_wall_seconds_total", "counter", "Настенное время этапа"),
+            ("cpu", "stage_cpu_seconds_total", "counter", "Процессорное время этапа"),
+            ("items", "stage_items_total", "counter", "Обработано элементов (лексем, строк ОПЗ)"),
+            ("items_per_second", "stage_items_per_second", "gauge", "Элементов в секунду"),
+            ("peak_memory", "stage_peak_memory_bytes", "gauge", "Пиковая память этапа по tracemalloc"),
+        ]:
+            metric(name, kind, description, [(stage, entry[key]) for stage, entry in stages.items()])
+        for name, value in data["counters"].items():
+            kind = "gauge" if name.endswith("_per_token") else "counter"
+            metric(name if kind == "gauge" else f"{name}_total", kind, COUNTER_HELP.get(name, name),
+                   [(None, value)])
+        return "\n".join(lines) + "\n"
+
+
+_metrics = Metrics()
+_memory = False
+_started_tracing = False
+# (класс или модуль, имя) -> исходный метод или функция, пока замеры включены
+_originals = {}
+# Открытые замеры памяти: вложенный этап сбрасывает пик, поэтому
+# пик внешнего этапа копится в его кадре
+_frames = []
+
+
+def _enter_memory():
+    current, peak = tracemalloc.get_traced_memory()
+    if _frames:
+        _frames[-1][1] = max(_frames[-1][1], peak)
+    tracemalloc.reset_peak()
+    frame = [current, current]
+    _frames.append(frame)
+    return frame
+
+
+def _leave_memory(frame):
+    _frames.pop()
+    frame[1] = max(frame[1], tracemalloc.get_traced_memory()[1])
+    if _frames:
+        _frames[-1][1] = max(_frames[-1][1], frame[1])
+    return frame[1] - frame[0]
+
+
+def _timed(stage, items):
+    """Обёртка метода этапа: время, элементы (items(self, result)) и память."""
+
+    def wrap(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            frame = _enter_memory() if _memory else None
+            wall = time.perf_counter()
+            cpu = time.process_time()
+            result = None
+            try:
+                result = method(self, *args, **kwargs)
+                return result
+            finally:
+                wall = time.perf_counter() - wall
+                cpu = time.process_time() - cpu
+                peak = _leave_memory(frame) if frame is not None else None
+                _metrics.add(stage, wall, cpu, items(self, result), peak)
+
+        return wrapper
+
+    return wrap
+
+
+def _timed_stream(stage):
+    """
+    Обёртка генератора этапа: время внутри него и число выданных значений.
+    Замер пишется, когда генератор исчерпан, закрыт или упал.
+    """
+
+    def wrap(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            iterator = function(*args, **kwargs)
+            wall = cpu = 0.0
+            items = 0
+            try:
+                while True:
+                    start_wall = time.perf_counter()
+                    start_cpu = time.process_time()
+                    try:
+                        value = next(iterator)
+                    except StopIteration:
+                        return
+                    finally:
+                        wall += time.perf_counter() - start_wall
+                        cpu += time.process_time() - start_cpu
+                    items += 1
+                    yield value
+            finally:
+                iterator.close()
+                _metrics.add(stage, wall, cpu, items)
+
+        return wrapper
+
+    return wrap
+
+
+def _counted(name):
+    def wrap(method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            _metrics.count(name)
+            return method(*args, **kwargs)
+
+        return wrapper
+
+    return wrap
+
+
+def _counted_matches(string, *bounds):
+    """
+    MASTER_RE.finditer, который считает совпадения: лексемы, переводы строк,
+    пробелы и комментарии. zip сдвигает счётчик этого вызова на каждое
+    совпадение, без второго прохода; число добавляется к regex_matches,
+    когда перебор закончен или прерван.
+    """
+    counter = itertools.count()
+    try:
+        yield from map(itemgetter(0), zip(scaner.MASTER_RE.finditer(string, *bounds), counter))
+    finally:
+        _metrics.count("regex_matches", next(counter))
+
+
+HOOKS = [
+    (scaner.Lexer, "lex", _timed("scaner", lambda self, result: len(result[0]) if result else 0)),
+    (scaner.Lexer, "stream", _timed_stream("scaner")),
+    (parser_l4.SyntaxAnalyzer, "parse_program", _timed("parser", lambda self, result: len(self.tok))),
+    (opz.OpzGenerator, "visit_Program", _timed("opz", lambda self, result: len(self.lines))),
+    (cpp_syntax_analizator.OPZParser, "parse", _timed("cpp", lambda self, result: len(self.tokens))),
+    (cpp_syntax_analizator, "iter_cpp", _timed_stream("cpp_stream")),
+    (parser_l4.Tokenizer, "expect", _counted("expect_calls")),
+    (scaner.Lexer, "matches", lambda original: staticmethod(_counted_matches)),
+]
+
+
+def enabled():
+    return bool(_originals)
+
+
+def enable(memory=False):
+    """Включает замеры; с memory пиковая память меряется через tracemalloc (это медленно)."""
+    global _memory, _started_tracing
+    _memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _started_tracing = True
+    if _originals:
+        return
+    for cls, name, wrap in HOOKS:
+        original = cls.__dict__[name]
+        _originals[cls, name] = original
+        setattr(cls, name, wrap(original))
+
+
+def disable():
+    """Возвращает исходные методы; собранные замеры остаются до reset()."""
+    global _memory, _started_tracing
+    for (cls, name), original in _originals.items():
+        setattr(cls, name, original)
+    _originals.clear()
+    if _started_tracing:
+        tracemalloc.stop()
+        _started_tracing = False
+    _memory = False
+
+
+def reset():
+    global _metrics
+    _metrics = Metrics()
+
+
+def snapshot():
+    return _metrics.to_dict()
+
+
+def collect():
+    """Замеры с момента прошлого collect() или reset(); счётчики обнуляются."""
+    data = snapshot()
+    reset()
+    return data
+
+
+def write(path, metrics=None, fmt=None):
+    """Пишет замеры в JSON или, для .prom и fmt="prometheus", в текстовом формате Prometheus."""
+    metrics = metrics if metrics is not None else _metrics
+    if fmt is None:
+        fmt = "prometheus" if path.endswith((".prom", ".txt")) else "json"
+    with open(path, "w", encoding="utf-8") as f:
+        if fmt == "prometheus":
+            f.write(metrics.to_prometheus())
+        else:
+            json.dump(metrics.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры этапов транслятора на одном файле C")
+    parser.add_argument("source")
+    parser.add_argument("-o", "--output", default=None, help="файл .json или .prom (по умолчанию JSON в stdout)")
+    parser.add_argument("--memory", action="store_true", help="мерить пиковую память (tracemalloc)")
+    args = parser.parse_args()
+
+    with open(args.source, "r", encoding="utf-8") as f:
+        code = f.read()
+    enable(memory=args.memory)
+    try:
+        lexer = scaner.Lexer()
+        columns = lexer.lex(code)
+        analyzer = parser_l4.SyntaxAnalyzer(parser_l4.Tokenizer.from_columns(*columns, lexer.symbols))
+        errors = analyzer.check()
+        if errors:
+            for error in errors:
+                print(error, file=sys.stderr)
+            return 1
+        cpp_syntax_analizator.parse_opz(opz.program_to_opz(analyzer.tree))
+    finally:
+        disable()
+
+    if args.output:
+        write(args.output)
+    else:
+        json.dump(snapshot(), sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,198 +1,410 @@
 import re
 
-# Приоритет операторов
-OPERATOR_PRIORITY = {
-    "=": 1,
-    "||": 2, "&&": 3,
-    "<": 4, "<=": 4, ">": 4, ">=": 4, "==": 4, "!=": 4,
-    "+": 5, "-": 5,
-    "*": 6, "/": 6, "%": 6,
-    "(": 0, ")": 0, "[": -1, "]": -1
-}
-
-def to_opz(expression_tokens):
-    output = []
-    stack = []
+from parser_l4 import SyntaxAnalyzer, Tokenizer, syntax_error
+from scaner import Lexer
+from scopes import unique_names
+from syntax_tree import (ASSIGN_OPERATORS, BINARY_PRIORITY, Assign, Binary, Declaration, Declarator, ExprStatement,
+                         Index, Name, Node, Number, Printf, Return, Unary, Visitor)
+
+# Присваивания: "=" и составные
+ASSIGNMENTS = set(ASSIGN_OPERATORS)
+
+# "k АЭМ" для частых размерностей массивов
+ARRAY_ACCESS = [f"{k} АЭМ" for k in range(16)]
+
+
+# Переходы в ОПЗ. Метка - "М<номер>"; строка "М1:" ставит метку на
+# следующий элемент, "... М1 УПЛ" снимает со стека условие и при лжи
+# переходит на М1, "М1 БП" - безусловный переход.
+LABEL_PREFIX = "М"
+JUMP_FALSE = "УПЛ"
+JUMP = "БП"
+JUMPS = (JUMP_FALSE, JUMP)
+
+# Операторы, у которых нет знака операции в C:
+#   int c 10 20 2 ОМ     объявление массива: тип, имя, размеры, их число
+#   "%d\n" a 1 Ф         printf: формат, аргументы, их число
+#   a ВОЗВ               return
+ARRAY_DECLARATION = "ОМ"
+PRINTF = "Ф"
+RETURN = "ВОЗВ"
+
+# Элемент строки ОПЗ: строковая константа (в ней могут быть пробелы) или слово
+_ITEM_RE = re.compile(r'"[^"\n]*"|\S+')
+
+
+def split_items(line):
+    """Элементы строки ОПЗ; строковые константы не разбиваются по пробелам."""
+    return _ITEM_RE.findall(line)
+
+
+# Операторы ОПЗ без пары в исходном дереве: метка и переходы
+class Label(Node):
+    """М1:"""
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Jump(Node):
+    """М1 БП"""
+    __slots__ = ("label",)
+
+    def __init__(self, label):
+        self.label = label
+
+
+class JumpIfFalse(Node):
+    """условие М1 УПЛ"""
+    __slots__ = ("condition", "label")
+
+    def __init__(self, condition, label):
+        self.condition = condition
+        self.label = label
 
-    for token in expression_tokens:
-        # Если токен — запятая, сохраняем её как есть
-        if token == ",":
-            output.append(token)
-            continue
-        if token.isalnum() or "АЭМ" in token:
-            output.append(token)
-        elif token in ["(", "["]:
-            stack.append(token)
-        elif token in [")", "]"]:
-            while stack and stack[-1] not in ["(", "["]:
-                output.append(stack.pop())
-            if stack and stack[-1] in ["(", "["]:
-                stack.pop()
-        elif token in OPERATOR_PRIORITY:
-            while stack and stack[-1] not in ["(", "["] and OPERATOR_PRIORITY[stack[-1]] >= OPERATOR_PRIORITY[token]:
-                output.append(stack.pop())
-            stack.append(token)
-
-    while stack:
-        output.append(stack.pop())
-
-    return output
-
-def process_array_access(expression):
+
+class OpzGenerator(Visitor):
     """
-    Преобразует обращение к массиву в ОПЗ в формате "arr i j k N АЭМ".
+    Строки ОПЗ по дереву программы (syntax_tree): по строке на оператор,
+    условие и переход, метки - отдельными строками. Объявление массива
+    даёт ОМ, инициализация - присваивание; объявления простых переменных
+    без инициализации в ОПЗ не попадают. Если дерево прошло семантические
+    проверки (Program.symbols), имена переменных берутся по слотам из
+    self.names (scopes.unique_names): перекрытая во внутреннем блоке
+    переменная получает в ОПЗ своё имя.
+
+        if (c) A else B      c М1 УПЛ, A, М2 БП, М1:, B, М2:
+        while (c) A          М1:, c М2 УПЛ, A, М1 БП, М2:
+        for (i; c; s) A      i, М1:, c М2 УПЛ, A, s, М1 БП, М2:
+
+    Метка начала цикла определяется раньше любого перехода на неё,
+    метка конца блока - позже: по этому признаку OPZParser отличает
+    цикл от ветвления за один проход.
     """
-    tokens = expression.replace("[", " [ ").replace("]", " ] ").split()
-    output = []
-    i = 0
-
-    while i < len(tokens):
-        if i < len(tokens) - 2 and tokens[i + 1] == "[":
-            array_name = tokens[i]  # Имя массива
-            index_expr = []  # Список аргументов массива
-            current_arg = []  # Буфер для аргументов
-            i += 2  # Переход на первый аргумент внутри []
-
-            while i < len(tokens) and tokens[i] != "]":
-                if tokens[i] == ",":  # Встретили `,`, сохраняем предыдущий аргумент
-                    if current_arg:
-                        index_expr.extend(to_opz(current_arg))  # Добавляем в ОПЗ
-                        current_arg = []  # Очищаем буфер
-                else:
-                    current_arg.append(tokens[i])  # Собираем аргумент
-                i += 1
-
-            # Добавляем последний аргумент (после последней `,`)
-            if current_arg:
-                index_expr.extend(to_opz(current_arg))
-
-            arg_count = len(index_expr)  # Количество аргументов
-            array_access_opz = [array_name] + index_expr + [f"{arg_count} АЭМ"]
-            output.extend(array_access_opz)  # Добавляем в выражение
-
-        elif tokens[i] != "]":
-            output.append(tokens[i])  # Копируем все остальные токены
-        i += 1
-
-    return output
-
-def process_if_statement(expression):
-    return " ".join(to_opz(expression.split())) + " УПЛ"
-
-def process_while_statement(expression):
-    return " ".join(to_opz(expression.split())) + " УЦ"
-
-def process_for_statement(expression, loop_body):
-    expression = expression.replace("(", " ( ").replace(")", " ) ")
-    tokens = expression.split(";")
-    if len(tokens) != 3:
-        return "Ошибка в синтаксисе for"
-    init_part = to_opz(tokens[0].split())
-    condition_part = to_opz(tokens[1].split())
-    increment_part = to_opz(tokens[2].split())
-    result = [
-        " ".join(init_part),
-        " ".join(condition_part) + " УЦ"
-    ]
-    result.extend(loop_body)
-    result.append(" ".join(increment_part))
-    result.append("УЦ")
-    return "\n".join(result)
-
-def convert_to_opz_plain(code_lines):
-    result = []
-    i = 0
-    while i < len(code_lines):
-        line = code_lines[i].strip()
-
-        # Если это директива препроцессора или комментарий, оставляем как есть
-        if line.startswith("#") or line.startswith("//") or line.startswith("using") or line.startswith("int"):
-            result.append(line)
-            i += 1
-            continue
-
-        if line in ["{", "}"]:  # Игнорируем фигурные скобки
-            i += 1
-            continue
-
-        # Обрабатываем `if`
-        if line.startswith("if"):
-            condition = line[line.index("(") + 1: line.rindex(")")]
-            tokens = condition.replace("(", " ( ").replace(")", " ) ").split()
-            result.append(" ".join(to_opz(tokens)) + " УПЛ")
-            i += 1
-            continue
-
-        # Обрабатываем `while`
-        if line.startswith("while"):
-            condition = line[line.index("(") + 1: line.rindex(")")]
-            tokens = condition.replace("(", " ( ").replace(")", " ) ").split()
-            result.append(" ".join(to_opz(tokens)) + " УЦ")
-            i += 1
-            continue
-
-        # Обрабатываем `for`
-        if line.startswith("for"):
-            condition = line[line.index("(") + 1: line.rindex(")")]
-            tokens = condition.split(";")
-
-            if len(tokens) != 3:
-                result.append("Ошибка в синтаксисе for")
-                i += 1
-                continue
-
-            init_part = to_opz(tokens[0].split())  # `i = 0`
-            condition_part = to_opz(tokens[1].split())  # `i < 10`
-            increment_part = to_opz(tokens[2].split())  # `i = i + 1`
-
-            result.append(f"{' '.join(init_part)}")
-            result.append(f"{' '.join(condition_part)} УЦ")
-
-            loop_body = []
-            i += 1
-
-            while i < len(code_lines) and code_lines[i].strip() != "}":
-                loop_body.append(code_lines[i].strip())
-                i += 1
-
-            processed_body = convert_to_opz_plain(loop_body)
-            result.extend(processed_body)
-
-            result.append(f"{' '.join(increment_part)}")
-            result.append("УЦ")
-
-            i += 1
-            continue
-
-        # Обрабатываем присваивание
-        if "=" in line:
-            if line.count("=") > 1 and "==" not in line:
-                var_name, expr = line.split("=", 1)  # Разделяем только по первому `=`
+
+    def __init__(self):
+        self.lines = []
+        self.labels = 0
+        # Имя переменной ОПЗ по слоту объявления; None - берутся имена из дерева
+        self.names = None
+
+    def new_label(self):
+        self.labels += 1
+        return f"{LABEL_PREFIX}{self.labels}"
+
+    def place(self, label):
+        self.lines.append(label + ":")
+
+    def opz(self, node):
+        output = []
+        self.emit(node, output)
+        return " ".join(output)
+
+    def emit(self, node, output):
+        """
+        Выражение в ОПЗ обходом дерева снизу вверх. Обход идёт по явному
+        стеку, а не рекурсией: левая цепочка из тысяч операций в
+        сгенерированных программах не упирается в предел рекурсии. На стеке
+        лежат узлы и готовые строки операций, которые пишутся, когда до
+        них дойдёт очередь (после операндов).
+        """
+        names = self.names
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            kind = type(node)
+            if kind is str:
+                output.append(node)
+            elif kind is Name:
+                output.append(node.name if node.slot is None or names is None else names[node.slot])
+            elif kind is Number:
+                output.append(node.value)
+            elif kind is Index:
+                output.append(node.name if node.slot is None or names is None else names[node.slot])
+                count = len(node.indices)
+                stack.append(ARRAY_ACCESS[count] if count < len(ARRAY_ACCESS) else f"{count} АЭМ")
+                stack.extend(reversed(node.indices))
+            elif kind is Unary:
+                stack.append("@")
+                stack.append(node.operand)
             else:
-                var_name, expr = line.split("=")
+                # Binary и Assign: левый операнд (или цель), правый, операция
+                stack.append(node.op)
+                stack.append(node.right if kind is Binary else node.value)
+                stack.append(node.left if kind is Binary else node.target)
+
+    def visit_Program(self, node):
+        if node.symbols is not None:
+            self.names = unique_names(node.symbols)
+        self.visit(node.body)
+
+    def visit_Block(self, node):
+        for statement in node.statements:
+            self.visit(statement)
+
+    def visit_Declaration(self, node):
+        for declarator in node.declarators:
+            slot = declarator.slot
+            name = declarator.name if slot is None or self.names is None else self.names[slot]
+            if declarator.dims:
+                dims = " ".join(declarator.dims)
+                self.lines.append(f"{node.type_name} {name} {dims} "
+                                  f"{len(declarator.dims)} {ARRAY_DECLARATION}")
+            if declarator.init is not None:
+                self.lines.append(self.opz(Assign("=", Name(declarator.name, slot), declarator.init)))
+
+    def visit_Printf(self, node):
+        output = [node.format]
+        for arg in node.args:
+            self.emit(arg, output)
+        output.append(f"{len(node.args)} {PRINTF}")
+        self.lines.append(" ".join(output))
+
+    def visit_Return(self, node):
+        self.lines.append(f"{self.opz(node.value)} {RETURN}")
+
+    def visit_ExprStatement(self, node):
+        self.lines.append(self.opz(node.expr))
+
+    def visit_If(self, node):
+        skip = self.new_label()
+        self.lines.append(f"{self.opz(node.condition)} {skip} {JUMP_FALSE}")
+        self.visit(node.then)
+        if node.otherwise is None:
+            self.place(skip)
+            return
+        end = self.new_label()
+        self.lines.append(f"{end} {JUMP}")
+        self.place(skip)
+        self.visit(node.otherwise)
+        self.place(end)
+
+    def loop(self, condition, body, step=None):
+        """Цикл с проверкой в начале; пустое условие for - константа 1."""
+        head, end = self.new_label(), self.new_label()
+        self.place(head)
+        text = self.opz(condition) if condition is not None else "1"
+        self.lines.append(f"{text} {end} {JUMP_FALSE}")
+        self.visit(body)
+        if step is not None:
+            self.lines.append(self.opz(step))
+        self.lines.append(f"{head} {JUMP}")
+        self.place(end)
+
+    def visit_Label(self, node):
+        self.place(node.name)
+
+    def visit_Jump(self, node):
+        self.lines.append(f"{node.label} {JUMP}")
+
+    def visit_JumpIfFalse(self, node):
+        self.lines.append(f"{self.opz(node.condition)} {node.label} {JUMP_FALSE}")
+
+    def visit_While(self, node):
+        self.loop(node.condition, node.body)
+
+    def visit_For(self, node):
+        if node.init is not None:
+            self.lines.append(self.opz(node.init))
+        self.loop(node.condition, node.body, node.step)
+
+
+def program_to_opz(tree):
+    """Строки ОПЗ по дереву, которое построил parser_l4.SyntaxAnalyzer."""
+    generator = OpzGenerator()
+    generator.visit(tree)
+    return generator.lines
+
+
+def statements_to_opz(statements):
+    """Строки ОПЗ по списку операторов, например из read_line."""
+    generator = OpzGenerator()
+    for statement in statements:
+        generator.visit(statement)
+    return generator.lines
+
+
+def is_label(item):
+    """Определение метки: "М1:"."""
+    return item[-1] == ":" and item.startswith(LABEL_PREFIX)
+
+
+def read_line(line):
+    """
+    Операторы строки ОПЗ в виде узлов дерева - обратное к OpzGenerator:
+    выражения снова становятся деревьями syntax_tree, операторы -
+    ExprStatement, Printf, Return, Declaration (ОМ), Label, Jump и
+    JumpIfFalse. Выражения, оставшиеся на стеке, - отдельные операторы.
+    Нарушенная ОПЗ - SyntaxError.
+    """
+    statements = []
+    stack = []
 
-            var_name = var_name.strip()
-            expr = expr.strip().rstrip(";")
+    def flush():
+        statements.extend(ExprStatement(expr) for expr in stack)
+        stack.clear()
+
+    def pop_count():
+        count = int(stack.pop().value)
+        items = stack[len(stack) - count:]
+        del stack[len(stack) - count:]
+        return items
+
+    try:
+        for item in split_items(line):
+            if item in BINARY_PRIORITY:
+                right = stack.pop()
+                stack.append(Binary(item, stack.pop(), right))
+            elif item in ASSIGN_OPERATORS:
+                value = stack.pop()
+                stack.append(Assign(item, stack.pop(), value))
+            elif item == "@":
+                stack.append(Unary("-", stack.pop()))
+            elif item == "АЭМ":
+                indices = pop_count()
+                stack.append(Index(stack.pop().name, indices))
+            elif item == JUMP_FALSE:
+                label = stack.pop().name
+                condition = stack.pop()
+                flush()
+                statements.append(JumpIfFalse(condition, label))
+            elif item == JUMP:
+                label = stack.pop().name
+                flush()
+                statements.append(Jump(label))
+            elif item == PRINTF:
+                args = pop_count()
+                format = stack.pop()
+                flush()
+                statements.append(Printf(format, args))
+            elif item == RETURN:
+                value = stack.pop()
+                flush()
+                statements.append(Return(value))
+            elif item == ARRAY_DECLARATION:
+                dims = [dim.value for dim in pop_count()]
+                name = stack.pop().name
+                type_name = stack.pop().name
+                flush()
+                statements.append(Declaration(type_name, [Declarator(name, dims, None)]))
+            elif is_label(item):
+                flush()
+                statements.append(Label(item[:-1]))
+            elif item[0] == '"':
+                stack.append(item)  # формат printf остаётся строкой с кавычками
+            elif item[0].isdigit():
+                stack.append(Number(item))
+            else:
+                stack.append(Name(item))
+    except (IndexError, AttributeError, ValueError) as e:
+        raise SyntaxError(f"Неверная ОПЗ: {line.strip()}") from e
+    flush()
+    return statements
 
-            if "[" in var_name and "]" in var_name:
-                var_name = " ".join(process_array_access(var_name))  # Обрабатываем массив
 
-            expr_tokens = process_array_access(expr)  # Получаем список токенов
-            expr_tokens = to_opz(expr_tokens)  # Пропускаем через ОПЗ
+def assemble(opz_lines):
+    """
+    Линейный массив элементов ОПЗ для исполнения: определения меток
+    убираются, а ссылка на метку перед УПЛ/БП заменяется целым адресом -
+    индексом элемента в массиве. Ссылки вперёд дописываются, когда метка
+    встречается, так что текст проходится один раз. Неопределённая или
+    повторно определённая метка - SyntaxError.
+    """
+    code = []
+    addresses = {}
+    fixups = {}
+    for line in opz_lines:
+        for item in split_items(line):
+            if is_label(item):
+                label = item[:-1]
+                if label in addresses:
+                    raise SyntaxError(f"Метка {label} определена дважды")
+                address = addresses[label] = len(code)
+                for position in fixups.pop(label, ()):
+                    code[position] = address
+            elif item in JUMPS:
+                if not code or not isinstance(code[-1], str) or not code[-1].startswith(LABEL_PREFIX):
+                    raise SyntaxError(f"Перед {item} должна стоять метка")
+                label = code[-1]
+                if label in addresses:
+                    code[-1] = addresses[label]
+                else:
+                    fixups.setdefault(label, []).append(len(code) - 1)
+                code.append(item)
+            else:
+                code.append(item)
+    if fixups:
+        raise SyntaxError(f"Метка {min(fixups)} не определена")
+    return code
 
-            result.append(f"{var_name} {' '.join(expr_tokens)} =")
-            i += 1
-            continue
 
-        # Обрабатываем обращение к массиву без присваивания
-        if "[" in line and "]" in line:
-            array_tokens = process_array_access(line)
-            result.append(" ".join(array_tokens))
-            i += 1
-            continue
+def parse_program(code_lines, columns=None, symbols=None):
+    """
+    Дерево программы из строк текста. columns - уже готовые массивы
+    (классы, номера, строки) Lexer.lex по "\\n".join(code_lines) вместе
+    с таблицей symbols, иначе текст лексируется здесь. Первая
+    синтаксическая ошибка поднимается как SyntaxError.
+    """
+    if columns is None:
+        lexer = Lexer()
+        columns = lexer.lex("\n".join(code_lines))
+        symbols = lexer.symbols
+    analyzer = SyntaxAnalyzer(Tokenizer.from_columns(*columns, symbols))
+    errors = analyzer.check()
+    if errors:
+        raise errors[0]
+    return analyzer.tree
+
+
+def parse_fragment(code_lines, columns=None, symbols=None):
+    """
+    Операторы фрагмента без #include и main (например, тела цикла) из
+    строк текста, аргументы - как у parse_program. Фрагмент разбирается
+    без семантических проверок: переменные в нём можно не объявлять.
+    Первая синтаксическая ошибка поднимается как SyntaxError.
+    """
+    if columns is None:
+        lexer = Lexer()
+        columns = lexer.lex("\n".join(code_lines))
+        symbols = lexer.symbols
+    tokenizer = Tokenizer.from_columns(*columns, symbols)
+    analyzer = SyntaxAnalyzer(tokenizer, semantic=False)
+    try:
+        statements = analyzer.parse_statements()
+    except RecursionError:
+        raise analyzer.nesting_error() from None
+    if analyzer.errors:
+        raise analyzer.errors[0]
+    current = tokenizer.current()
+    if current is not None:
+        # parse_statements останавливается на '}' без пары
+        raise syntax_error(current.line, f"Неожиданный токен: '{current.lexeme}'")
+    return statements
+
+
+def is_program(columns, symbols):
+    """Начинается ли текст с #include или int main, а не с операторов."""
+    # Хватает двух первых лексем
+    tokenizer = Tokenizer.from_columns(*(column[:2] for column in columns), symbols)
+    return tokenizer.at("#include") or tokenizer.at("int") and len(tokenizer) > 1 and \
+        tokenizer.lexeme_at(1) == "main"
+
+
+def convert_to_opz_plain(code_lines, columns=None, symbols=None):
+    """
+    Перевод строк в строки ОПЗ: разбор в дерево и обход дерева. Строки -
+    программа (parse_program) или, как и до разбора в дерево, фрагмент
+    из операторов без main (parse_fragment).
+    """
+    if columns is None:
+        lexer = Lexer()
+        columns = lexer.lex("\n".join(code_lines))
+        symbols = lexer.symbols
+    if is_program(columns, symbols):
+        return program_to_opz(parse_program(code_lines, columns, symbols))
+    return statements_to_opz(parse_fragment(code_lines, columns, symbols))
 
-        i += 1
-    return result
 
 # Сохранение вывода в файл
 def save_to_file(filename, lines):
@@ -202,22 +414,27 @@ def save_to_file(filename, lines):
 
 # Пример кода для тестирования
 code_example = [
-    "#include <iostream>",
-    "using namespace std;",
+    "#include <stdio.h>",
     "int main() {",
-    "if ((a - b) > 8) {",
-    "    while ((a + b) < 20) {",
-    "        x = arr[i] + 3;",
-    "    for (i = 0; i < 10; i = i + 1) {",
-    "        y = b[i] * 2;",
+    "    int a = 12, b = 3, i = 0, x = 0, y = 0;",
+    "    int arr[10], c[10];",
+    "    if ((a - b) > 8) {",
+    "        while ((a + b) < 20) {",
+    "            x = arr[i] + 3;",
+    "            a = a + 1;",
+    "        }",
+    "        for (i = 0; i < 10; i = i + 1) {",
+    "            y = c[i] * 2;",
+    "        }",
     "    }",
-    "}}"
+    "    return 0;",
+    "}"
 ]
 
-opz_result = convert_to_opz_plain(code_example)
-save_to_file('output_opz.txt', opz_result)  # Сохраняем результат в файл
-
-# Выводим результат на экран
-for line in opz_result:
-    print(line)
+if __name__ == "__main__":
+    opz_result = convert_to_opz_plain(code_example)
+    save_to_file('output_opz.txt', opz_result)  # Сохраняем результат в файл
 
+    # Выводим результат на экран
+    for line in opz_result:
+        print(line)
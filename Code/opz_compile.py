@@ -0,0 +1,609 @@
+"""
+Компиляция ОПЗ в функцию Python - для программ, которые исполняются много раз.
+
+Строки ОПЗ разбираются opz.read_line, по меткам и переходам за один
+проход восстанавливаются циклы и ветвления (по тем же признакам, что в
+OPZParser), и по ним пишется текст функции:
+
+  - переменные программы - локальные переменные функции (v_<имя>),
+    массивы - array.array (a_<имя>) тех же типов, что в opz_vm; с таблицей
+    имён разбора (Program.symbols) они заводятся заранее, в порядке слотов;
+  - М1:, c М2 УПЛ, ..., М1 БП, М2: - while c:, остальное - if/else;
+  - выражения - выражения Python; деление и остаток идут через функции
+    opz_vm, && и || - через and/or (правый операнд, как в C, вычисляется,
+    только если нужен), индексы проверяются на выход за границы.
+
+Текст переводится compile() один раз, скомпилированная функция хранится
+в кэше по SHA-256 текста ОПЗ: повторный запуск той же программы стоит
+только подсчёта хэша. Смысл программы тот же, что у opz_vm, включая
+ошибки исполнения. Переходы, из которых не складываются while и
+if/else, и имена, которые не годятся в идентификаторы Python, -
+SyntaxError: такую ОПЗ исполняет только opz_vm. Текст, от которого
+отказывается сам compile() (больше 20 вложенных циклов и ветвлений),
+CompiledProgram исполняет через opz_vm.
+
+    python opz_compile.py program.c            исполнить программу на C
+    python opz_compile.py program.c --source   показать текст функции
+    python opz_compile.py --verify 1000        сверить с opz_vm на случайных программах
+"""
+import hashlib
+import math
+import sys
+from array import array
+
+from opz import Jump, JumpIfFalse, Label, read_line
+from opz_vm import OpzMachine, c_div, c_mod, declared_names, dimensions, number, python_format, typecode
+from syntax_tree import Assign, Binary, ExprStatement, Index, Name, Number, Printf, Return, Unary
+
+# Сколько скомпилированных программ держит кэш
+CACHE_SIZE = 128
+_cache = {}
+
+# Операции, которые в Python значат то же, что в opz_vm
+_NATIVE = ("+", "-", "*", "<", "<=", ">", ">=", "==", "!=")
+_HELPERS = {"/": "_div", "%": "_mod"}
+_LOGICAL = {"&&": "and", "||": "or"}
+# Операции, результат которых целый при целых операндах
+_INTEGER = ("+", "-", "*", "/", "%")
+
+
+class _JumpLimit(Exception):
+    pass
+
+
+def _out_of_range():
+    raise IndexError
+
+
+def _limit():
+    raise _JumpLimit
+
+
+def _store(data, index, value):
+    """Запись элемента массива внутри выражения; возвращает записанное значение."""
+    if data.typecode != "d":
+        value = int(value)
+    data[index] = value
+    return value
+
+
+# Функции, которые нужны тексту программы; передаются в неё аргументами
+# по умолчанию, чтобы тоже быть локальными переменными
+HELPERS = {"_div": c_div, "_mod": c_mod, "_store": _store,
+           "_array": array, "_out_of_range": _out_of_range, "_limit": _limit}
+
+
+def is_simple(node):
+    """Выражение без присваиваний и операций, которые могут упасть: его можно и не вычислять."""
+    kind = type(node)
+    if kind is Name or kind is Number:
+        return True
+    if kind is Unary:
+        return is_simple(node.operand)
+    if kind is Binary:
+        return node.op not in ("/", "%") and is_simple(node.left) and is_simple(node.right)
+    return False
+
+
+def has_assign(node):
+    kind = type(node)
+    if kind is Assign:
+        return True
+    if kind is Unary:
+        return has_assign(node.operand)
+    if kind is Binary:
+        return has_assign(node.left) or has_assign(node.right)
+    if kind is Index:
+        return any(has_assign(index) for index in node.indices)
+    return False
+
+
+class Compiler:
+    """
+    Текст функции program(_write, _jumps) по строкам ОПЗ. Функция возвращает
+    (значение return, значения переменных, массивы) в порядке variables и arrays.
+    symbols - таблица имён разбора (Program.symbols), если есть.
+    """
+
+    def __init__(self, guard=False, symbols=None):
+        self.guard = guard     # считать переходы назад (run(max_jumps=...))
+        self.code = []         # строки тела функции
+        self.lines = []        # номер строки ОПЗ для каждой строки тела
+        self.variables = {}    # имя -> v_имя, в порядке появления
+        self.arrays = {}       # имя массива -> a_имя
+        self.shapes = {}       # имя массива -> размеры из ОМ
+        self.typecodes = {}    # имя массива -> тип элементов (None, если объявлен по-разному)
+        self.returns = []      # строки с return: к ним дописывается состояние
+        # Открытые блоки: [вид, метка конца, метка начала цикла или конца then,
+        #                  строка заголовка, начало тела, был ли переход назад]
+        self.blocks = []
+        self.defined = set()
+        self.forward = set()   # метки, на которые уже есть переход вперёд
+        # Метка начала цикла, после которой ещё не было условия
+        self.loop_head = None
+        # Метка, которая должна идти сразу за безусловным переходом
+        self.expect = None
+        self.temps = 0
+        self.depth = 1
+        self.line = 0
+        if symbols is not None:
+            for name, is_array in declared_names(symbols):
+                self.check_name(name)
+                if is_array:
+                    self.arrays.setdefault(name, "a_" + name)
+                else:
+                    self.variables.setdefault(name, "v_" + name)
+
+    def emit(self, text):
+        self.code.append("    " * self.depth + text)
+        self.lines.append(self.line)
+
+    def temp(self):
+        self.temps += 1
+        return f"_t{self.temps}"
+
+    @staticmethod
+    def check_name(name):
+        # Имя попадает в текст функции как есть: ОПЗ из файла не должна
+        # подставить в него выражение Python
+        if not name.isidentifier():
+            raise SyntaxError(f"Недопустимое имя {name!r}")
+
+    def variable(self, name):
+        variable = self.variables.get(name)
+        if variable is None:
+            self.check_name(name)
+            variable = self.variables[name] = "v_" + name
+        return variable
+
+    def array_name(self, name, count):
+        if name not in self.shapes:
+            raise SyntaxError(f"Массив {name} не объявлен")
+        if len(self.shapes[name]) != count:
+            raise SyntaxError(f"У массива {name} {len(self.shapes[name])} измерений, а индексов {count}")
+        return self.arrays[name]
+
+    # Выражения
+
+    def expression(self, node):
+        kind = type(node)
+        if kind is Name:
+            return self.variable(node.name)
+        if kind is Number:
+            return repr(number(node.value))
+        if kind is Index:
+            return f"{self.array_name(node.name, len(node.indices))}[{self.index(node)}]"
+        if kind is Unary:
+            return f"(-{self.expression(node.operand)})"
+        if kind is Binary:
+            left = self.expression(node.left)
+            if node.op in _LOGICAL:
+                # Как в C и opz_vm: правый операнд вычисляется, только если нужен
+                return f"(1 if {left} {_LOGICAL[node.op]} {self.expression(node.right)} else 0)"
+            return self.operation(node.op, left, self.expression(node.right))
+        return self.assign(node)
+
+    @staticmethod
+    def operation(op, left, right):
+        if op in _NATIVE:
+            return f"({left} {op} {right})"
+        return f"{_HELPERS[op]}({left}, {right})"
+
+    def condition(self, node):
+        """Условие if и while: нужна только истинность, 1 и 0 не нужны."""
+        if type(node) is Binary and node.op in _LOGICAL:
+            return f"({self.condition(node.left)} {_LOGICAL[node.op]} {self.condition(node.right)})"
+        return self.expression(node)
+
+    def checked(self, node, size=None):
+        """Индекс с проверкой границ: отрицательный (или не меньше size) - IndexError."""
+        if type(node) is Number:
+            value = number(node.value)
+            if size is None and value >= 0 or size is not None and 0 <= value < size:
+                return repr(value)
+            return "_out_of_range()"
+        text = self.expression(node)
+        if type(node) is Name:
+            value = text
+        else:
+            value = self.temp()
+            text = f"({value} := {text})"
+        if size is None:
+            # Верхнюю границу одномерного массива проверяет сам array
+            return f"({value} if {text} >= 0 else _out_of_range())"
+        return f"({value} if 0 <= {text} < {size} else _out_of_range())"
+
+    def index(self, node):
+        """Номер элемента; многомерные массивы хранятся построчно, как в opz_vm."""
+        dims = self.shapes[node.name]
+        if len(dims) == 1:
+            return self.checked(node.indices[0])
+        flat = self.checked(node.indices[0], dims[0])
+        for index, size in zip(node.indices[1:], dims[1:]):
+            flat = f"{flat} * {size} + {self.checked(index, size)}"
+        return flat
+
+    def is_integer(self, node):
+        """Значение заведомо целое: его можно писать в целый массив без int()."""
+        kind = type(node)
+        if kind is Number:
+            return isinstance(number(node.value), int)
+        if kind is Index:
+            return self.typecodes.get(node.name) not in ("d", None)
+        if kind is Unary:
+            return self.is_integer(node.operand)
+        if kind is Binary:
+            return node.op not in _INTEGER or self.is_integer(node.left) and self.is_integer(node.right)
+        return False
+
+    def assign(self, node):
+        """Присваивание внутри выражения."""
+        target = node.target
+        if type(target) is Name:
+            variable = self.variable(target.name)
+            if node.op == "=":
+                return f"({variable} := {self.expression(node.value)})"
+            return f"({variable} := {self.operation(node.op[:-1], variable, self.expression(node.value))})"
+        data = self.array_name(target.name, len(target.indices))
+        if node.op == "=":
+            return f"_store({data}, {self.index(target)}, {self.expression(node.value)})"
+        index = self.temp()
+        value = self.operation(node.op[:-1], f"{data}[{index}]", self.expression(node.value))
+        return f"_store({data}, ({index} := {self.index(target)}), {value})"
+
+    # Операторы
+
+    def statement(self, node):
+        if type(node) is not Assign:
+            text = self.expression(node)
+            if not is_simple(node):
+                self.emit(text)
+            return
+        target = node.target
+        value = self.expression(node.value)
+        if type(target) is Name:
+            variable = self.variable(target.name)
+            if node.op == "=":
+                self.emit(f"{variable} = {value}")
+            elif node.op[:-1] in _NATIVE:
+                self.emit(f"{variable} {node.op} {value}")
+            else:
+                self.emit(f"{variable} = {self.operation(node.op[:-1], variable, value)}")
+            return
+        data = self.array_name(target.name, len(target.indices))
+        typecode = self.typecodes[target.name]
+        if typecode is None:
+            # Тип элементов известен только при исполнении
+            self.emit(self.assign(node))
+            return
+        result = node.value if node.op == "=" else Binary(node.op[:-1], target, node.value)
+        convert = typecode != "d" and not self.is_integer(result)
+        if node.op == "=":
+            if has_assign(node.value):
+                # Индекс вычисляется раньше значения, как в opz_vm
+                index = self.temp()
+                self.emit(f"{index} = {self.index(target)}")
+            else:
+                index = self.index(target)
+            self.emit(f"{data}[{index}] = {f'int({value})' if convert else value}")
+        elif node.op[:-1] in _NATIVE and not convert:
+            self.emit(f"{data}[{self.index(target)}] {node.op} {value}")
+        else:
+            index = self.temp()
+            self.emit(f"{index} = {self.index(target)}")
+            value = self.operation(node.op[:-1], f"{data}[{index}]", value)
+            self.emit(f"{data}[{index}] = {f'int({value})' if convert else value}")
+
+    def declare(self, type_name, declarator):
+        name = declarator.name
+        self.check_name(name)
+        dims = dimensions(declarator.dims)
+        if name in self.shapes and self.shapes[name] != dims:
+            raise SyntaxError(f"Массив {name} объявлен с другими размерами")
+        code = typecode(type_name)
+        self.shapes[name] = dims
+        self.typecodes[name] = code if self.typecodes.get(name, code) == code else None
+        data = self.arrays.setdefault(name, "a_" + name)
+        self.emit(f"{data} = _array({code!r}, [0]) * {math.prod(dims)}")
+
+    # Блоки
+
+    def open_block(self, kind, condition, end, head=None):
+        self.emit(f"{kind} {self.condition(condition)}:")
+        self.depth += 1
+        self.forward.add(end)
+        self.blocks.append([kind, end, head, len(self.code) - 1, len(self.code), False])
+
+    def end_body(self, block):
+        if len(self.code) == block[4]:
+            self.emit("pass")
+
+    def close_block(self):
+        block = self.blocks.pop()
+        self.end_body(block)
+        self.depth -= 1
+        if block[0] == "while" and not block[5]:
+            # На начало "цикла" так и не перешли: это просто ветвление
+            self.code[block[3]] = self.code[block[3]].replace("while", "if", 1)
+
+    def place_label(self, label):
+        if label in self.defined:
+            raise SyntaxError(f"Метка {label} определена дважды")
+        self.defined.add(label)
+        top = self.blocks[-1] if self.blocks else None
+        if top is not None and top[1] == label:
+            self.close_block()
+            self.loop_head = None
+        elif label in self.forward:
+            if not (top is not None and top[0] == "else" and top[2] == label):
+                raise SyntaxError(f"Метка {label} закрывает не самый внутренний блок")
+        else:
+            self.loop_head = label
+
+    def jump_if_false(self, condition, label):
+        if label in self.defined or label in self.forward:
+            raise SyntaxError(f"Неподдерживаемый переход {label} УПЛ")
+        if self.loop_head is not None:
+            self.open_block("while", condition, label, self.loop_head)
+            self.loop_head = None
+        else:
+            self.open_block("if", condition, label)
+
+    def jump(self, label):
+        top = self.blocks[-1] if self.blocks else None
+        if top is not None and top[0] == "while" and top[2] == label:
+            if self.guard:
+                self.emit("if not _jumps: _limit()")
+                self.emit("_jumps -= 1")
+            top[5] = True
+            self.expect = top[1]
+        elif top is not None and top[0] == "if" and label not in self.defined and label not in self.forward:
+            # Конец ветки then: дальше ветка else до метки label
+            self.end_body(top)
+            self.code.append("    " * (self.depth - 1) + "else:")
+            self.lines.append(self.line)
+            self.forward.add(label)
+            self.expect = top[1]
+            top[:] = ["else", label, top[1], top[3], len(self.code), False]
+        else:
+            raise SyntaxError(f"Неподдерживаемый переход {label} БП")
+
+    def load_line(self, line):
+        for node in read_line(line):
+            kind = type(node)
+            if self.expect is not None:
+                if kind is not Label or node.name != self.expect:
+                    raise SyntaxError(f"После перехода ожидалась метка {self.expect}")
+                self.expect = None
+            if kind is Label:
+                self.place_label(node.name)
+                continue
+            if kind is JumpIfFalse:
+                self.jump_if_false(node.condition, node.label)
+                continue
+            self.loop_head = None
+            if kind is Jump:
+                self.jump(node.label)
+            elif kind is ExprStatement:
+                self.statement(node.expr)
+            elif kind is Printf:
+                args = "".join(self.expression(arg) + ", " for arg in node.args)
+                self.emit(f"_write({python_format(node.format)!r} % ({args}))")
+            elif kind is Return:
+                self.returns.append(len(self.code))
+                self.emit(f"return {self.expression(node.value)}, ")
+            else:
+                self.declare(node.type_name, node.declarators[0])
+
+    def load(self, opz_lines):
+        try:
+            for self.line, line in enumerate(opz_lines, 1):
+                self.load_line(line)
+            if self.blocks:
+                raise SyntaxError(f"Метка {self.blocks[-1][1]} не определена")
+        except SyntaxError as e:
+            raise SyntaxError(f"[Строка ОПЗ {self.line}] {e.msg}") from e
+        self.returns.append(len(self.code))
+        self.emit("return None, ")
+        return self
+
+    def source(self):
+        """Полный текст функции; возвращает его вместе с номерами строк ОПЗ."""
+        state = "(" + "".join(v + ", " for v in self.variables.values()) + "), (" + \
+                "".join(a + ", " for a in self.arrays.values()) + ")"
+        for position in self.returns:
+            self.code[position] += state
+        defaults = "".join(f", {name}={name}" for name in HELPERS)
+        head = [f"def program(_write, _jumps{defaults}):"]
+        if self.variables:
+            head.append(f"    {' = '.join(self.variables.values())} = 0")
+        if self.arrays:
+            head.append(f"    {' = '.join(self.arrays.values())} = None")
+        return "\n".join(head + self.code) + "\n", [0] * len(head) + self.lines
+
+
+def compile_opz(opz_lines, guard=False, symbols=None):
+    """
+    Скомпилированная программа из кэша или новая: (функция, Compiler, имя файла,
+    текст, номера строк ОПЗ). Ключ - SHA-256 текста ОПЗ, флаг guard и имена
+    объявлений symbols. Если compile() не принял текст (слишком глубокая
+    вложенность блоков), функция - None.
+    """
+    digest = hashlib.sha256("\n".join(opz_lines).encode("utf-8")).hexdigest()
+    key = (digest, guard, None if symbols is None else tuple(declared_names(symbols)))
+    entry = _cache.pop(key, None)
+    if entry is None:
+        compiler = Compiler(guard, symbols).load(opz_lines)
+        source, lines = compiler.source()
+        filename = f"<ОПЗ {digest[:12]}>"
+        namespace = dict(HELPERS)
+        try:
+            code = compile(source, filename, "exec")
+        except (SyntaxError, RecursionError, MemoryError):
+            # "too many statically nested blocks" и переполнение стека
+            # компилятора: ОПЗ верна, но в функцию Python не переводится
+            code = None
+        if code is not None:
+            exec(code, namespace)
+        entry = (namespace.get("program"), compiler, filename, source, lines)
+        if len(_cache) >= CACHE_SIZE:
+            del _cache[next(iter(_cache))]
+    _cache[key] = entry
+    return entry
+
+
+class CompiledProgram:
+    """
+    ОПЗ, скомпилированная в функцию Python; то же, что OpzMachine, но быстрее.
+    run() исполняет программу с начала и возвращает значение return, после
+    исполнения значения переменных доступны через variables() и array().
+    Если compile() не принял текст функции, всё делает OpzMachine (self.machine).
+    symbols - таблица имён разбора (Program.symbols), как у OpzMachine.
+    """
+
+    def __init__(self, opz_lines, symbols=None):
+        self.opz_lines = opz_lines
+        self.symbols = symbols
+        function, compiler, _, self.source, _ = compile_opz(opz_lines, symbols=symbols)
+        self.machine = OpzMachine(opz_lines, symbols) if function is None else None
+        self.names = list(compiler.variables)
+        self.array_names = list(compiler.arrays)
+        self.values = (0,) * len(self.names)
+        self.arrays = (None,) * len(self.array_names)
+
+    def variables(self):
+        if self.machine is not None:
+            return self.machine.variables()
+        return dict(zip(self.names, self.values))
+
+    def array(self, name):
+        if self.machine is not None:
+            return self.machine.array(name)
+        return self.arrays[self.array_names.index(name)]
+
+    def run(self, output=None, max_jumps=None):
+        """
+        Исполнение с начала. printf пишет в output (по умолчанию stdout).
+        max_jumps ограничивает число переходов назад, как в OpzMachine.run;
+        для него компилируется отдельный вариант функции со счётчиком.
+        """
+        if self.machine is not None:
+            return self.machine.run(output, max_jumps)
+        function, _, filename, _, lines = compile_opz(self.opz_lines, max_jumps is not None, self.symbols)
+        write = (output or sys.stdout).write
+        try:
+            result, self.values, self.arrays = function(write, max_jumps)
+        except _JumpLimit:
+            raise RuntimeError(f"Превышено число переходов: {max_jumps}") from None
+        except ZeroDivisionError as e:
+            raise RuntimeError(f"[Строка ОПЗ {error_line(e, filename, lines)}] Деление на ноль") from e
+        except IndexError as e:
+            raise RuntimeError(f"[Строка ОПЗ {error_line(e, filename, lines)}] Выход за границы массива") from e
+        except (TypeError, OverflowError, ValueError) as e:
+            raise RuntimeError(f"[Строка ОПЗ {error_line(e, filename, lines)}] {e}") from e
+        return result
+
+
+def error_line(error, filename, lines):
+    """Строка ОПЗ, на которой упала функция: по последнему кадру из её текста."""
+    line = 0
+    traceback = error.__traceback__
+    while traceback is not None:
+        if traceback.tb_frame.f_code.co_filename == filename:
+            line = lines[traceback.tb_lineno - 1]
+        traceback = traceback.tb_next
+    return line
+
+
+def run_compiled(opz_lines, output=None, symbols=None):
+    """Компиляция (или функция из кэша) и исполнение; возвращает значение return."""
+    return CompiledProgram(opz_lines, symbols).run(output)
+
+
+def nested_loops(depth):
+    """Программа на C из depth вложенных while, каждый проходится один раз."""
+    lines = ["int main() {", "int s = 0;"]
+    for level in range(depth):
+        lines.append(f"int i{level} = 0;")
+        lines.append(f"while (i{level} < 1) {{ i{level} = i{level} + 1;")
+    lines.append("s = s + 1;")
+    lines.append("}" * depth)
+    lines.append("return s;")
+    lines.append("}")
+    return lines
+
+
+def verify(count, seed=0):
+    """
+    Исполняет случайные программы (opz_optimize.random_program) на opz_vm
+    и скомпилированными и сравнивает результат, вывод printf, переменные
+    и массивы. Первой идёт программа из 25 вложенных циклов: её текст
+    compile() не принимает, и CompiledProgram исполняет её через opz_vm.
+    Каждая вторая программа исполняется с таблицей имён разбора.
+    Возвращает число расхождений.
+    """
+    import io
+    import random
+
+    from opz import parse_program, program_to_opz
+    from opz_optimize import random_program
+
+    def execute(machine):
+        output = io.StringIO()
+        try:
+            result = machine.run(output, max_jumps=100000)
+        except RuntimeError as e:
+            return "ошибка", str(e)
+        values = {name: value for name, value in machine.variables().items() if value != 0}
+        arrays = {name: list(machine.array(name) or ()) for name in machine.array_slots} \
+            if isinstance(machine, OpzMachine) else \
+            {name: list(machine.array(name) or ()) for name in machine.array_names}
+        return result, output.getvalue(), values, arrays
+
+    rnd = random.Random(seed)
+    mismatches = 0
+    for k in range(count):
+        source = nested_loops(25) if k == 0 else random_program(rnd)
+        tree = parse_program(source)
+        lines = program_to_opz(tree)
+        symbols = tree.symbols if k % 2 else None
+        expected = execute(OpzMachine(lines, symbols))
+        actual = execute(CompiledProgram(lines, symbols))
+        if expected != actual:
+            mismatches += 1
+            if mismatches == 1:
+                print("\n".join(source))
+                print("ожидалось:", expected)
+                print("получено: ", actual)
+    return mismatches
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from opz import code_example, parse_program, program_to_opz
+
+    parser = argparse.ArgumentParser(description="Компиляция ОПЗ в функцию Python")
+    parser.add_argument("source", nargs="?", help="программа на C (.c) или готовая ОПЗ")
+    parser.add_argument("--source", dest="show", action="store_true", help="показать текст функции")
+    parser.add_argument("--verify", type=int, metavar="N", help="сверить с opz_vm на N случайных программах")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.verify:
+        print(f"Программ: {args.verify}, расхождений: {verify(args.verify, args.seed)}")
+    else:
+        symbols = None
+        if args.source:
+            with open(args.source, "r", encoding="utf-8") as f:
+                lines = f.read().split("\n")
+        else:
+            lines = code_example
+        if not args.source or args.source.endswith(".c"):
+            tree = parse_program(lines)
+            lines, symbols = program_to_opz(tree), tree.symbols
+        program = CompiledProgram(lines, symbols)
+        if args.show:
+            print(program.source)
+        else:
+            print(f"Результат: {program.run()}")
@@ -0,0 +1,365 @@
+"""
+Оптимизация ОПЗ между генератором (opz.convert_to_opz_plain) и выводом.
+
+Строки ОПЗ читаются обратно в деревья (opz.read_line), упрощаются и
+записываются снова (opz.statements_to_opz):
+
+  - свёртка констант: 2 3 * -> 6, в том числе сравнения и && / ||;
+  - алгебраические упрощения: x*1, 1*x, x/1, x+0, 0+x, x-0 -> x, - -x -> x;
+  - понижение силы: x*2 и 2*x -> x+x для простой переменной;
+  - удаление лишнего: присваивания x = x и x += 0, выражения без побочных
+    эффектов и значения, которое затирается следующим присваиванием
+    той же переменной раньше, чем его кто-то прочитает.
+
+Деление и остаток на ноль не сворачиваются и не удаляются - ошибка
+исполнения остаётся на месте. Упрощения с константой применяются только к
+целой константе, чтобы не менять тип выражения (0.0 + x - уже double).
+Переходы и метки не трогаются, поэтому cpp_syntax_analizator.OPZParser
+восстанавливает по оптимизированной ОПЗ ту же структуру блоков.
+
+    python opz_optimize.py program.c       ОПЗ программы до и после
+    python opz_optimize.py --verify 500    проверка на случайных программах
+"""
+import re
+
+from opz import Jump, JumpIfFalse, Label, read_line, split_items, statements_to_opz
+from opz_vm import BINARY_FUNCTIONS, number
+from syntax_tree import Assign, Binary, ExprStatement, Index, Name, Number, Printf, Return, Unary
+
+# Запись вещественной константы, которую примет лексер
+_FLOAT_RE = re.compile(r"\d+\.\d+")
+# Операции, которые могут завершиться ошибкой исполнения
+_FAILING = ("/", "%")
+
+
+def count_items(opz_lines):
+    """Число элементов ОПЗ (операндов, операций, меток) в строках."""
+    return sum(len(split_items(line)) for line in opz_lines)
+
+
+def constant(node):
+    """Значение константы (число или минус число) или None."""
+    if type(node) is Unary and type(node.operand) is Number:
+        value = constant(node.operand)
+        return -value if value is not None else None
+    if type(node) is Number:
+        return number(node.value)
+    return None
+
+
+def make_constant(value):
+    """Узел для значения; None, если его не записать числом ОПЗ."""
+    if isinstance(value, bool):
+        value = int(value)
+    text = str(abs(value)) if isinstance(value, int) else repr(abs(value))
+    if isinstance(value, float) and not _FLOAT_RE.fullmatch(text):
+        return None
+    return Unary("-", Number(text)) if value < 0 else Number(text)
+
+
+def is_pure(node):
+    """Выражение без записи и без операций, способных упасть (деление, индекс)."""
+    kind = type(node)
+    if kind is Name or kind is Number:
+        return True
+    if kind is Unary:
+        return is_pure(node.operand)
+    if kind is Binary:
+        return node.op not in _FAILING and is_pure(node.left) and is_pure(node.right)
+    return False
+
+
+def names_read(node, result):
+    """Имена простых переменных, которые читает выражение."""
+    kind = type(node)
+    if kind is Name:
+        result.add(node.name)
+    elif kind is Index:
+        for index in node.indices:
+            names_read(index, result)
+    elif kind is Unary:
+        names_read(node.operand, result)
+    elif kind is Binary:
+        names_read(node.left, result)
+        names_read(node.right, result)
+    elif kind is Assign:
+        if type(node.target) is Index or node.op != "=":
+            names_read(node.target, result)
+        names_read(node.value, result)
+    return result
+
+
+def names_written(node, result):
+    """Имена простых переменных, в которые пишут присваивания внутри выражения."""
+    kind = type(node)
+    if kind is Assign:
+        if type(node.target) is Name:
+            result.add(node.target.name)
+        names_written(node.target, result)
+        names_written(node.value, result)
+    elif kind is Index:
+        for index in node.indices:
+            names_written(index, result)
+    elif kind is Unary:
+        names_written(node.operand, result)
+    elif kind is Binary:
+        names_written(node.left, result)
+        names_written(node.right, result)
+    return result
+
+
+class Optimizer:
+    """Один проход по строкам ОПЗ; счётчики преобразований - в stats."""
+
+    def __init__(self):
+        self.stats = {"before": 0, "after": 0, "folded": 0, "simplified": 0, "reduced": 0, "removed": 0}
+
+    # Выражения
+
+    def expression(self, node):
+        kind = type(node)
+        if kind is Index:
+            return Index(node.name, [self.expression(index) for index in node.indices])
+        if kind is Unary:
+            operand = self.expression(node.operand)
+            if type(operand) is Unary:
+                self.stats["simplified"] += 1
+                return operand.operand
+            return Unary(node.op, operand)
+        if kind is Binary:
+            return self.binary(node.op, self.expression(node.left), self.expression(node.right))
+        if kind is Assign:
+            target = self.expression(node.target) if type(node.target) is Index else node.target
+            return Assign(node.op, target, self.expression(node.value))
+        return node
+
+    def binary(self, op, left, right):
+        a = constant(left)
+        b = constant(right)
+        if a is not None and b is not None and not (op in _FAILING and b == 0):
+            folded = make_constant(BINARY_FUNCTIONS[op](a, b))
+            if folded is not None:
+                self.stats["folded"] += 1
+                return folded
+        # Единица и ноль - только целые: x * 1.0 уже double
+        a = a if type(a) is int else None
+        b = b if type(b) is int else None
+        if (op in ("+", "-") and b == 0) or (op in ("*", "/") and b == 1):
+            self.stats["simplified"] += 1
+            return left
+        if (op == "+" and a == 0) or (op == "*" and a == 1):
+            self.stats["simplified"] += 1
+            return right
+        if op == "*" and b == 2 and type(left) is Name:
+            self.stats["reduced"] += 1
+            return Binary("+", left, left)
+        if op == "*" and a == 2 and type(right) is Name:
+            self.stats["reduced"] += 1
+            return Binary("+", right, right)
+        return Binary(op, left, right)
+
+    def is_noop(self, expr):
+        """Оператор-выражение, который можно выбросить целиком."""
+        if type(expr) is not Assign:
+            return is_pure(expr)
+        if type(expr.target) is not Name:
+            return False
+        if expr.op == "=":
+            return type(expr.value) is Name and expr.value.name == expr.target.name
+        value = constant(expr.value)
+        return type(value) is int and value == (0 if expr.op in ("+=", "-=") else 1) and expr.op != "%="
+
+    # Операторы
+
+    def statements(self, statements):
+        """Упрощение операторов и удаление лишних; возвращает новый список."""
+        result = []
+        # Переменная -> номер в result присваивания, значение которого ещё не читали
+        pending = {}
+
+        def read(names):
+            for name in names:
+                pending.pop(name, None)
+
+        for node in statements:
+            kind = type(node)
+            if kind is ExprStatement:
+                expr = self.expression(node.expr)
+                if self.is_noop(expr):
+                    self.stats["removed"] += 1
+                    continue
+                read(names_read(expr, set()))
+                written = names_written(expr, set())
+                if type(expr) is Assign and type(expr.target) is Name and expr.op == "=":
+                    name = expr.target.name
+                    if name in pending:
+                        result[pending.pop(name)] = None
+                        self.stats["removed"] += 1
+                    written.discard(name)
+                    if is_pure(expr.value):
+                        pending[name] = len(result)
+                read(written)
+                result.append(ExprStatement(expr))
+            elif kind is JumpIfFalse:
+                node = JumpIfFalse(self.expression(node.condition), node.label)
+                pending.clear()
+                result.append(node)
+            elif kind is Printf:
+                node = Printf(node.format, [self.expression(arg) for arg in node.args])
+                for arg in node.args:
+                    read(names_read(arg, set()))
+                    read(names_written(arg, set()))
+                result.append(node)
+            elif kind is Return:
+                result.append(Return(self.expression(node.value)))
+                pending.clear()
+            else:
+                # Метка и переход - граница линейного участка; ОМ не читает переменных
+                if kind is Label or kind is Jump:
+                    pending.clear()
+                result.append(node)
+        return [node for node in result if node is not None]
+
+    def run(self, opz_lines):
+        statements = []
+        for line in opz_lines:
+            statements.extend(read_line(line))
+        lines = statements_to_opz(self.statements(statements))
+        self.stats["before"] = count_items(opz_lines)
+        self.stats["after"] = count_items(lines)
+        return lines
+
+
+def optimize(opz_lines):
+    """Оптимизированные строки ОПЗ и статистика преобразований."""
+    optimizer = Optimizer()
+    return optimizer.run(opz_lines), optimizer.stats
+
+
+def format_stats(stats):
+    saved = stats["before"] - stats["after"]
+    percent = saved * 100 / stats["before"] if stats["before"] else 0
+    return (f"Элементов ОПЗ: {stats['before']} -> {stats['after']} (-{percent:.1f}%); "
+            f"свёрнуто {stats['folded']}, упрощено {stats['simplified']}, "
+            f"заменено {stats['reduced']}, удалено {stats['removed']}")
+
+
+# Проверка на случайных программах
+
+def random_program(rnd, statements=12):
+    """Случайная программа на C с константами в выражениях; циклы конечны."""
+    names = ["a", "b", "c"]
+
+    def expression(depth):
+        choice = rnd.random()
+        if depth == 0 or choice < 0.3:
+            return rnd.choice(names + ["0", "1", "2", "3", "7", "2.5", "v[i % 4]"])
+        if choice < 0.4:
+            return "-" + expression(depth - 1)
+        if choice < 0.5:
+            return f"({expression(depth - 1)})"
+        if choice < 0.55:
+            # Присваивание внутри выражения: видно, вычислялся ли правый операнд && и ||
+            return f"({rnd.choice(names)} = {expression(depth - 1)} % 100)"
+        op = rnd.choice(["+", "-", "*", "/", "%", "<", "==", "&&", "||", "*", "+"])
+        # Делитель - ненулевая константа, иначе почти каждая программа падает
+        right = rnd.choice(["1", "2", "7"]) if op in _FAILING else expression(depth - 1)
+        return f"{expression(depth - 1)} {op} {right}"
+
+    def statement(depth):
+        choice = rnd.random()
+        target = rnd.choice(names)
+        if depth == 0 or choice < 0.5:
+            return rnd.choice([
+                f"{target} = ({expression(3)}) % 1000;",
+                f"{target} = {target};",
+                f"{target} {rnd.choice(['+=', '-=', '*='])} {rnd.choice(['0', '1', '2'])};",
+                f"{expression(2)};",
+                f"v[{rnd.choice('ijk')} % 4] = {expression(2)};",
+                f'printf("%d\\n", {expression(2)});',
+            ])
+        if choice < 0.7:
+            return f"if ({expression(2)}) {{ {block(depth - 1)} }} else {{ {block(depth - 1)} }}"
+        counter = "ijk"[depth % 3]
+        return f"for ({counter} = 0; {counter} < {rnd.randint(0, 5)}; {counter} = {counter} + 1) {{ {block(depth - 1)} }}"
+
+    def block(depth):
+        return " ".join(statement(depth) for _ in range(rnd.randint(1, 3)))
+
+    body = [statement(3) for _ in range(statements)]
+    return ["int main() {", "int a = 1, b = 2, c = 3, i = 0, j, k;", "int v[4];"] + body + [
+        f"return {expression(2)};", "}"]
+
+
+def verify(count, seed=0):
+    """
+    Исполняет ОПЗ до и после оптимизации на opz_vm и сравнивает результат,
+    вывод printf, переменные и массивы, а оптимизированную ОПЗ ещё и
+    восстанавливает в C++. Возвращает (число расхождений, суммарная статистика).
+    """
+    import io
+    import random
+
+    from cpp_syntax_analizator import parse_opz
+    from opz import convert_to_opz_plain
+    from opz_vm import OpzMachine
+
+    def execute(lines):
+        machine = OpzMachine(lines)
+        output = io.StringIO()
+        try:
+            result = machine.run(output, max_jumps=100000)
+        except RuntimeError:
+            return "ошибка", None, None, None
+        values = {name: value for name, value in machine.variables().items() if value != 0}
+        arrays = {name: list(machine.array(name) or ()) for name in machine.array_slots}
+        return result, output.getvalue(), values, arrays
+
+    rnd = random.Random(seed)
+    mismatches = 0
+    total = dict.fromkeys(Optimizer().stats, 0)
+    for _ in range(count):
+        source = random_program(rnd)
+        original = convert_to_opz_plain(source)
+        optimized, stats = optimize(original)
+        for key, value in stats.items():
+            total[key] += value
+        parse_opz(optimized)
+        expected = execute(original)
+        actual = execute(optimized)
+        if expected[0] == "ошибка" and actual[0] == "ошибка":
+            continue
+        if expected != actual:
+            mismatches += 1
+            if mismatches == 1:
+                print("\n".join(source))
+                print("ожидалось:", expected)
+                print("получено: ", actual)
+    return mismatches, total
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Оптимизация ОПЗ")
+    parser.add_argument("source", nargs="?", help="программа на C")
+    parser.add_argument("--verify", type=int, metavar="N", help="проверить на N случайных программах")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatches, total = verify(args.verify, args.seed)
+        print(format_stats(total))
+        print(f"Программ: {args.verify}, расхождений: {mismatches}")
+    else:
+        from opz import code_example, convert_to_opz_plain
+
+        if args.source:
+            with open(args.source, "r", encoding="utf-8") as f:
+                code = f.read().split("\n")
+        else:
+            code = code_example
+        lines, stats = optimize(convert_to_opz_plain(code))
+        for line in lines:
+            print(line)
+        print(format_stats(stats))
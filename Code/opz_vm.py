@@ -0,0 +1,510 @@
+"""
+Стековая машина, исполняющая ОПЗ, которую строит opz.OpzGenerator.
+
+ОПЗ загружается один раз: каждая строка разбирается в выражения
+(syntax_tree) и переводится в команды машины - пары (код, аргумент)
+в двух параллельных списках. При загрузке:
+
+  - имена переменных и массивов заменяются номерами ячеек; с таблицей
+    имён разбора (Program.symbols) ячейки всех объявлений заводятся
+    заранее, в порядке их слотов, под именами ОПЗ (scopes.unique_names);
+  - метки заменяются адресами команд;
+  - по статической глубине стека выбирается его размер, так что стек -
+    список фиксированной длины с указателем вершины;
+  - частые сочетания сливаются в одну команду: операция над переменной
+    и константой или двумя переменными, сравнение с условным переходом,
+    присваивание без значения на стеке;
+  - && и ||, как в C, вычисляют правый операнд, только если по левому
+    результат ещё не ясен: при сложном правом операнде это переход через
+    него (SHORT_CIRCUIT); переменную или число можно вычислить и так.
+
+Значения - числа Python; целые делятся с отбрасыванием дробной части,
+как в C. Массивы - array.array своего типа (TYPECODES), многомерные
+хранятся построчно в одном массиве. Ошибки исполнения (деление на ноль,
+выход за границы массива) поднимаются как RuntimeError с номером строки ОПЗ.
+
+    python opz_vm.py program.c        исполнить программу на C через ОПЗ
+    python opz_vm.py output_opz.txt   исполнить готовую ОПЗ
+"""
+import math
+import operator
+import re
+import sys
+from array import array
+
+from opz import Jump, JumpIfFalse, Label, read_line
+from scopes import unique_names
+from syntax_tree import Assign, Binary, ExprStatement, Index, Name, Number, Printf, Return, Unary
+
+# Типы элементов массивов; float и double хранятся как double
+TYPECODES = {"int": "q", "char": "b", "float": "d", "double": "d"}
+
+
+def c_div(a, b):
+    """Деление как в C: целые - с отбрасыванием дробной части."""
+    if isinstance(a, int) and isinstance(b, int):
+        q = a // b
+        return q + 1 if q < 0 and q * b != a else q
+    return a / b
+
+
+def c_mod(a, b):
+    if isinstance(a, int) and isinstance(b, int):
+        return a - b * c_div(a, b)
+    return math.fmod(a, b)
+
+
+def c_and(a, b):
+    return 1 if a and b else 0
+
+
+def c_or(a, b):
+    return 1 if a or b else 0
+
+
+BINARY_FUNCTIONS = {
+    "+": operator.add, "-": operator.sub, "*": operator.mul, "/": c_div, "%": c_mod,
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+    "==": operator.eq, "!=": operator.ne, "&&": c_and, "||": c_or,
+}
+COMPARISONS = ("<", "<=", ">", ">=", "==", "!=")
+
+# Коды команд, примерно в порядке частоты: в этом порядке их проверяет run
+(LOAD, STORE_POP, LOAD_BINARY_CONST, LOAD_BINARY_VAR, CONST, BINARY_CONST, BINARY_VAR, BINARY,
+ COMPARE_VAR_CONST_JUMP, COMPARE_CONST_JUMP, COMPARE_JUMP, JUMP_TO, LOAD_ELEM1, STORE_AT_POP, JUMP_IF_NOT,
+ STORE, LOAD_ELEM, ELEM, LOAD_AT, STORE_AT, DUP, NEG, POP, CALL_PRINTF, DECLARE, RETURN_VALUE,
+ SHORT_CIRCUIT, TRUTH) = range(28)
+
+# Изменение глубины стека по команде; None - зависит от аргумента
+STACK_EFFECT = {
+    LOAD: 1, CONST: 1, BINARY_CONST: 0, BINARY_VAR: 0, STORE_POP: -1, LOAD_BINARY_CONST: 1,
+    LOAD_BINARY_VAR: 1, COMPARE_VAR_CONST_JUMP: 0, COMPARE_CONST_JUMP: -1,
+    COMPARE_JUMP: -2, JUMP_TO: 0, BINARY: -1, LOAD_ELEM1: 0, STORE_AT_POP: -2, JUMP_IF_NOT: -1,
+    STORE: 0, LOAD_ELEM: None, ELEM: None, LOAD_AT: 0, STORE_AT: -1, DUP: 1, NEG: 0, POP: -1,
+    CALL_PRINTF: None, DECLARE: 0, RETURN_VALUE: -1,
+    # Без перехода левый операнд снимается, правый его заменит
+    SHORT_CIRCUIT: -1, TRUTH: 0,
+}
+
+_ESCAPES = {"n": "\n", "t": "\t", "\\": "\\", '"': '"', "0": "\0"}
+_LENGTH_MODIFIER = re.compile(r"(%[-+ #0]*\d*(?:\.\d+)?)(?:hh|h|ll|l|L)?([diouxXeEfgGcs%])")
+
+
+def python_format(literal):
+    """Формат printf ("%ld\\n" с кавычками) в строку для оператора %."""
+    text = re.sub(r"\\(.)", lambda m: _ESCAPES.get(m.group(1), m.group(1)), literal[1:-1])
+    return _LENGTH_MODIFIER.sub(lambda m: m.group(1) + ("d" if m.group(2) == "u" else m.group(2)), text)
+
+
+def number(text):
+    """Значение числа из ОПЗ; не число - SyntaxError."""
+    try:
+        return float(text) if "." in text else int(text)
+    except ValueError:
+        raise SyntaxError(f"Неверное число: {text}") from None
+
+
+def typecode(type_name):
+    """Тип элементов массива (TYPECODES); неизвестный тип - SyntaxError."""
+    code = TYPECODES.get(type_name)
+    if code is None:
+        raise SyntaxError(f"Неизвестный тип массива: {type_name}")
+    return code
+
+
+def dimensions(dims):
+    """Размеры массива из ОМ целыми числами; иначе SyntaxError."""
+    try:
+        return tuple(int(dim) for dim in dims)
+    except ValueError:
+        raise SyntaxError(f"Неверные размеры массива: {' '.join(dims)}") from None
+
+
+def declared_names(symbols):
+    """Пары (имя в ОПЗ, массив ли) для объявлений Program.symbols в порядке слотов."""
+    return [(name, bool(symbol.dims)) for symbol, name in zip(symbols, unique_names(symbols))]
+
+
+class Loader:
+    """Перевод строк ОПЗ в команды машины; результат забирает OpzMachine."""
+
+    def __init__(self, symbols=None):
+        self.ops = []
+        self.args = []
+        self.lines = []        # номер строки ОПЗ для каждой команды
+        self.slots = {}        # имя переменной -> номер ячейки
+        self.arrays = {}       # имя массива -> номер ячейки
+        self.shapes = {}       # имя массива -> размеры из ОМ
+        self.labels = {}
+        self.fixups = {}       # метка -> команды, ждущие её адреса
+        self.depth = 0
+        self.max_depth = 0
+        self.line = 0
+        if symbols is not None:
+            for name, is_array in declared_names(symbols):
+                cells = self.arrays if is_array else self.slots
+                cells.setdefault(name, len(cells))
+
+    def emit(self, op, arg=None, effect=None):
+        self.ops.append(op)
+        self.args.append(arg)
+        self.lines.append(self.line)
+        self.depth += STACK_EFFECT[op] if effect is None else effect
+        self.max_depth = max(self.max_depth, self.depth)
+
+    def slot(self, name):
+        return self.slots.setdefault(name, len(self.slots))
+
+    def array_slot(self, name, count):
+        if name not in self.shapes:
+            raise SyntaxError(f"Массив {name} не объявлен")
+        if len(self.shapes[name]) != count:
+            raise SyntaxError(f"У массива {name} {len(self.shapes[name])} измерений, а индексов {count}")
+        return self.arrays[name]
+
+    def jump(self, op, label, arg=()):
+        """Переход на метку: адрес - последний элемент аргумента."""
+        if label in self.labels:
+            self.emit(op, arg + (self.labels[label],))
+        else:
+            self.fixups.setdefault(label, []).append(len(self.ops))
+            self.emit(op, arg + (None,))
+
+    def place(self, label):
+        if label in self.labels:
+            raise SyntaxError(f"Метка {label} определена дважды")
+        address = self.labels[label] = len(self.ops)
+        for position in self.fixups.pop(label, ()):
+            self.args[position] = self.args[position][:-1] + (address,)
+
+    # Выражения
+
+    def expression(self, node):
+        kind = type(node)
+        if kind is Name:
+            self.emit(LOAD, self.slot(node.name))
+        elif kind is Number:
+            self.emit(CONST, number(node.value))
+        elif kind is Index:
+            self.element(node)
+            if len(node.indices) == 1:
+                self.emit(LOAD_ELEM1, self.arrays[node.name])
+            else:
+                self.emit(LOAD_ELEM, (self.arrays[node.name], self.shapes[node.name]), 1 - len(node.indices))
+        elif kind is Unary:
+            self.expression(node.operand)
+            self.emit(NEG)
+        elif kind is Binary:
+            self.binary(node)
+        else:
+            self.assign(node, keep=True)
+
+    def element(self, node):
+        """Индексы элемента на стек; для многомерного их ещё не сводят в один."""
+        self.array_slot(node.name, len(node.indices))
+        for index in node.indices:
+            self.expression(index)
+
+    def binary(self, node):
+        function = BINARY_FUNCTIONS[node.op]
+        right = type(node.right)
+        if type(node.left) is Name and right in (Name, Number):
+            # Оба операнда простые: одна команда вместо трёх
+            slot = self.slot(node.left.name)
+            if right is Number:
+                self.emit(LOAD_BINARY_CONST, (slot, function, number(node.right.value)))
+            else:
+                self.emit(LOAD_BINARY_VAR, (slot, function, self.slot(node.right.name)))
+            return
+        self.expression(node.left)
+        if right is Number:
+            self.emit(BINARY_CONST, (function, number(node.right.value)))
+        elif right is Name:
+            self.emit(BINARY_VAR, (function, self.slot(node.right.name)))
+        elif node.op in ("&&", "||"):
+            self.short_circuit(node.op == "||", node.right)
+        else:
+            self.expression(node.right)
+            self.emit(BINARY, function)
+
+    def short_circuit(self, is_or, right):
+        """
+        Правый операнд && или || после левого на стеке: если левый уже
+        решает результат (ложь для &&, истина для ||), правый пропускается.
+        """
+        position = len(self.ops)
+        self.emit(SHORT_CIRCUIT)
+        self.expression(right)
+        self.emit(TRUTH)
+        self.args[position] = (is_or, len(self.ops))
+
+    def assign(self, node, keep):
+        """Присваивание; keep - оставить значение на стеке."""
+        target = node.target
+        if type(target) is Name:
+            slot = self.slot(target.name)
+            if node.op == "=":
+                self.expression(node.value)
+            else:
+                self.binary(Binary(node.op[:-1], target, node.value))
+            self.emit(STORE if keep else STORE_POP, slot)
+            return
+        self.element(target)
+        slot = self.arrays[target.name]
+        if len(target.indices) > 1:
+            self.emit(ELEM, (slot, self.shapes[target.name]), 1 - len(target.indices))
+        if node.op == "=":
+            self.expression(node.value)
+        else:
+            self.emit(DUP)
+            self.emit(LOAD_AT, slot)
+            self.expression(node.value)
+            self.emit(BINARY, BINARY_FUNCTIONS[node.op[:-1]])
+        self.emit(STORE_AT if keep else STORE_AT_POP, slot)
+
+    def statement(self, node):
+        if type(node) is Assign:
+            self.assign(node, keep=False)
+        else:
+            self.expression(node)
+            self.emit(POP)
+
+    def condition_jump(self, condition, label):
+        """Переход на label при ложном условии; сравнение сливается с переходом."""
+        if type(condition) is Binary and condition.op in COMPARISONS:
+            function = BINARY_FUNCTIONS[condition.op]
+            if type(condition.left) is Name and type(condition.right) is Number:
+                self.jump(COMPARE_VAR_CONST_JUMP, label,
+                          (self.slot(condition.left.name), function, number(condition.right.value)))
+                return
+            self.expression(condition.left)
+            if type(condition.right) is Number:
+                self.jump(COMPARE_CONST_JUMP, label, (function, number(condition.right.value)))
+            else:
+                self.expression(condition.right)
+                self.jump(COMPARE_JUMP, label, (function,))
+        else:
+            self.expression(condition)
+            self.jump(JUMP_IF_NOT, label)
+
+    # Строки ОПЗ
+
+    def load_line(self, line):
+        """Одна строка ОПЗ: операторы из opz.read_line переводятся в команды."""
+        for node in read_line(line):
+            kind = type(node)
+            if kind is ExprStatement:
+                self.statement(node.expr)
+            elif kind is JumpIfFalse:
+                self.condition_jump(node.condition, node.label)
+            elif kind is Jump:
+                self.jump(JUMP_TO, node.label)
+            elif kind is Label:
+                self.place(node.name)
+            elif kind is Printf:
+                for arg in node.args:
+                    self.expression(arg)
+                self.emit(CALL_PRINTF, (python_format(node.format), len(node.args)), -len(node.args))
+            elif kind is Return:
+                self.expression(node.value)
+                self.emit(RETURN_VALUE)
+            else:
+                self.declare(node.type_name, node.declarators[0])
+
+    def declare(self, type_name, declarator):
+        name = declarator.name
+        dims = dimensions(declarator.dims)
+        if name in self.shapes and self.shapes[name] != dims:
+            raise SyntaxError(f"Массив {name} объявлен с другими размерами")
+        self.shapes[name] = dims
+        slot = self.arrays.setdefault(name, len(self.arrays))
+        self.emit(DECLARE, (slot, typecode(type_name), math.prod(dims)))
+
+    def load(self, opz_lines):
+        try:
+            for self.line, line in enumerate(opz_lines, 1):
+                self.load_line(line)
+        except SyntaxError as e:
+            raise SyntaxError(f"[Строка ОПЗ {self.line}] {e.msg}") from e
+        if self.fixups:
+            raise SyntaxError(f"Метка {min(self.fixups)} не определена")
+        # Неявный return в конце: цикл исполнения не проверяет выход за конец
+        self.emit(CONST, None)
+        self.emit(RETURN_VALUE)
+        return self
+
+
+class OpzMachine:
+    """
+    Загруженная программа в ОПЗ. run() исполняет её с начала и возвращает
+    значение return (None, если его не было); после исполнения значения
+    переменных доступны через variables() и array(). symbols - таблица
+    имён разбора (Program.symbols), по которой построена ОПЗ, если есть.
+    """
+
+    def __init__(self, opz_lines, symbols=None):
+        loader = Loader(symbols).load(opz_lines)
+        self.ops = loader.ops
+        self.args = loader.args
+        self.lines = loader.lines
+        self.slots = loader.slots
+        self.array_slots = loader.arrays
+        self.stack_size = loader.max_depth
+        self.values = [0] * len(self.slots)
+        self.arrays = [None] * len(self.array_slots)
+
+    def variables(self):
+        return {name: self.values[slot] for name, slot in self.slots.items()}
+
+    def array(self, name):
+        return self.arrays[self.array_slots[name]]
+
+    def run(self, output=None, max_jumps=None):
+        """
+        Исполнение с начала. printf пишет в output (по умолчанию stdout).
+        max_jumps ограничивает число переходов назад - защита от
+        бесконечного цикла, после него RuntimeError.
+        """
+        ops = self.ops
+        args = self.args
+        values = self.values = [0] * len(self.slots)
+        arrays = self.arrays = [None] * len(self.array_slots)
+        stack = [0] * (self.stack_size + 1)
+        write = (output or sys.stdout).write
+        jumps = -1 if max_jumps is None else max_jumps
+        sp = -1
+        pc = 0
+        try:
+            while True:
+                op = ops[pc]
+                arg = args[pc]
+                pc += 1
+                if op == LOAD:
+                    sp += 1
+                    stack[sp] = values[arg]
+                elif op == STORE_POP:
+                    values[arg] = stack[sp]
+                    sp -= 1
+                elif op == LOAD_BINARY_CONST:
+                    sp += 1
+                    stack[sp] = arg[1](values[arg[0]], arg[2])
+                elif op == LOAD_BINARY_VAR:
+                    sp += 1
+                    stack[sp] = arg[1](values[arg[0]], values[arg[2]])
+                elif op == CONST:
+                    sp += 1
+                    stack[sp] = arg
+                elif op == BINARY_CONST:
+                    stack[sp] = arg[0](stack[sp], arg[1])
+                elif op == BINARY_VAR:
+                    stack[sp] = arg[0](stack[sp], values[arg[1]])
+                elif op == BINARY:
+                    sp -= 1
+                    stack[sp] = arg(stack[sp], stack[sp + 1])
+                elif op == COMPARE_VAR_CONST_JUMP:
+                    if not arg[1](values[arg[0]], arg[2]):
+                        pc = arg[3]
+                elif op == COMPARE_CONST_JUMP:
+                    sp -= 1
+                    if not arg[0](stack[sp + 1], arg[1]):
+                        pc = arg[2]
+                elif op == COMPARE_JUMP:
+                    sp -= 2
+                    if not arg[0](stack[sp + 1], stack[sp + 2]):
+                        pc = arg[1]
+                elif op == JUMP_TO:
+                    if arg[0] < pc:
+                        if jumps == 0:
+                            raise RuntimeError(f"Превышено число переходов: {max_jumps}")
+                        jumps -= 1
+                    pc = arg[0]
+                elif op == LOAD_ELEM1:
+                    index = stack[sp]
+                    if index < 0:
+                        raise IndexError
+                    stack[sp] = arrays[arg][index]
+                elif op == STORE_AT_POP:
+                    data = arrays[arg]
+                    index = stack[sp - 1]
+                    if index < 0:
+                        raise IndexError
+                    data[index] = stack[sp] if data.typecode == "d" else int(stack[sp])
+                    sp -= 2
+                elif op == JUMP_IF_NOT:
+                    sp -= 1
+                    if not stack[sp + 1]:
+                        pc = arg[0]
+                elif op == STORE:
+                    values[arg] = stack[sp]
+                elif op == LOAD_ELEM or op == ELEM:
+                    slot, dims = arg
+                    sp -= len(dims) - 1
+                    flat = 0
+                    for k, size in enumerate(dims):
+                        index = stack[sp + k]
+                        if not 0 <= index < size:
+                            raise IndexError
+                        flat = flat * size + index
+                    stack[sp] = arrays[slot][flat] if op == LOAD_ELEM else flat
+                elif op == LOAD_AT:
+                    index = stack[sp]
+                    if index < 0:
+                        raise IndexError
+                    stack[sp] = arrays[arg][index]
+                elif op == STORE_AT:
+                    data = arrays[arg]
+                    index = stack[sp - 1]
+                    if index < 0:
+                        raise IndexError
+                    value = stack[sp] if data.typecode == "d" else int(stack[sp])
+                    data[index] = value
+                    sp -= 1
+                    stack[sp] = value
+                elif op == DUP:
+                    sp += 1
+                    stack[sp] = stack[sp - 1]
+                elif op == NEG:
+                    stack[sp] = -stack[sp]
+                elif op == POP:
+                    sp -= 1
+                elif op == CALL_PRINTF:
+                    format, count = arg
+                    sp -= count
+                    write(format % tuple(stack[sp + 1:sp + 1 + count]))
+                elif op == DECLARE:
+                    slot, typecode, size = arg
+                    arrays[slot] = array(typecode, [0]) * size
+                elif op == RETURN_VALUE:
+                    return stack[sp]
+                elif op == SHORT_CIRCUIT:
+                    if bool(stack[sp]) == arg[0]:
+                        stack[sp] = 1 if arg[0] else 0
+                        pc = arg[1]
+                    else:
+                        sp -= 1
+                elif op == TRUTH:
+                    stack[sp] = 1 if stack[sp] else 0
+        except ZeroDivisionError as e:
+            raise RuntimeError(f"[Строка ОПЗ {self.lines[pc - 1]}] Деление на ноль") from e
+        except IndexError as e:
+            raise RuntimeError(f"[Строка ОПЗ {self.lines[pc - 1]}] Выход за границы массива") from e
+        except (TypeError, OverflowError, ValueError) as e:
+            raise RuntimeError(f"[Строка ОПЗ {self.lines[pc - 1]}] {e}") from e
+
+
+def run_opz(opz_lines, output=None, symbols=None):
+    """Загрузка и исполнение ОПЗ; возвращает значение return."""
+    return OpzMachine(opz_lines, symbols).run(output)
+
+
+if __name__ == "__main__":
+    from opz import parse_program, program_to_opz
+
+    with open(sys.argv[1], "r", encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    symbols = None
+    if sys.argv[1].endswith(".c"):
+        tree = parse_program(lines)
+        lines, symbols = program_to_opz(tree), tree.symbols
+    result = run_opz(lines, symbols=symbols)
+    print(f"Результат: {result}")
@@ -0,0 +1,220 @@
+"""
+Параллельный лексический анализ одного большого файла: текст режется
+на куски по безопасным границам, куски разбираются scaner.Lexer в пуле
+процессов, результаты склеиваются в массивы и таблицу имён, совпадающие
+с последовательным Lexer.lex побайтно.
+
+Граница - перевод строки вне комментария /* */. Строковые константы,
+// комментарии и #include не переносятся через строку, так что только
+многострочный комментарий может накрыть перевод строки. Где начинаются
+настоящие комментарии, показывает проход BOUNDARY_RE по куску с "/*":
+он ищет только комментарии, константы и #include (в них может стоять
+"/*"), а остальные лексемы не содержат "/*", '"' и "#", так что проход
+совпадает с мастер-выражением там, где это важно. Этот проход идёт
+в C внутри re и намного дешевле самого разбора.
+
+Идентификаторы, числа и константы куска получают в ChunkSymbols общие
+номера-слоты подряд от FIRST_SLOT, выше номеров служебных слов, операций
+и разделителей. При склейке слоты куска по порядку переводятся в номера
+общей таблицы (имена интернируются, числа и константы продолжают счёт
+предыдущих кусков), и номера лексем пересчитываются одним проходом
+map по таблице слотов, без цикла на Python.
+
+    lexer = ParallelLexer(jobs=8)
+    columns = lexer.lex(code)
+    tokenizer = Tokenizer.from_columns(*columns, lexer.symbols)
+
+    python parallel_lex.py big.c -j 8 -o tokens_output.txt
+    python parallel_lex.py big.c -b tokens.bin --parse
+    python parallel_lex.py big.c --check
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from scaner import CLASS_INDEX, KIND_C, KIND_I, KIND_N, TOKEN_PATTERNS, Lexer, SymbolTable, group_lines
+
+# Примерный размер куска в символах; файл меньше двух кусков разбирается
+# последовательно: запуск пула дороже выигрыша
+DEFAULT_CHUNK_SIZE = 1 << 22
+
+# Лексемы, внутри которых "/*" не начинает комментарий, и сам комментарий
+BOUNDARY_RE = re.compile("|".join(
+    f"(?s:{pattern})" if flags else pattern
+    for pattern, lexeme_type, *flags in TOKEN_PATTERNS if lexeme_type in ("COMMENT", "W", "C")
+))
+
+# Номера служебных слов, операций и разделителей - от 1 до FIRST_SLOT - 1
+FIRST_SLOT = max(max(table.values()) for table in CLASS_INDEX.values()) + 1
+
+
+class ChunkSymbols(SymbolTable):
+    """
+    Таблица куска: идентификатор (при первом вхождении), число и константа
+    получают следующий слот, а в values записывается (класс, лексема).
+    """
+    __slots__ = ("values",)
+
+    def __init__(self):
+        super().__init__()
+        self.values = []
+
+    def intern(self, name):
+        slot = self.identifiers.get(name)
+        if slot is None:
+            slot = self.identifiers[name] = self.add_value(KIND_I, name)
+        return slot
+
+    def add_number(self, value):
+        return self.add_value(KIND_N, value)
+
+    def add_constant(self, value):
+        return self.add_value(KIND_C, value)
+
+    def add_value(self, kind, value):
+        self.values.append((kind, value))
+        return FIRST_SLOT + len(self.values) - 1
+
+
+def chunk_bounds(code, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Куски (начало, конец, номер первой строки) размером около chunk_size,
+    каждый кончается переводом строки вне комментария (последний - концом текста).
+    """
+    start = 0
+    line = 1
+    while len(code) - start > chunk_size:
+        newline = code.find("\n", start + chunk_size)
+        # Начало куска - начало строки вне комментария, с него можно
+        # искать комментарии заново; без "/*" в куске искать нечего
+        if newline != -1 and code.find("/*", start, newline) != -1:
+            for span in BOUNDARY_RE.finditer(code, start):
+                if span.start() > newline:
+                    break
+                if span.end() > newline:
+                    # Перевод строки внутри комментария: берём следующий после него
+                    newline = code.find("\n", span.end())
+                    if newline == -1:
+                        break
+        if newline == -1:
+            break
+        yield start, newline + 1, line
+        line += code.count("\n", start, newline + 1)
+        start = newline + 1
+    yield start, len(code), line
+
+
+# Текст файла в процессах пула: передаётся один раз через initializer
+# (при fork - без копирования), задачи несут только границы куска
+_source = None
+
+
+def _init_worker(code):
+    global _source
+    _source = code
+
+
+def _lex_chunk(bounds):
+    start, end, line = bounds
+    lexer = Lexer(ChunkSymbols())
+    kinds, indices, lines = lexer.lex(_source[start:end], line)
+    return kinds, indices, lines, lexer.symbols.values
+
+
+class ParallelLexer:
+    """
+    Замена scaner.Lexer для больших файлов: lex(code) возвращает те же
+    массивы, а self.symbols - ту же таблицу, что и последовательный разбор.
+    Ошибка в тексте поднимается та же, что у Lexer.lex (первая по тексту).
+    """
+
+    def __init__(self, jobs=None, chunk_size=DEFAULT_CHUNK_SIZE, symbols=None):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.symbols = symbols if symbols is not None else SymbolTable()
+
+    def lex(self, code):
+        bounds = list(chunk_bounds(code, self.chunk_size))
+        if self.jobs == 1 or len(bounds) == 1:
+            return Lexer(self.symbols).lex(code)
+        with ProcessPoolExecutor(min(self.jobs, len(bounds)), initializer=_init_worker,
+                                 initargs=(code,)) as executor:
+            return self.merge(executor.map(_lex_chunk, bounds))
+
+    def merge(self, chunks):
+        """Склеивает результаты кусков по порядку, переводя слоты в номера self.symbols."""
+        symbols = self.symbols
+        add = {KIND_I: symbols.intern, KIND_N: symbols.add_number, KIND_C: symbols.add_constant}
+        kinds = array("b")
+        indices = array("i")
+        lines = array("i")
+        for chunk_kinds, chunk_indices, chunk_lines, values in chunks:
+            table = list(range(FIRST_SLOT))
+            table.extend(add[kind](value) for kind, value in values)
+            kinds += chunk_kinds
+            indices.extend(map(table.__getitem__, chunk_indices))
+            lines += chunk_lines
+        return kinds, indices, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельный лексический анализ большого файла C")
+    parser.add_argument("input")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="число процессов (по умолчанию по числу ядер)")
+    parser.add_argument("--chunk-size", type=float, default=DEFAULT_CHUNK_SIZE / (1 << 20),
+                        help="размер куска в мегабайтах (по умолчанию %(default)s)")
+    parser.add_argument("-o", "--output", default=None, help="сохранить лексемы в формате tokens_output.txt")
+    parser.add_argument("-b", "--binary", metavar="PATH", help="сохранить лексемы в двоичном формате token_stream")
+    parser.add_argument("--parse", action="store_true", help="передать лексемы синтаксическому анализатору")
+    parser.add_argument("--check", action="store_true", help="сравнить с последовательным scaner.Lexer")
+    args = parser.parse_args()
+
+    with open(args.input, "r", encoding="utf-8") as f:
+        code = f.read()
+    lexer = ParallelLexer(args.jobs, max(1, int(args.chunk_size * (1 << 20))))
+    start = time.perf_counter()
+    try:
+        columns = lexer.lex(code)
+    except SyntaxError as e:
+        print(e, file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    print(f"Лексем: {len(columns[0])}, процессов: {lexer.jobs}, время: {elapsed:.3f} с")
+
+    if args.check:
+        sequential = Lexer()
+        start = time.perf_counter()
+        expected = sequential.lex(code)
+        print(f"Последовательно: {time.perf_counter() - start:.3f} с")
+        tables = [(symbols.names, symbols.numbers, symbols.constants) for symbols in (sequential.symbols, lexer.symbols)]
+        if expected != columns or tables[0] != tables[1]:
+            print("Результаты не совпадают с scaner.Lexer", file=sys.stderr)
+            return 1
+        print("Совпадает с scaner.Lexer")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in group_lines(*columns))
+        print(f"Лексемы сохранены в файл {args.output}")
+    if args.binary:
+        from token_stream import write_binary
+
+        write_binary(args.binary, *columns, lexer.symbols)
+        print(f"Лексемы сохранены в файл {args.binary}")
+    if args.parse:
+        from parser_l4 import SyntaxAnalyzer, Tokenizer
+
+        errors = SyntaxAnalyzer(Tokenizer.from_columns(*columns, lexer.symbols)).parse()
+        if errors:
+            print(f"Синтаксических ошибок: {len(errors)}")
+            for e in errors:
+                print(e)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
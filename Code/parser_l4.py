@@ -1,3 +1,12 @@
+from array import array
+
+from scaner import CLASS_CODES, KIND_C, KIND_I, KIND_N, KIND_O, format_code
+from scopes import Scopes
+from syntax_tree import (
+    ASSIGN_OPERATORS, ASSIGN_PRIORITY, BINARY_PRIORITY, Assign, Binary, Block, Declaration, Declarator,
+    ExprStatement, For, If, Index, Name, Number, Printf, Program, Return, Unary, While,
+)
+
 token_map = {
     "W1": "int", "W2": "char", "W3": "float", "W4": "double", "W5": "return",
     "W6": "if", "W7": "else", "W8": "for", "W9": "while", "W10": "do",
@@ -16,152 +25,578 @@ token_map = {
     "R7": ",", "R8": ";", "R9": ".",
 }
 
+KEYWORD_LEXEMES = {lexeme for code, lexeme in token_map.items() if code[0] == "W"}
+# Все операции и разделители: "&&", "+=", "[" и прочие - не идентификаторы
+SYMBOL_LEXEMES = {lexeme for code, lexeme in token_map.items() if code[0] in "OR"}
+
 def classify_token(value):
-    if value in {"#", "include", "int", "main", "return", "printf", "scanf", "if"}:
+    if value in KEYWORD_LEXEMES or value in {"#", "include"}:
         return "keyword"
     elif value.startswith('"'):
         return "str"
     elif value.isdigit():
         return "num"
-    elif value in {"<", ">", "(", ")", "{", "}", ";", ",", ".", "=",
-                   "==", "!=", "<=", ">=", "+", "-", "*", "/", "%"}:
+    elif value in SYMBOL_LEXEMES:
         return "symbol"
     else:
         return "id"
 
+def build_fixed_tables():
+    """
+    Лексемы и типы служебных слов, операций и разделителей, разложенные
+    по спискам [класс][номер], и обратная таблица "лексема -> (класс, номер)".
+    """
+    lexemes = [None] * len(CLASS_CODES)
+    types = [None] * len(CLASS_CODES)
+    literals = {}
+    for code, lexeme in token_map.items():
+        kind, index = CLASS_KINDS[code[0]], int(code[1:])
+        if lexemes[kind] is None:
+            lexemes[kind] = []
+            types[kind] = []
+        missing = index + 1 - len(lexemes[kind])
+        if missing > 0:
+            lexemes[kind].extend([None] * missing)
+            types[kind].extend([None] * missing)
+        lexemes[kind][index] = lexeme
+        types[kind][index] = classify_token(lexeme)
+        literals[lexeme] = (kind, index)
+    return lexemes, types, literals
+
+
+CLASS_KINDS = {letter: kind for kind, letter in enumerate(CLASS_CODES)}
+FIXED_LEXEMES, FIXED_TYPES, LITERALS = build_fixed_tables()
+
+# Идентификаторы, числа и константы типизируются по классу кода
+CLASS_TYPES = {KIND_I: "id", KIND_N: "num", KIND_C: "str"}
+
+
+def syntax_error(line, message):
+    """SyntaxError с номером строки в тексте сообщения и в атрибуте line."""
+    error = SyntaxError(f"[Строка {line}] {message}")
+    error.line = line
+    return error
+
+
 class Token:
-    def __init__(self, line, code):
+    __slots__ = ("line", "code", "lexeme", "type")
+
+    def __init__(self, line, code, lexeme=None, type_=None):
         self.line = line
         self.code = code
-        self.lexeme = token_map.get(code, code)
-        self.type = classify_token(self.lexeme)
+        self.lexeme = token_map.get(code, code) if lexeme is None else lexeme
+        self.type = classify_token(self.lexeme) if type_ is None else type_
 
     def __repr__(self):
         return f"{self.lexeme} ({self.type}) @ {self.line}"
 
+
 class Tokenizer:
-    def __init__(self, filename):
-        self.tokens = self.load(filename)
+    """
+    Лексемы хранятся столбцами: класс, номер и строка в array.
+    Лексема и тип служебных слов, операций и разделителей берутся
+    из таблиц, посчитанных один раз; Token создаётся только по запросу.
+    """
+
+    def __init__(self, filename=None):
+        self.kinds = array("b")
+        self.indices = array("i")
+        self.lines = array("i")
+        # Таблицы исходных текстов (scaner.SymbolTable или token_stream.TokenFile),
+        # если они известны
+        self.symbols = None
         self.pos = 0
+        if filename is not None:
+            self.load(filename)
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Токенизатор по уже готовым строкам кодов, без чтения файла."""
+        tokenizer = cls()
+        tokenizer.read_lines(lines)
+        return tokenizer
+
+    @classmethod
+    def from_columns(cls, kinds, indices, lines, symbols=None):
+        """Токенизатор по массивам Lexer.lex (или любым буферам тех же типов)."""
+        tokenizer = cls()
+        tokenizer.kinds.frombytes(memoryview(kinds).cast("B"))
+        tokenizer.indices.frombytes(memoryview(indices).cast("B"))
+        tokenizer.lines.frombytes(memoryview(lines).cast("B"))
+        tokenizer.symbols = symbols
+        return tokenizer
+
+    @classmethod
+    def from_binary(cls, filename):
+        """
+        Токенизатор по двоичному файлу token_stream без копирования: столбцы -
+        memoryview над отображённым файлом, имена декодируются при обращении.
+        Файл остаётся открытым до close() (или до сборки токенизатора).
+        """
+        from token_stream import TokenFile
+
+        tf = TokenFile(filename)
+        tokenizer = cls()
+        tokenizer.kinds, tokenizer.indices, tokenizer.lines = tf.kinds, tf.indices, tf.lines
+        tokenizer.symbols = tf
+        return tokenizer
+
+    def close(self):
+        """Закрывает файл, открытый from_binary; для остальных токенизаторов ничего не делает."""
+        close = getattr(self.symbols, "close", None)
+        if close is not None:
+            close()
 
     def load(self, filename):
-        tokens = []
         with open(filename, "r") as f:
-            for lineno, line in enumerate(f, 1):
-                for code in line.strip().split():
-                    tokens.append(Token(lineno, code))
-        return tokens
+            self.read_lines(f)
+
+    def read_lines(self, lines):
+        kinds = self.kinds
+        indices = self.indices
+        line_numbers = self.lines
+        known = {}
+        for lineno, line in enumerate(lines, 1):
+            for code in line.split():
+                parsed = known.get(code)
+                if parsed is None:
+                    parsed = known[code] = self.parse_code(code)
+                kinds.append(parsed[0])
+                indices.append(parsed[1])
+                line_numbers.append(lineno)
+
+    @staticmethod
+    def parse_code(code):
+        kind = CLASS_KINDS.get(code[:1])
+        if kind is None or not code[1:].isdigit():
+            raise SyntaxError(f"Неизвестный код лексемы: '{code}'")
+        index = int(code[1:])
+        table = FIXED_LEXEMES[kind]
+        if table is not None and (index >= len(table) or table[index] is None):
+            raise SyntaxError(f"Неизвестный код лексемы: '{code}'")
+        return kind, index
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def lexeme_of(self, kind, index):
+        table = FIXED_LEXEMES[kind]
+        if table is not None:
+            return table[index]
+        if self.symbols is not None:
+            return self.symbols.lexeme(kind, index)
+        return format_code(kind, index)
+
+    def type_of(self, kind, index):
+        table = FIXED_TYPES[kind]
+        return table[index] if table is not None else CLASS_TYPES[kind]
+
+    def token(self, pos):
+        kind, index = self.kinds[pos], self.indices[pos]
+        return Token(self.lines[pos], format_code(kind, index),
+                     self.lexeme_of(kind, index), self.type_of(kind, index))
+
+    @property
+    def tokens(self):
+        return [self.token(pos) for pos in range(len(self.kinds))]
 
     def current(self):
-        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+        return self.token(self.pos) if self.pos < len(self.kinds) else None
+
+    def lexeme(self):
+        """Лексема текущего токена или None в конце потока."""
+        pos = self.pos
+        if pos >= len(self.kinds):
+            return None
+        return self.lexeme_of(self.kinds[pos], self.indices[pos])
+
+    def at(self, lexeme):
+        """Совпадает ли текущий токен с лексемой служебного слова, операции или разделителя."""
+        pos = self.pos
+        return (pos < len(self.kinds)
+                and (self.kinds[pos], self.indices[pos]) == LITERALS.get(lexeme))
+
+    def lexeme_at(self, pos):
+        return self.lexeme_of(self.kinds[pos], self.indices[pos])
+
+    def operator(self):
+        """Текст текущей операции или None, если текущий токен - не операция."""
+        pos = self.pos
+        if pos < len(self.kinds) and self.kinds[pos] == KIND_O:
+            return FIXED_LEXEMES[KIND_O][self.indices[pos]]
+        return None
 
     def next(self):
         self.pos += 1
 
     def expect(self, lexeme=None, type_=None):
-        tok = self.current()
-        if not tok:
+        pos = self.pos
+        if pos >= len(self.kinds):
             raise SyntaxError("Ожидался токен, но достигнут конец файла")
-        if lexeme and tok.lexeme != lexeme:
-            raise SyntaxError(f"[Строка {tok.line + 1}] Ожидалось '{lexeme}', найдено '{tok.lexeme}'")
+        if lexeme and (self.kinds[pos], self.indices[pos]) != LITERALS.get(lexeme):
+            tok = self.current()
+            raise syntax_error(tok.line, f"Ожидалось '{lexeme}', найдено '{tok.lexeme}'")
         if type_:
-            if isinstance(type_, str) and tok.type != type_:
-                raise SyntaxError(f"[Строка {tok.line + 1}] Ожидался тип '{type_}', найдено '{tok.type}'")
-            if isinstance(type_, set) and tok.type not in type_:
-                raise SyntaxError(f"[Строка {tok.line + 1}] Ожидался один из типов {type_}, найдено '{tok.type}'")
-        self.next()
-        return tok
+            found = self.type_of(self.kinds[pos], self.indices[pos])
+            if isinstance(type_, str) and found != type_:
+                raise syntax_error(self.lines[pos], f"Ожидался тип '{type_}', найдено '{found}'")
+            if isinstance(type_, set) and found not in type_:
+                raise syntax_error(self.lines[pos], f"Ожидался один из типов {type_}, найдено '{found}'")
+        self.pos = pos + 1
+        return pos
+
+
+MAX_ERRORS = 50
+TYPE_NAMES = ("int", "float", "double", "char")
+
+
+class ErrorLimitReached(Exception):
+    pass
+
 
 class SyntaxAnalyzer:
-    def __init__(self, tokenizer):
+    """
+    Рекурсивный анализатор с восстановлением после ошибок: ошибка
+    в операторе записывается в self.errors, после чего лексемы
+    пропускаются до ';' или '}' (режим паники) и разбор продолжается.
+    После max_errors ошибок разбор прекращается.
+
+    С semantic (по умолчанию) попутно ведётся таблица имён scopes.Scopes:
+    использование необъявленной переменной и повторное объявление в том
+    же блоке - тоже ошибки, а имена в дереве получают слоты. Без semantic
+    разбираются и отдельные операторы вне контекста объявлений.
+    """
+
+    def __init__(self, tokenizer, max_errors=MAX_ERRORS, semantic=True):
         self.tok = tokenizer
+        self.max_errors = max_errors
+        self.errors = []
+        self.scopes = Scopes() if semantic else None
+        # Необъявленные имена: о каждом сообщается один раз
+        self.undeclared = set()
+        # Дерево программы после parse_program (syntax_tree.Program)
+        self.tree = None
 
     def parse(self):
-        self.parse_program()
-        print("Синтаксический анализ завершён без ошибок")
+        errors = self.check()
+        if not errors:
+            print("Синтаксический анализ завершён без ошибок")
+        return errors
+
+    def check(self):
+        """Разбирает программу целиком и возвращает список всех ошибок."""
+        try:
+            self.parse_program()
+        except SyntaxError as e:
+            self.errors.append(e)
+        except RecursionError:
+            self.errors.append(self.nesting_error())
+        except ErrorLimitReached:
+            pass
+        return self.errors
+
+    def nesting_error(self):
+        """Ошибка вместо RecursionError: скобки, унарные минусы или блоки вложены слишком глубоко."""
+        tok = self.tok
+        return syntax_error(tok.lines[min(tok.pos, len(tok) - 1)], "Слишком глубокая вложенность")
+
+    def report(self, error):
+        self.errors.append(error)
+        if len(self.errors) >= self.max_errors:
+            raise ErrorLimitReached()
+
+    def synchronize(self):
+        """
+        Пропускает лексемы до конца ошибочного оператора: до ';'
+        (включительно), до '}' текущего блока (не включая) или до конца
+        вложенного блока '{ ... }', начатого внутри оператора.
+        """
+        tok = self.tok
+        depth = 0
+        while tok.pos < len(tok):
+            if tok.at(";") and not depth:
+                tok.next()
+                return
+            if tok.at("{"):
+                depth += 1
+            elif tok.at("}"):
+                if not depth:
+                    return
+                depth -= 1
+                if not depth:
+                    tok.next()
+                    return
+            tok.next()
 
     def parse_program(self):
-        self.parse_includes()
-        self.parse_main()
+        """Разбирает программу и возвращает её дерево (он же self.tree)."""
+        line = self.tok.lines[self.tok.pos] if self.tok.pos < len(self.tok) else None
+        includes = self.parse_includes()
+        self.tree = Program(includes, self.parse_main(), line)
+        if self.scopes is not None:
+            self.tree.symbols = self.scopes.symbols
+        return self.tree
 
     def parse_includes(self):
-        while self.tok.current() and self.tok.current().lexeme == "#include":
+        includes = []
+        while self.tok.at("#include"):
             self.tok.expect("#include")
             self.tok.expect("<")
-            self.tok.expect(None, {"id", "num"})
+            pos = self.tok.expect(None, {"id", "num"})
+            includes.append(self.tok.lexeme_at(pos))
             self.tok.expect(">")
+        return includes
 
     def parse_main(self):
         self.tok.expect("int")
         self.tok.expect("main")
         self.tok.expect("(")
         self.tok.expect(")")
-        self.tok.expect("{")
-        self.parse_statements()
+        return self.parse_block()
+
+    def parse_block(self):
+        line = self.tok.lines[self.tok.expect("{")]
+        statements = self.parse_statements()
         self.tok.expect("}")
+        return Block(statements, line)
 
     def parse_statements(self):
-        while self.tok.current() and self.tok.current().lexeme != "}":
-            self.parse_statement()
+        statements = []
+        scopes = self.scopes
+        if scopes is not None:
+            scopes.enter()
+        try:
+            while self.tok.lexeme() not in (None, "}"):
+                self.begin_statement()
+                try:
+                    statements.append(self.parse_statement())
+                except SyntaxError as e:
+                    self.report(e)
+                    self.synchronize()
+        finally:
+            if scopes is not None:
+                scopes.leave()
+        return statements
 
-    def parse_declaration(self):
-        self.tok.expect("int")
-        self.tok.expect(None, "id")
-        self.tok.expect("=")
-        self.tok.expect(None, {"num", "id"})
-        self.tok.expect(";")
+    def begin_statement(self):
+        """Вызывается перед каждым оператором блока (incremental.py запоминает здесь их начала)."""
+
+    def parse_body(self):
+        """Тело if, else, while и for: своя область видимости, даже если это не блок."""
+        scopes = self.scopes
+        if scopes is None:
+            return self.parse_statement()
+        scopes.enter()
+        try:
+            return self.parse_statement()
+        finally:
+            scopes.leave()
+
+    def declare(self, name, type_name, dims, pos):
+        scopes = self.scopes
+        if scopes is None:
+            return None
+        line = self.tok.lines[pos]
+        symbol, previous = scopes.declare(name, type_name, dims, line)
+        if symbol is None:
+            self.report(syntax_error(line, f"Повторное объявление '{name}' (первое в строке {previous.line})"))
+            return previous.slot
+        return symbol.slot
+
+    def resolve(self, name, pos):
+        """Слот объявления имени; о необъявленном имени сообщается ошибкой."""
+        scopes = self.scopes
+        if scopes is None:
+            return None
+        symbol = scopes.visible.get(name)
+        if symbol is not None:
+            return symbol.slot
+        if name not in self.undeclared:
+            self.undeclared.add(name)
+            self.report(syntax_error(self.tok.lines[pos], f"Переменная '{name}' не объявлена"))
+        return None
 
     def parse_statement(self):
-        current = self.tok.current()
-        if current.lexeme == "int":
-            self.parse_declaration()
-        elif current.lexeme == "printf":
-            self.tok.expect("printf")
-            self.tok.expect("(")
-            self.tok.expect(None, "str")
-            self.tok.expect(")")
+        lexeme = self.tok.lexeme()
+        if lexeme in TYPE_NAMES:
+            return self.parse_declaration()
+        if lexeme == "printf":
+            return self.parse_printf()
+        if lexeme == "return":
+            line = self.tok.lines[self.tok.expect("return")]
+            value = self.parse_expression()
             self.tok.expect(";")
-        elif current.lexeme == "return":
-            self.tok.expect("return")
-            self.tok.expect(None, {"num", "id"})
+            return Return(value, line)
+        if lexeme == "if":
+            return self.parse_if()
+        if lexeme == "while":
+            return self.parse_while()
+        if lexeme == "for":
+            return self.parse_for()
+        if lexeme == "{":
+            return self.parse_block()
+        if self.starts_expression():
+            line = self.tok.lines[self.tok.pos]
+            expr = self.parse_expression()
             self.tok.expect(";")
-        elif current.lexeme == "if":
-            self.parse_if()
-        elif current.lexeme == "while":
-            self.parse_while()
+            return ExprStatement(expr, line)
+        current = self.tok.current()
+        if current is None:
+            raise SyntaxError("Ожидался оператор, но достигнут конец файла")
+        raise syntax_error(current.line, f"Неожиданный токен: '{current.lexeme}'")
 
-        else:
-            raise SyntaxError(f"[Строка {current.line}] Неожиданный токен: '{current.lexeme}'")
+    def parse_declaration(self):
+        pos = self.tok.pos
+        type_name = self.tok.lexeme()
+        self.tok.next()
+        declarators = [self.parse_declarator(type_name)]
+        while self.tok.at(","):
+            self.tok.next()
+            declarators.append(self.parse_declarator(type_name))
+        self.tok.expect(";")
+        return Declaration(type_name, declarators, self.tok.lines[pos])
 
-    def parse_if(self):
-        self.tok.expect("if")
+    def parse_declarator(self, type_name=None):
+        pos = self.tok.expect(None, "id")
+        name = self.tok.lexeme_at(pos)
+        dims = []
+        while self.tok.at("["):
+            self.tok.next()
+            dims.append(self.tok.lexeme_at(self.tok.expect(None, "num")))
+            self.tok.expect("]")
+        # Как в C, имя видно уже в собственном инициализаторе
+        slot = self.declare(name, type_name, dims, pos)
+        init = None
+        if self.tok.at("="):
+            self.tok.next()
+            init = self.parse_expression()
+        return Declarator(name, dims, init, slot)
+
+    def parse_printf(self):
+        line = self.tok.lines[self.tok.expect("printf")]
         self.tok.expect("(")
-        self.tok.expect(None, {"id", "num"})
-        self.tok.expect("+")
-        self.tok.expect(None, {"id", "num"})
-        self.tok.expect("==")
-        self.tok.expect(None, {"id", "num"})
+        format = self.tok.lexeme_at(self.tok.expect(None, "str"))
+        args = []
+        while self.tok.at(","):
+            self.tok.next()
+            args.append(self.parse_expression())
         self.tok.expect(")")
-        self.tok.expect("return")
-        self.tok.expect(None, {"num", "id"})
         self.tok.expect(";")
+        return Printf(format, args, line)
 
-    def parse_while(self):
-        self.tok.expect("while")
+    def parse_condition(self):
         self.tok.expect("(")
-        self.tok.expect(None, {"id", "num"})
-        self.tok.expect("<")
-        self.tok.expect(None, {"id", "num"})
+        condition = self.parse_expression()
         self.tok.expect(")")
-        self.tok.expect("{")
-        self.parse_statements()
-        self.tok.expect("}")
+        return condition
+
+    def parse_if(self):
+        line = self.tok.lines[self.tok.expect("if")]
+        condition = self.parse_condition()
+        if not self.tok.at("{"):
+            # else допускается только после блока: так грамматика остаётся LL(1)
+            return If(condition, self.parse_body(), None, line)
+        then = self.parse_block()
+        otherwise = None
+        if self.tok.at("else"):
+            self.tok.next()
+            otherwise = self.parse_body()
+        return If(condition, then, otherwise, line)
+
+    def parse_while(self):
+        line = self.tok.lines[self.tok.expect("while")]
+        condition = self.parse_condition()
+        return While(condition, self.parse_body(), line)
+
+    def parse_for(self):
+        line = self.tok.lines[self.tok.expect("for")]
+        self.tok.expect("(")
+        parts = []
+        for end in (";", ";", ")"):
+            parts.append(None if self.tok.at(end) else self.parse_expression())
+            self.tok.expect(end)
+        return For(*parts, self.parse_body(), line)
+
+    # Выражения: присваивание справа налево, двуместные операции
+    # по приоритетам syntax_tree.BINARY_PRIORITY, унарный минус
+
+    def starts_expression(self):
+        tok = self.tok
+        pos = tok.pos
+        if pos >= len(tok):
+            return False
+        kind = tok.kinds[pos]
+        return kind == KIND_I or kind == KIND_N or tok.at("(") or tok.at("-")
+
+    def parse_expression(self):
+        tok = self.tok
+        pos = tok.pos
+        left = self.parse_binary(ASSIGN_PRIORITY + 1)
+        op = tok.operator()
+        if op in ASSIGN_OPERATORS:
+            if type(left) is not Name and type(left) is not Index:
+                raise syntax_error(tok.lines[pos], f"Слева от '{op}' должна быть переменная")
+            tok.next()
+            return Assign(op, left, self.parse_expression())
+        return left
+
+    def parse_binary(self, min_priority):
+        tok = self.tok
+        left = self.parse_unary()
+        while True:
+            op = tok.operator()
+            priority = BINARY_PRIORITY.get(op)
+            if priority is None or priority < min_priority:
+                return left
+            tok.next()
+            left = Binary(op, left, self.parse_binary(priority + 1))
+
+    def parse_unary(self):
+        tok = self.tok
+        if tok.at("-"):
+            tok.next()
+            return Unary("-", self.parse_unary())
+        pos = tok.pos
+        if pos < len(tok):
+            kind = tok.kinds[pos]
+            if kind == KIND_I:
+                tok.next()
+                name = tok.lexeme_at(pos)
+                slot = self.resolve(name, pos)
+                if not tok.at("["):
+                    return Name(name, slot)
+                indices = []
+                while tok.at("["):
+                    tok.next()
+                    indices.append(self.parse_expression())
+                    tok.expect("]")
+                return Index(name, indices, slot)
+            if kind == KIND_N:
+                tok.next()
+                return Number(tok.lexeme_at(pos))
+            if tok.at("("):
+                tok.next()
+                expr = self.parse_expression()
+                tok.expect(")")
+                return expr
+        current = tok.current()
+        if current is None:
+            raise SyntaxError("Ожидалось выражение, но достигнут конец файла")
+        raise syntax_error(current.line, f"Ожидалось выражение, найдено '{current.lexeme}'")
 
 if __name__ == "__main__":
+    import sys
+    from token_stream import MAGIC
+
+    filename = sys.argv[1] if len(sys.argv) > 1 else "tokens_output.txt"
     try:
-        tokenizer = Tokenizer("tokens_output.txt")
-        analyzer = SyntaxAnalyzer(tokenizer)
-        analyzer.parse()
+        with open(filename, "rb") as f:
+            is_binary = f.read(len(MAGIC)) == MAGIC
+        tokenizer = Tokenizer.from_binary(filename) if is_binary else Tokenizer(filename)
+        errors = SyntaxAnalyzer(tokenizer).parse()
     except SyntaxError as e:
-        print("Синтаксическая ошибка:")
-        print(e)
\ No newline at end of file
+        errors = [e]
+    if errors:
+        print(f"Синтаксических ошибок: {len(errors)}")
+        for e in errors:
+            print(e)
\ No newline at end of file
@@ -1,4 +1,7 @@
 import re
+from array import array
+
+import lexemes
 
 LEXEME_CLASSES = {
     "W": "Служебное слово",
@@ -9,109 +12,417 @@ LEXEME_CLASSES = {
     "C": "Константа"
 }
 
-KEYWORDS = {
-    kw: f"W{idx}" for idx, kw in enumerate([
-        "int", "char", "float", "double", "return", "if", "else",
-        "for", "while", "do", "switch", "case", "break", "continue",
-        "default", "void", "static", "struct", "typedef", "union",
-        "unsigned", "signed", "long", "short", "goto", "sizeof",
-        "main", "printf", "scanf", "#include"
-    ], start=1)
-}
+# Служебные слова, операции и разделители с номерами - из lexemes.py,
+# который генерируется по lexemes_table.txt (gen_lexemes.py)
+KEYWORDS = {kw: f"W{idx}" for idx, kw in enumerate(lexemes.KEYWORDS, start=1)}
+OPERATORS = {op: f"O{idx}" for idx, op in enumerate(lexemes.OPERATORS, start=1)}
+DELIMITERS = {delim: f"R{idx}" for idx, delim in enumerate(lexemes.DELIMITERS, start=1)}
 
-OPERATORS = {
-    op: f"O{idx}" for idx, op in enumerate([
-        "==", "!=", "<=", ">=", "&&", "||", "+=", "-=", "*=", "/=", "%=",
-        "+", "-", "*", "/", "%", "=", "<", ">"
-    ], start=1)
-}
 
-DELIMITERS = {
-    delim: f"R{idx}" for idx, delim in enumerate([
-        "(", ")", "{", "}", "[", "]", ",", ";", "."
-    ], start=1)
-}
+def symbols_pattern(by_first_char):
+    """
+    Операции и разделители одним выражением с ветвлением по первому
+    символу: "=(?:=)?|!=|...|[(){}...]". Внутри ветви длинные знаки
+    идут первыми, поэтому берётся самое длинное совпадение.
+    """
+    branches = []
+    single = []
+    for char, symbols in by_first_char.items():
+        tails = [re.escape(symbol[1:]) for symbol in symbols if len(symbol) > 1]
+        if not tails:
+            single.append(re.escape(char))
+            continue
+        optional = "?" if char in symbols else ""
+        branches.append(f"{re.escape(char)}(?:{'|'.join(tails)}){optional}")
+    if single:
+        branches.append(f"[{''.join(single)}]")
+    return "|".join(branches)
 
+
+# Слова и знаки (WORD, SYMBOL) классифицируются не выражением, а словарём
+# FIXED_INDEX: служебное слово - это идентификатор, найденный в таблице
 TOKEN_PATTERNS = [
-    (r'//.*', 'COMMENT'),
+    (r'//[^\n]*', 'COMMENT'),
     (r'/\*.*?\*/', 'COMMENT', re.DOTALL),
-    (r'#\s*include\s*<.*?>', 'W'),
-    (r'\b(' + '|'.join(KEYWORDS.keys()) + r')\b', 'W'),
-    (r'[a-zA-Z_]\w*', 'I'),
+    # "/*" без "*/" до конца текста: незакрытый комментарий, а не "/" и "*"
+    (r'/\*', 'UNCLOSED'),
+    (r'#[^\S\n]*include[^\S\n]*<[^\n]*?>', 'W'),
+    (r'[a-zA-Z_]\w*', 'WORD'),
     (r'\d+\.\d+|\d+', 'N'),
-    (r'".*?"', 'C'),
-    (r'(' + '|'.join(map(re.escape, OPERATORS.keys())) + r')', 'O'),
-    (r'(' + '|'.join(map(re.escape, DELIMITERS.keys())) + r')', 'R')
+    (r'"[^\n]*?"', 'C'),
+    (symbols_pattern(lexemes.SYMBOLS_BY_FIRST_CHAR), 'SYMBOL'),
 ]
 
-IDENTIFIERS = {}
-ident_counter = 1
-num_counter = 1
-const_counter = 1
+# Классы лексем кодируются целыми числами в порядке LEXEME_CLASSES
+CLASS_CODES = list(LEXEME_CLASSES)
+KIND_W, KIND_I, KIND_O, KIND_R, KIND_N, KIND_C = range(len(CLASS_CODES))
 
-def tokenize(code):
-    global ident_counter, num_counter, const_counter
-    lines = code.split("\n")
-    tokenized_lines = []
+# Номера служебных слов, операций и разделителей внутри своего класса
+CLASS_INDEX = {
+    KIND_W: {kw: int(code[1:]) for kw, code in KEYWORDS.items()},
+    KIND_O: {op: int(code[1:]) for op, code in OPERATORS.items()},
+    KIND_R: {delim: int(code[1:]) for delim, code in DELIMITERS.items()},
+}
+CLASS_LEXEMES = {
+    kind: {idx: lexeme for lexeme, idx in table.items()}
+    for kind, table in CLASS_INDEX.items()
+}
+# Лексема -> (класс, номер) для слов и знаков мастер-выражения
+FIXED_INDEX = {
+    lexeme: (kind, idx)
+    for kind, table in CLASS_INDEX.items() for lexeme, idx in table.items()
+}
+
+# Служебные группы мастер-выражения: перевод строки, пробелы, ошибка,
+# слово или знак, класс которого берётся из FIXED_INDEX, и начало
+# незакрытого комментария
+NEWLINE = -1
+SKIP = -2
+ERROR = -3
+LOOKUP = -4
+UNCLOSED = -5
+
+
+def build_master_regex(patterns):
+    """
+    Собирает все шаблоны в одно выражение с именованными группами T0, T1, ...
+    и возвращает его вместе с таблицей "номер группы -> класс лексемы",
+    чтобы класс определялся по match.lastindex без перебора шаблонов.
+    """
+    parts = [r'(?P<NL>\n)', r'(?P<WS>[^\S\n]+)']
+    kinds = [NEWLINE, SKIP]
+    for idx, (pattern, lexeme_type, *flags) in enumerate(patterns):
+        if flags and flags[0] & re.DOTALL:
+            pattern = f'(?s:{pattern})'
+        parts.append(f'(?P<T{idx}>{pattern})')
+        if lexeme_type == 'COMMENT':
+            kinds.append(SKIP)
+        elif lexeme_type in ('WORD', 'SYMBOL'):
+            kinds.append(LOOKUP)
+        elif lexeme_type == 'UNCLOSED':
+            kinds.append(UNCLOSED)
+        else:
+            kinds.append(CLASS_CODES.index(lexeme_type))
+    parts.append(r'(?P<ERR>.)')
+    kinds.append(ERROR)
+
+    regex = re.compile('|'.join(parts))
+    names = ['NL', 'WS'] + [f'T{idx}' for idx in range(len(patterns))] + ['ERR']
+    dispatch = [None] * (regex.groups + 1)
+    for name, kind in zip(names, kinds):
+        dispatch[regex.groupindex[name]] = kind
+    return regex, dispatch
+
+
+MASTER_RE, GROUP_KINDS = build_master_regex(TOKEN_PATTERNS)
+
+CHUNK_SIZE = 1 << 16
+
+# Готовые строковые коды служебных слов, операций и разделителей
+_FIXED_CODES = {
+    (kind, idx): f"{CLASS_CODES[kind]}{idx}"
+    for kind, table in CLASS_LEXEMES.items() for idx in table
+}
+
+
+def format_code(kind, index):
+    """Строковый код лексемы для текстового вывода: (KIND_I, 3) -> "I3"."""
+    code = _FIXED_CODES.get((kind, index))
+    return code if code is not None else f"{CLASS_CODES[kind]}{index}"
+
+
+def unknown_symbol_error(code, pos):
+    end = code.find("\n", pos)
+    rest = code[pos:end if end != -1 else len(code)].rstrip()
+    return SyntaxError(f"Неизвестный символ: {rest[:10]}")
+
+
+def unclosed_comment_error(line):
+    return SyntaxError(f"[Строка {line}] Незакрытый комментарий")
+
+
+class SymbolTable:
+    """
+    Таблицы одной единицы трансляции: идентификаторы интернируются
+    (одно имя - один номер), числа и константы нумеруются по вхождениям.
+    Номера начинаются с 1, как в кодах I1, N1, C1.
+    """
+    __slots__ = ("identifiers", "names", "numbers", "constants")
 
-    for line in lines:
-        tokens = []
-        code = line.strip()
-        while code:
-            code = code.lstrip()
-            match = None
-            for pattern, lexeme_type, *flags in TOKEN_PATTERNS:
-                regex_flags = flags[0] if flags else 0
-                match = re.match(pattern, code, regex_flags)
-                if match:
-                    value = match.group(0)
-                    if lexeme_type == "I":
-                        if value in IDENTIFIERS:
-                            lexeme_code = IDENTIFIERS[value]
+    def __init__(self):
+        self.identifiers = {}
+        self.names = []
+        self.numbers = []
+        self.constants = []
+
+    def intern(self, name):
+        index = self.identifiers.get(name)
+        if index is None:
+            self.names.append(name)
+            index = self.identifiers[name] = len(self.names)
+        return index
+
+    def add_number(self, value):
+        self.numbers.append(value)
+        return len(self.numbers)
+
+    def add_constant(self, value):
+        self.constants.append(value)
+        return len(self.constants)
+
+    def lexeme(self, kind, index):
+        """Исходный текст лексемы по её классу и номеру."""
+        if kind == KIND_I:
+            return self.names[index - 1]
+        if kind == KIND_N:
+            return self.numbers[index - 1]
+        if kind == KIND_C:
+            return self.constants[index - 1]
+        return CLASS_LEXEMES[kind][index]
+
+
+class Lexer:
+    """
+    Лексический анализатор одной единицы трансляции. Все таблицы лежат
+    в self.symbols, поэтому разные экземпляры можно использовать
+    независимо и из разных потоков.
+    """
+    # Совпадения мастер-выражения для lex() и stream(); metrics.enable()
+    # подменяет его вариантом, который заодно считает совпадения
+    matches = staticmethod(MASTER_RE.finditer)
+
+    def __init__(self, symbols=None):
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        symbols = self.symbols
+        # Класс лексемы -> функция, выдающая её номер (индекс списка = класс)
+        self._indexers = [
+            CLASS_INDEX[KIND_W].get,
+            symbols.intern,
+            CLASS_INDEX[KIND_O].__getitem__,
+            CLASS_INDEX[KIND_R].__getitem__,
+            symbols.add_number,
+            symbols.add_constant,
+        ]
+
+    def lex(self, code, line=1):
+        """
+        Разбирает текст целиком и возвращает три параллельных массива:
+        классы, номера и строки лексем. line - номер первой строки code
+        (для куска большого файла, см. parallel_lex.py).
+        """
+        kinds = array("b")
+        indices = array("i")
+        lines = array("i")
+        indexers = self._indexers
+        intern = indexers[KIND_I]
+        fixed = FIXED_INDEX.get
+
+        # Один проход мастер-выражения по всему тексту: без срезов строки
+        # и без повторного перебора шаблонов на каждой позиции
+        for match in self.matches(code):
+            kind = GROUP_KINDS[match.lastindex]
+            if kind == LOOKUP:
+                # Слово, не найденное в таблице, - идентификатор
+                value = match.group()
+                found = fixed(value)
+                if found is None:
+                    kinds.append(KIND_I)
+                    indices.append(intern(value))
+                else:
+                    kinds.append(found[0])
+                    indices.append(found[1])
+                lines.append(line)
+            elif kind >= 0:
+                index = indexers[kind](match.group())
+                if index is not None:
+                    kinds.append(kind)
+                    indices.append(index)
+                    lines.append(line)
+            elif kind == NEWLINE:
+                line += 1
+            elif kind == SKIP:
+                line += match.group().count("\n")
+            elif kind == UNCLOSED:
+                raise unclosed_comment_error(line)
+            else:
+                raise unknown_symbol_error(code, match.start())
+
+        return kinds, indices, lines
+
+    def stream(self, fileobj, chunk_size=CHUNK_SIZE):
+        """
+        Потоковый разбор: читает fileobj кусками по chunk_size символов
+        и выдаёт кортежи (класс, номер, строка, столбец). Разбираются только
+        завершённые строки буфера, поэтому лексемы и строковые константы
+        не рвутся на стыке кусков, а тело незакрытого /* комментария
+        пропускается без накопления. В памяти держится лишь незавершённая строка.
+        Незакрытый комментарий - та же ошибка, что и в lex().
+        """
+        indexers = self._indexers
+        intern = indexers[KIND_I]
+        fixed = FIXED_INDEX.get
+        buffer = ""
+        # Куски без перевода строки: склеиваются с буфером один раз, когда
+        # строка завершится, а не на каждом куске (иначе длинная строка
+        # или комментарий копировались бы квадратично)
+        pending = []
+        line = 1
+        line_start = 0  # смещение начала текущей строки относительно buffer
+        in_comment = False
+        comment_line = 0
+        eof = False
+
+        while True:
+            if not eof:
+                chunk = fileobj.read(chunk_size)
+                if not chunk:
+                    eof = True
+                elif in_comment or "\n" in chunk:
+                    pending.append(chunk)
+                else:
+                    pending.append(chunk)
+                    continue
+            if pending:
+                pending.insert(0, buffer)
+                buffer = "".join(pending)
+                pending.clear()
+
+            pos = 0
+            if in_comment:
+                end = buffer.find("*/")
+                if end == -1:
+                    if eof:
+                        raise unclosed_comment_error(comment_line)
+                    # Последний символ может оказаться началом "*/"
+                    pos = len(buffer) - 1 if buffer.endswith("*") else len(buffer)
+                else:
+                    pos = end + 2
+                    in_comment = False
+                newlines = buffer.count("\n", 0, pos)
+                if newlines:
+                    line += newlines
+                    line_start = buffer.rfind("\n", 0, pos) + 1
+                if in_comment:
+                    buffer = buffer[pos:]
+                    line_start -= pos
+                    continue
+
+            limit = len(buffer) if eof else buffer.rfind("\n") + 1
+            if limit > pos:
+                for match in self.matches(buffer, pos, limit):
+                    kind = GROUP_KINDS[match.lastindex]
+                    if kind == NEWLINE:
+                        line += 1
+                        line_start = match.end()
+                        continue
+                    if kind == SKIP:
+                        value = match.group()
+                        newlines = value.count("\n")
+                        if newlines:
+                            line += newlines
+                            line_start = match.start() + value.rfind("\n") + 1
+                        continue
+                    if kind == ERROR:
+                        raise unknown_symbol_error(buffer, match.start())
+
+                    start = match.start()
+                    if kind == UNCLOSED:
+                        # Конец комментария не попал в разбираемые строки
+                        in_comment = True
+                        comment_line = line
+                        pos = start + 2
+                        break
+                    value = match.group()
+                    if kind == LOOKUP:
+                        found = fixed(value)
+                        if found is None:
+                            yield KIND_I, intern(value), line, start - line_start + 1
                         else:
-                            lexeme_code = f"I{ident_counter}"
-                            IDENTIFIERS[value] = lexeme_code
-                            ident_counter += 1
-                    elif lexeme_type == "N":
-                        lexeme_code = f"N{num_counter}"
-                        num_counter += 1
-                    elif lexeme_type == "C":
-                        lexeme_code = f"C{const_counter}"
-                        const_counter += 1
-                    else:
-                        lexeme_code = (
-                            KEYWORDS.get(value, None) or
-                            OPERATORS.get(value, None) or
-                            DELIMITERS.get(value, None)
-                        )
-
-                    if lexeme_code:
-                        tokens.append(lexeme_code)
-                    code = code[len(value):]
-                    break
-            if not match:
-                raise SyntaxError(f"Неизвестный символ: {code[:10]}")
-
-        if tokens:
-            tokenized_lines.append(" ".join(tokens))
+                            yield found[0], found[1], line, start - line_start + 1
+                        continue
+                    index = indexers[kind](value)
+                    if index is not None:
+                        yield kind, index, line, start - line_start + 1
+                else:
+                    pos = limit
+
+            buffer = buffer[pos:]
+            line_start -= pos
+            if eof and not buffer and not in_comment:
+                return
+
 
+def group_lines(kinds, indices, lines):
+    """Собирает массивы лексем в строки кодов формата tokens_output.txt."""
+    tokenized_lines = []
+    codes = []
+    current_line = None
+    for kind, index, line in zip(kinds, indices, lines):
+        if line != current_line and codes:
+            tokenized_lines.append(" ".join(codes))
+            codes = []
+        current_line = line
+        codes.append(format_code(kind, index))
+    if codes:
+        tokenized_lines.append(" ".join(codes))
     return tokenized_lines
 
-# Читаем код из файла test.c
-file_path = "test.c"
 
-with open(file_path, "r", encoding="utf-8") as f:
-    code_c = f.read()
+def tokenize(code, lexer=None):
+    if lexer is None:
+        lexer = Lexer()
+    return group_lines(*lexer.lex(code))
+
+
+def tokenize_stream(fileobj, chunk_size=CHUNK_SIZE, lexer=None):
+    if lexer is None:
+        lexer = Lexer()
+    return lexer.stream(fileobj, chunk_size)
+
+
+def write_tokens(tokens, output):
+    """Группирует поток (класс, номер, строка, столбец) по строкам в формате tokens_output.txt."""
+    current_line = None
+    codes = []
+    for kind, index, line, _ in tokens:
+        if line != current_line and codes:
+            output.write(" ".join(codes) + "\n")
+            codes = []
+        current_line = line
+        codes.append(format_code(kind, index))
+    if codes:
+        output.write(" ".join(codes) + "\n")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Лексический анализатор C")
+    parser.add_argument("input", nargs="?", default="test.c")
+    parser.add_argument("output", nargs="?", default="tokens_output.txt")
+    parser.add_argument("-q", "--quiet", action="store_true", help="не дублировать лексемы в консоль")
+    parser.add_argument("-b", "--binary", metavar="PATH", help="сохранить лексемы в двоичном формате token_stream")
+    args = parser.parse_args()
+
+    if args.binary:
+        from token_stream import write_binary
 
-# Запускаем лексический анализ
-tokenized_lines = tokenize(code_c)
+        # Двоичный файл пишется из массивов Lexer.lex, без текстовых кодов
+        lexer = Lexer()
+        with open(args.input, "r", encoding="utf-8") as f:
+            columns = lexer.lex(f.read())
+        write_binary(args.binary, *columns, lexer.symbols)
+        print(f"Лексемы сохранены в файл {args.binary}")
+        sys.exit()
 
-# Выводим и записываем результат
-output_file = "tokens_output.txt"
+    # Лексемы пишутся по мере чтения, весь файл в память не загружается
+    with open(args.input, "r", encoding="utf-8") as f, \
+            open(args.output, "w", encoding="utf-8") as out:
+        write_tokens(tokenize_stream(f), out)
 
-with open(output_file, "w", encoding="utf-8") as f:
-    for line in tokenized_lines:
-        print(line)
-        f.write(line + "\n")
+    if not args.quiet:
+        with open(args.output, "r", encoding="utf-8") as f:
+            sys.stdout.writelines(f)
 
-print(f"\nЛексемы сохранены в файл {output_file}")
\ No newline at end of file
+    print(f"\nЛексемы сохранены в файл {args.output}")
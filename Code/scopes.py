@@ -0,0 +1,91 @@
+"""
+Таблица имён с областями видимости для семантических проверок
+parser_l4.SyntaxAnalyzer: объявление до использования и повторное
+объявление в одном блоке.
+
+Видимые объявления лежат в одном словаре "имя -> Symbol", а стек
+отмены хранит, что было под именем до объявления. Вход в блок
+запоминает длину стека, выход откатывает его до этой длины, так что
+блок стоит O(числа его объявлений), а поиск имени - один доступ к
+словарю, без копирования словарей и без обхода цепочки областей.
+
+Каждое объявление получает плотный номер (слот) 0, 1, 2, ...; слоты
+попадают в дерево (Name.slot, Index.slot, Declarator.slot) и в
+Program.symbols, по ним opz.OpzGenerator выбирает имена переменных ОПЗ,
+а opz_vm.OpzMachine и opz_compile.CompiledProgram заранее заводят ячейки.
+"""
+
+
+class Symbol:
+    __slots__ = ("name", "slot", "type_name", "dims", "depth", "line", "shadows")
+
+    def __init__(self, name, slot, type_name, dims, depth, line, shadows):
+        self.name = name
+        self.slot = slot
+        self.type_name = type_name
+        self.dims = dims        # размеры массива, [] для переменной
+        self.depth = depth      # глубина блока объявления (1 - тело main)
+        self.line = line
+        self.shadows = shadows  # перекрывает объявление внешнего блока
+
+    def __repr__(self):
+        return f"Symbol({self.name!r}, slot={self.slot}, depth={self.depth}, line={self.line})"
+
+
+class Scopes:
+    def __init__(self):
+        self.visible = {}   # имя -> Symbol, видимый сейчас
+        self.undo = []      # (имя, Symbol до объявления или None)
+        self.marks = []     # длина undo на входе в каждый открытый блок
+        self.symbols = []   # все объявления по слотам
+
+    def enter(self):
+        self.marks.append(len(self.undo))
+
+    def leave(self):
+        mark = self.marks.pop()
+        undo = self.undo
+        visible = self.visible
+        while len(undo) > mark:
+            name, previous = undo.pop()
+            if previous is None:
+                del visible[name]
+            else:
+                visible[name] = previous
+
+    def lookup(self, name):
+        return self.visible.get(name)
+
+    def declare(self, name, type_name, dims, line):
+        """
+        Новое объявление; если имя уже объявлено в этом же блоке,
+        возвращает (None, прежний Symbol).
+        """
+        depth = len(self.marks)
+        previous = self.visible.get(name)
+        if previous is not None and previous.depth == depth:
+            return None, previous
+        symbol = Symbol(name, len(self.symbols), type_name, dims, depth, line, previous is not None)
+        self.symbols.append(symbol)
+        self.undo.append((name, previous))
+        self.visible[name] = symbol
+        return symbol, previous
+
+
+def unique_names(symbols):
+    """
+    Имена переменных по слотам: объявление, перекрывающее внешнее,
+    получает имя "x_<слот>" (с "_" в конце, пока оно занято), остальные
+    сохраняют своё. Так во внутреннем блоке ОПЗ не затирает внешнюю x.
+    """
+    taken = {symbol.name for symbol in symbols}
+    names = []
+    for symbol in symbols:
+        name = symbol.name
+        if symbol.shadows:
+            name = f"{name}_{symbol.slot}"
+            while name in taken:
+                name += "_"
+            taken.add(name)
+        names.append(name)
+    return names
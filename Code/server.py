@@ -0,0 +1,267 @@
+"""
+Сервер трансляции на asyncio: один долгоживущий процесс вместо запуска
+интерпретатора на каждый файл. Слушает Unix-сокет (--socket) или порт
+на localhost (--port); протокол - строки JSON, по запросу на строку:
+
+    {"id": 1, "source": "int main() { ... }", "outputs": ["diagnostics", "opz"], "optimize": false}
+    {"id": 1, "diagnostics": [], "opz": ["..."], "error": null}
+
+outputs - виды результата translator.translate (по умолчанию все);
+ответы одного соединения приходят по мере готовности, их сопоставляют
+по id. {"command": "stats"} возвращает счётчики сервера.
+
+Запросы всех соединений копятся в очереди и уходят в пул процессов
+пачками (микропакетами): до --batch-size запросов, собранных за
+--batch-delay мс после первого, - одна задача пула, так что накладные
+расходы на передачу между процессами делятся на всю пачку. Ограничения:
+--max-pending запросов в очереди (дальше соединения перестают читаться,
+и клиенты ждут), --max-batches пачек в пуле одновременно и
+--max-request байт на строку запроса.
+
+    python server.py --socket /tmp/translator.sock -j 4
+    python server.py --socket /tmp/translator.sock --send test.c --outputs opz,cpp
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from translator import OUTPUTS, translate
+
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_BATCH_DELAY = 0.002
+DEFAULT_MAX_PENDING = 1024
+DEFAULT_MAX_REQUEST = 16 << 20
+
+
+def translate_request(request):
+    """Ответ на один запрос (без id); ошибки запроса не роняют пачку."""
+    try:
+        source = request["source"]
+        if not isinstance(source, str):
+            raise ValueError("source должен быть строкой")
+        result = translate(source, request.get("outputs") or OUTPUTS, bool(request.get("optimize")))
+        result["error"] = None
+    except Exception as e:
+        # Любая ошибка разбора одного запроса (в том числе непредвиденная)
+        # становится его ответом и не отнимает результаты у остальной пачки
+        result = {"error": f"{type(e).__name__}: {e}"}
+    return result
+
+
+def translate_batch(requests):
+    """Задача пула: пачка запросов за один переход между процессами."""
+    return [translate_request(request) for request in requests]
+
+
+class TranslationServer:
+    """
+    jobs - число процессов пула; 0 - без пула, пачки исполняются
+    в потоке этого же процесса (для отладки и маленьких нагрузок).
+    """
+
+    def __init__(self, jobs=None, batch_size=DEFAULT_BATCH_SIZE, batch_delay=DEFAULT_BATCH_DELAY,
+                 max_pending=DEFAULT_MAX_PENDING, max_batches=None, max_request=DEFAULT_MAX_REQUEST):
+        self.jobs = (os.cpu_count() or 1) if jobs is None else jobs
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.max_pending = max_pending
+        self.max_batches = max_batches or max(1, self.jobs) * 2
+        self.max_request = max_request
+        self.executor = None
+        self.server = None
+        self.queue = None
+        self.batch_slots = None
+        self.batcher = None
+        # Ссылки на задачи пачек: без них задачу может собрать сборщик мусора
+        self.batches = set()
+        self.stats = {"connections": 0, "requests": 0, "batches": 0, "errors": 0}
+
+    async def start(self, path=None, host="127.0.0.1", port=0):
+        """Запускает сервер на Unix-сокете path или на host:port; возвращает адрес."""
+        self.queue = asyncio.Queue(self.max_pending)
+        self.batch_slots = asyncio.Semaphore(self.max_batches)
+        if self.jobs:
+            # spawn, а не fork: процесс пула, созданный fork-ом при первой пачке,
+            # унаследовал бы сокеты открытых соединений и не дал бы им закрыться
+            self.executor = ProcessPoolExecutor(self.jobs, multiprocessing.get_context("spawn"))
+        self.batcher = asyncio.get_running_loop().create_task(self.collect_batches())
+        if path is not None:
+            if os.path.exists(path):
+                os.unlink(path)
+            self.server = await asyncio.start_unix_server(self.handle, path, limit=self.max_request)
+            return path
+        self.server = await asyncio.start_server(self.handle, host, port, limit=self.max_request)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.batcher is not None:
+            self.batcher.cancel()
+        for task in self.batches:
+            task.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def handle(self, reader, writer):
+        """Соединение: читает запросы, ответы пишет по мере готовности."""
+        self.stats["connections"] += 1
+        responses = set()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    # Строка длиннее max_request: продолжить разбор потока нельзя
+                    self.write(writer, {"id": None, "error": f"Запрос длиннее {self.max_request} байт"})
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("запрос должен быть объектом JSON")
+                except ValueError as e:
+                    self.stats["errors"] += 1
+                    self.write(writer, {"id": None, "error": f"Неверный запрос: {e}"})
+                    continue
+                if request.get("command") == "stats":
+                    self.write(writer, {"id": request.get("id"), "stats": dict(self.stats, pending=self.queue.qsize())})
+                    continue
+                self.stats["requests"] += 1
+                future = asyncio.get_running_loop().create_future()
+                # Полная очередь останавливает чтение этого соединения
+                await self.queue.put((request, future))
+                task = asyncio.ensure_future(self.respond(writer, request.get("id"), future))
+                responses.add(task)
+                task.add_done_callback(responses.discard)
+                await writer.drain()
+            if responses:
+                await asyncio.gather(*responses)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            for task in responses:
+                task.cancel()
+            writer.close()
+
+    async def respond(self, writer, request_id, future):
+        result = await future
+        if result.get("error"):
+            self.stats["errors"] += 1
+        self.write(writer, {"id": request_id, **result})
+
+    @staticmethod
+    def write(writer, response):
+        if not writer.is_closing():
+            writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+
+    async def collect_batches(self):
+        """Собирает пачки из очереди: первый запрос, всё, что уже ждёт, и пришедшее за batch_delay."""
+        queue = self.queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            if len(batch) < self.batch_size and self.batch_delay:
+                await asyncio.sleep(self.batch_delay)
+                while len(batch) < self.batch_size and not queue.empty():
+                    batch.append(queue.get_nowait())
+            await self.batch_slots.acquire()
+            self.stats["batches"] += 1
+            task = asyncio.get_running_loop().create_task(self.run_batch(batch))
+            self.batches.add(task)
+            task.add_done_callback(self.batches.discard)
+
+    async def run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self.executor, translate_batch, [request for request, _ in batch])
+        except Exception as e:
+            # Упал процесс пула или ответ не передался: ошибка у всех запросов пачки
+            results = [{"error": f"{type(e).__name__}: {e}"}] * len(batch)
+        finally:
+            self.batch_slots.release()
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+def send(requests, path=None, host="127.0.0.1", port=None):
+    """Простой синхронный клиент: отправляет запросы и возвращает ответы в порядке запросов."""
+    if path is not None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+    else:
+        sock = socket.create_connection((host, port))
+    with sock, sock.makefile("rwb") as stream:
+        for idx, request in enumerate(requests):
+            stream.write(json.dumps(dict(request, id=idx), ensure_ascii=False).encode("utf-8") + b"\n")
+        stream.flush()
+        sock.shutdown(socket.SHUT_WR)
+        responses = [json.loads(line) for line in stream]
+    return sorted(responses, key=lambda response: response["id"])
+
+
+async def serve(args):
+    server = TranslationServer(args.jobs, args.batch_size, args.batch_delay / 1000, args.max_pending,
+                               args.max_batches, args.max_request)
+    address = await server.start(args.socket, args.host, args.port)
+    print(f"Сервер трансляции: {address}, процессов: {server.jobs}", flush=True)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер трансляции на asyncio с пакетной обработкой запросов")
+    parser.add_argument("--socket", default=None, help="путь Unix-сокета (иначе TCP на --host:--port)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="процессов пула (0 - без пула)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--batch-delay", type=float, default=DEFAULT_BATCH_DELAY * 1000, help="мс ожидания пачки")
+    parser.add_argument("--max-pending", type=int, default=DEFAULT_MAX_PENDING)
+    parser.add_argument("--max-batches", type=int, default=None, help="пачек в пуле одновременно")
+    parser.add_argument("--max-request", type=int, default=DEFAULT_MAX_REQUEST, help="байт в строке запроса")
+    parser.add_argument("--send", nargs="+", metavar="FILE", help="режим клиента: отправить файлы серверу")
+    parser.add_argument("--outputs", default=",".join(OUTPUTS), help="виды результата для --send")
+    args = parser.parse_args()
+
+    if not args.send:
+        try:
+            asyncio.run(serve(args))
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    requests = []
+    for path in args.send:
+        with open(path, "r", encoding="utf-8") as f:
+            requests.append({"source": f.read(), "outputs": args.outputs.split(",")})
+    failed = 0
+    for path, response in zip(args.send, send(requests, args.socket, args.host, args.port)):
+        print(f"== {path}")
+        if response.get("error"):
+            print(response["error"])
+        for item in response.get("diagnostics") or []:
+            print(f"[{item['stage']}] {item['message']}")
+        failed += bool(response.get("error") or response.get("diagnostics"))
+        for name in ("tokens", "opz", "cpp"):
+            if response.get(name) is not None:
+                print("\n".join(response[name]))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,265 @@
+"""
+Синтаксическое дерево программы, которое строит parser_l4.SyntaxAnalyzer.
+Им пользуются генератор ОПЗ (opz.program_to_opz) и восстановление C++
+(cpp_syntax_analizator.reconstruct_from_ast), так что программа
+разбирается один раз.
+
+Узлы - простые классы со __slots__; операторы хранят номер строки
+исходника, выражения - нет. Имена и объявления хранят слот - номер
+объявления в таблице имён (scopes.Scopes) или None, если программа
+не проходила семантические проверки.
+"""
+
+
+# Служебные поля, которые не входят в fields() (и в сравнение узлов)
+_NOT_COMPARED = ("line", "slot", "symbols")
+
+
+class Node:
+    __slots__ = ()
+
+    def fields(self):
+        return [(name, getattr(self, name)) for name in self.__slots__ if name not in _NOT_COMPARED]
+
+    def __repr__(self):
+        args = ", ".join(f"{name}={value!r}" for name, value in self.fields())
+        return f"{type(self).__name__}({args})"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.fields() == other.fields()
+
+
+# Операторы
+
+class Program(Node):
+    __slots__ = ("includes", "body", "line", "symbols")
+
+    def __init__(self, includes, body, line=None, symbols=None):
+        self.includes = includes  # имена из #include <...> (только в потоках лексем из файла)
+        self.body = body          # Block - тело main
+        self.line = line
+        self.symbols = symbols    # scopes.Symbol по слотам или None
+
+
+class Block(Node):
+    __slots__ = ("statements", "line")
+
+    def __init__(self, statements, line=None):
+        self.statements = statements
+        self.line = line
+
+
+class Declaration(Node):
+    """int a = 1, b[10];"""
+    __slots__ = ("type_name", "declarators", "line")
+
+    def __init__(self, type_name, declarators, line=None):
+        self.type_name = type_name
+        self.declarators = declarators
+        self.line = line
+
+
+class Declarator(Node):
+    __slots__ = ("name", "dims", "init", "slot")
+
+    def __init__(self, name, dims, init, slot=None):
+        self.name = name
+        self.dims = dims  # размеры массива (строки чисел), [] для переменной
+        self.init = init  # выражение или None
+        self.slot = slot
+
+
+class Printf(Node):
+    __slots__ = ("format", "args", "line")
+
+    def __init__(self, format, args, line=None):
+        self.format = format  # строковая константа вместе с кавычками
+        self.args = args
+        self.line = line
+
+
+class Return(Node):
+    __slots__ = ("value", "line")
+
+    def __init__(self, value, line=None):
+        self.value = value
+        self.line = line
+
+
+class If(Node):
+    __slots__ = ("condition", "then", "otherwise", "line")
+
+    def __init__(self, condition, then, otherwise=None, line=None):
+        self.condition = condition
+        self.then = then
+        self.otherwise = otherwise
+        self.line = line
+
+
+class While(Node):
+    __slots__ = ("condition", "body", "line")
+
+    def __init__(self, condition, body, line=None):
+        self.condition = condition
+        self.body = body
+        self.line = line
+
+
+class For(Node):
+    __slots__ = ("init", "condition", "step", "body", "line")
+
+    def __init__(self, init, condition, step, body, line=None):
+        # Любая из трёх частей заголовка может отсутствовать (None)
+        self.init = init
+        self.condition = condition
+        self.step = step
+        self.body = body
+        self.line = line
+
+
+class ExprStatement(Node):
+    __slots__ = ("expr", "line")
+
+    def __init__(self, expr, line=None):
+        self.expr = expr
+        self.line = line
+
+
+# Выражения
+
+class Name(Node):
+    __slots__ = ("name", "slot")
+
+    def __init__(self, name, slot=None):
+        self.name = name
+        self.slot = slot
+
+
+class Number(Node):
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value  # текст числа, как в исходнике
+
+
+class Index(Node):
+    """Элемент массива: name[i][j] - Index("name", [i, j])."""
+    __slots__ = ("name", "indices", "slot")
+
+    def __init__(self, name, indices, slot=None):
+        self.name = name
+        self.indices = indices
+        self.slot = slot
+
+
+class Unary(Node):
+    __slots__ = ("op", "operand")
+
+    def __init__(self, op, operand):
+        self.op = op
+        self.operand = operand
+
+
+class Binary(Node):
+    __slots__ = ("op", "left", "right")
+
+    def __init__(self, op, left, right):
+        self.op = op
+        self.left = left
+        self.right = right
+
+
+class Assign(Node):
+    """Присваивание, в том числе составное: op - "=", "+=" и т. п."""
+    __slots__ = ("op", "target", "value")
+
+    def __init__(self, op, target, value):
+        self.op = op
+        self.target = target  # Name или Index
+        self.value = value
+
+
+# Приоритеты двуместных операций; присваивания (1) правоассоциативны,
+# унарный минус выше всех
+BINARY_PRIORITY = {
+    "||": 2, "&&": 3,
+    "<": 4, "<=": 4, ">": 4, ">=": 4, "==": 4, "!=": 4,
+    "+": 5, "-": 5,
+    "*": 6, "/": 6, "%": 6,
+}
+ASSIGN_OPERATORS = ("=", "+=", "-=", "*=", "/=", "%=")
+ASSIGN_PRIORITY = 1
+UNARY_PRIORITY = 7
+
+
+class Visitor:
+    """Обход по типу узла: visit(node) вызывает visit_<Класс>(node)."""
+
+    def visit(self, node):
+        return getattr(self, "visit_" + type(node).__name__)(node)
+
+
+def format_expression(node, parent_priority=0):
+    """
+    Текст выражения на C со скобками только там, где они нужны. Обход
+    по явному стеку (узел, приоритет снаружи, операнды уже записаны):
+    длинная цепочка операций не упирается в предел рекурсии. Тексты
+    готовых операндов лежат в texts, узел забирает их с конца.
+    """
+    stack = [(node, parent_priority, False)]
+    texts = []
+    while stack:
+        node, parent_priority, ready = stack.pop()
+        kind = type(node)
+        if kind is Name:
+            texts.append(node.name)
+            continue
+        if kind is Number:
+            texts.append(node.value)
+            continue
+        if not ready:
+            if kind is Index:
+                operands = [(index, 0) for index in node.indices]
+            elif kind is Unary:
+                operands = [(node.operand, UNARY_PRIORITY)]
+            elif kind is Binary:
+                priority = BINARY_PRIORITY[node.op]
+                # Левоассоциативные: правому операнду того же приоритета нужны скобки
+                operands = [(node.left, priority), (node.right, priority + 1)]
+            elif kind is Assign:
+                operands = [(node.target, 0), (node.value, ASSIGN_PRIORITY)]
+            else:
+                raise TypeError(f"Не выражение: {node!r}")
+            stack.append((node, parent_priority, True))
+            stack.extend((operand, priority, False) for operand, priority in reversed(operands))
+            continue
+
+        if kind is Index:
+            first = len(texts) - len(node.indices)
+            text = node.name + "".join(f"[{index}]" for index in texts[first:])
+            del texts[first:]
+            texts.append(text)
+            continue
+        if kind is Unary:
+            operand = texts.pop()
+            # "- -x", а не "--x"
+            text = node.op + (" " if operand.startswith(node.op) else "") + operand
+            priority = UNARY_PRIORITY
+        else:
+            right = texts.pop()
+            left = texts.pop()
+            text = f"{left} {node.op} {right}"
+            priority = BINARY_PRIORITY[node.op] if kind is Binary else ASSIGN_PRIORITY
+        texts.append(f"({text})" if priority < parent_priority else text)
+    return texts[0]
+
+
+def format_declaration(node):
+    """Текст объявления на C: "int a = 1, b[10];"."""
+    parts = []
+    for declarator in node.declarators:
+        text = declarator.name + "".join(f"[{dim}]" for dim in declarator.dims)
+        if declarator.init is not None:
+            text += f" = {format_expression(declarator.init, ASSIGN_PRIORITY)}"
+        parts.append(text)
+    return f"{node.type_name} {', '.join(parts)};"
@@ -0,0 +1,248 @@
+"""
+Двоичный формат потока лексем между scaner и parser_l4.
+
+Файл состоит из заголовка, общей таблицы различных строк (сначала
+все идентификаторы, затем значения чисел и констант), ссылок чисел
+и констант в эту таблицу (числа нумеруются по вхождениям, но значения
+повторяются), двух столбцов по числу лексем - класс (uint8) и номер -
+и серий строк: для каждой строки исходника с лексемами её номер и число
+лексем от начала файла до её конца включительно. Номера, ссылки и серии
+пишутся самым узким из uint8/uint16/uint32, в который помещаются
+значения. Все части выровнены на 4 байта, поэтому столбцы читаются
+через mmap + memoryview.cast без копирования.
+
+    заголовок  <4sHccIIIIII: "TKS1", версия, тип номеров, тип серий,
+               лексем, серий, строк таблицы, имён, чисел, констант
+    таблица    (count + 1) смещений uint32, затем байты UTF-8 всех строк
+    ссылки     числа[numbers], константы[constants]
+    столбцы    kinds[n], indices[n], номера строк[runs], концы серий[runs]
+"""
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+from itertools import chain, groupby, repeat
+from operator import sub
+
+from scaner import KIND_C, KIND_I, KIND_N, CLASS_LEXEMES, SymbolTable, group_lines
+
+MAGIC = b"TKS1"
+VERSION = 2
+HEADER = struct.Struct("<4sHccIIIIII")
+
+
+def _padding(size):
+    return -size % 4
+
+
+def _typecode(maximum):
+    """Самый узкий беззнаковый тип array, в который помещается maximum."""
+    for code in "BHI":
+        if maximum < 1 << (8 * array(code).itemsize):
+            return code
+    raise ValueError(f"Значение {maximum} не помещается в uint32")
+
+
+def _column(code, values):
+    data = array(code, values).tobytes()
+    return data + b"\0" * _padding(len(data))
+
+
+def _pack_strings(strings):
+    offsets = array("I", [0])
+    blob = bytearray()
+    for value in strings:
+        blob += value.encode("utf-8")
+        offsets.append(len(blob))
+    blob += b"\0" * _padding(len(blob))
+    return offsets.tobytes() + bytes(blob)
+
+
+def write_binary(output, kinds, indices, lines, symbols):
+    """
+    Записывает массивы Lexer.lex и таблицы SymbolTable в двоичный файл.
+    output - путь или файловый объект, открытый в режиме "wb".
+    """
+    if isinstance(output, str):
+        with open(output, "wb") as f:
+            return write_binary(f, kinds, indices, lines, symbols)
+
+    count = len(kinds)
+    # Подряд идущие лексемы одной строки исходника - одна серия
+    run_lines = array("I")
+    run_ends = array("I")
+    end = 0
+    for line, run in groupby(lines):
+        end += sum(1 for _ in run)
+        run_lines.append(line)
+        run_ends.append(end)
+    index_code = _typecode(max(indices, default=0))
+    run_code = _typecode(max(count, run_lines[-1] if run_lines else 0))
+
+    # Номера строк таблицы с 1, как у лексем; имена уже различны
+    pool = {name: idx for idx, name in enumerate(symbols.names, 1)}
+    refs = []
+    for values in (symbols.numbers, symbols.constants):
+        refs.append([pool.setdefault(value, len(pool) + 1) for value in values])
+    ref_code = _typecode(len(pool))
+
+    output.write(HEADER.pack(MAGIC, VERSION, index_code.encode(), run_code.encode(), count, len(run_lines),
+                             len(pool), len(symbols.names), len(symbols.numbers), len(symbols.constants)))
+    output.write(_pack_strings(pool))
+    for column in refs:
+        output.write(_column(ref_code, column))
+    output.write(_column("B", kinds))
+    output.write(_column(index_code, indices))
+    output.write(_column(run_code, run_lines))
+    output.write(_column(run_code, run_ends))
+
+
+class StringTable:
+    """Ленивая таблица строк поверх memoryview: строка декодируется при обращении."""
+
+    def __init__(self, view, count):
+        self.count = count
+        self.offsets = view[:(count + 1) * 4].cast("I")
+        self.data = view[(count + 1) * 4:]
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        # Номера лексем начинаются с 1
+        return str(self.data[self.offsets[index - 1]:self.offsets[index]], "utf-8")
+
+    def size(self):
+        end = (self.count + 1) * 4 + self.offsets[self.count]
+        return end + _padding(end)
+
+
+class PooledStrings:
+    """Имена, числа или константы файла: строки общей таблицы по ссылкам (или подряд, если refs - None)."""
+    __slots__ = ("pool", "refs", "count")
+
+    def __init__(self, pool, refs, count):
+        self.pool = pool
+        self.refs = refs
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return self.pool[index if self.refs is None else self.refs[index - 1]]
+
+
+class LineRuns:
+    """
+    Столбец строк лексем поверх серий: lines[pos] ищет серию делением
+    пополам, итерация разворачивает серии без промежуточного списка.
+    """
+    __slots__ = ("numbers", "ends")
+
+    def __init__(self, numbers, ends):
+        self.numbers = numbers
+        self.ends = ends
+
+    def __len__(self):
+        return self.ends[-1] if len(self.ends) else 0
+
+    def __getitem__(self, pos):
+        if pos < 0:
+            pos += len(self)
+        if not 0 <= pos < len(self):
+            raise IndexError("номер лексемы вне файла")
+        return self.numbers[bisect_right(self.ends, pos)]
+
+    def __iter__(self):
+        lengths = map(sub, self.ends, chain((0,), self.ends))
+        return chain.from_iterable(map(repeat, self.numbers, lengths))
+
+    def release(self):
+        self.numbers.release()
+        self.ends.release()
+
+
+class TokenFile:
+    """
+    Отображённый в память двоичный файл лексем. Столбцы kinds и indices -
+    memoryview прямо над файлом, lines - LineRuns над сериями строк;
+    закрывать через close() или использовать как контекстный менеджер.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, version, index_code, run_code, count, runs, strings, names, numbers, constants = \
+            HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            view.release()
+            self._mmap.close()
+            raise ValueError(f"{path}: не файл лексем формата {MAGIC.decode()} версии {VERSION}")
+
+        pos = HEADER.size
+        self.strings = StringTable(view[pos:], strings)
+        pos += self.strings.size()
+
+        self.count = count
+        ref_code = _typecode(strings)
+        columns = []
+        for code, size in ((ref_code, numbers), (ref_code, constants), ("B", count), (index_code.decode(), count),
+                           (run_code.decode(), runs), (run_code.decode(), runs)):
+            end = pos + size * array(code).itemsize
+            columns.append(view[pos:end].cast(code))
+            pos = end + _padding(end)
+        number_refs, constant_refs, self.kinds, self.indices, run_lines, run_ends = columns
+        self.names = PooledStrings(self.strings, None, names)
+        self.numbers = PooledStrings(self.strings, number_refs, numbers)
+        self.constants = PooledStrings(self.strings, constant_refs, constants)
+        self.lines = LineRuns(run_lines, run_ends)
+        self._view = view
+
+    def lexeme(self, kind, index):
+        """Исходный текст лексемы, как SymbolTable.lexeme."""
+        if kind == KIND_I:
+            return self.names[index]
+        if kind == KIND_N:
+            return self.numbers[index]
+        if kind == KIND_C:
+            return self.constants[index]
+        return CLASS_LEXEMES[kind][index]
+
+    def symbols(self):
+        """Декодирует таблицы строк в обычный SymbolTable."""
+        symbols = SymbolTable()
+        for index in range(1, len(self.names) + 1):
+            symbols.intern(self.names[index])
+        symbols.numbers = [self.numbers[i] for i in range(1, len(self.numbers) + 1)]
+        symbols.constants = [self.constants[i] for i in range(1, len(self.constants) + 1)]
+        return symbols
+
+    def close(self):
+        if self._mmap.closed:
+            return
+        self.strings.offsets.release()
+        self.strings.data.release()
+        self.numbers.refs.release()
+        self.constants.refs.release()
+        self.kinds.release()
+        self.indices.release()
+        self.lines.release()
+        self._view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_text(path, output):
+    """Переводит двоичный файл лексем в текстовый формат tokens_output.txt."""
+    with TokenFile(path) as tokens:
+        lines = group_lines(tokens.kinds, tokens.indices, tokens.lines)
+    with open(output, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
@@ -0,0 +1,69 @@
+"""
+Конвейер транслятора как библиотека: текст программы на C -> коды
+лексем, диагностика, ОПЗ и восстановленный по ОПЗ C++. Импорт модулей
+конвейера ничего не читает и не печатает, так что translate можно
+звать из одного долгоживущего процесса (server.py, редактор) для
+любого числа текстов.
+
+    from translator import translate
+    result = translate(code, outputs=("diagnostics", "opz"))
+"""
+from cpp_syntax_analizator import parse_opz
+from opz import program_to_opz
+from opz_optimize import optimize
+from parser_l4 import SyntaxAnalyzer, Tokenizer
+from scaner import Lexer, group_lines
+
+OUTPUTS = ("tokens", "diagnostics", "opz", "cpp")
+
+
+def diagnostic(stage, error):
+    return {"stage": stage, "line": getattr(error, "line", None), "message": str(error)}
+
+
+def translate(source, outputs=OUTPUTS, optimize_opz=False):
+    """
+    Словарь с ключами из outputs: "tokens" и "opz" - списки строк в
+    форматах tokens_output.txt и output_opz.txt, "cpp" - строки C++.
+    Ключ "diagnostics" (ошибки этапов {"stage", "line", "message"})
+    есть всегда; в outputs он означает "проверить программу целиком".
+    Этапы после первого этапа с ошибками не выполняются, и их ключи
+    остаются None. Этапы, которые не нужны для outputs, пропускаются.
+    """
+    outputs = set(outputs)
+    unknown = outputs.difference(OUTPUTS)
+    if unknown:
+        raise ValueError(f"Неизвестные виды результата: {', '.join(sorted(unknown))}")
+    result = {name: None for name in outputs}
+    diagnostics = result["diagnostics"] = []
+
+    lexer = Lexer()
+    try:
+        columns = lexer.lex(source)
+    except SyntaxError as e:
+        diagnostics.append(diagnostic("scaner", e))
+        return result
+    if "tokens" in outputs:
+        result["tokens"] = group_lines(*columns)
+    if not outputs.intersection(("diagnostics", "opz", "cpp")):
+        return result
+
+    analyzer = SyntaxAnalyzer(Tokenizer.from_columns(*columns, lexer.symbols))
+    errors = analyzer.check()
+    if errors:
+        diagnostics.extend(diagnostic("parser", e) for e in errors)
+        return result
+    if not outputs.intersection(("opz", "cpp")):
+        return result
+
+    opz_lines = program_to_opz(analyzer.tree)
+    if optimize_opz:
+        opz_lines, _ = optimize(opz_lines)
+    if "opz" in outputs:
+        result["opz"] = opz_lines
+    if "cpp" in outputs:
+        try:
+            result["cpp"] = parse_opz(opz_lines)
+        except (SyntaxError, IndexError) as e:
+            diagnostics.append(diagnostic("cpp", e))
+    return result